@@ -0,0 +1,121 @@
+# Copyright (c) 2021 - for information on the respective copyright owner see the NOTICE file and/or the repository https://github.com/boschresearch/open-eot-agents.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import logging
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# The agents run within the process of the manager, so their logs are observed. The trade metrics of
+# the skills log every finished trade with its timestamped steps as structured event, keyed by its fipa
+# dialogue, so trades with the same seller in parallel are told apart. Every agent log line starts with
+# "[<agent_name>] ".
+AGENT_LOG = re.compile(r"^\[(?P<agent>[^\]]+)\] ")
+TRADE_EVENT = "trade_event"
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Get the p-th percentile of the values by linear interpolation, None if there are none."""
+    if len(values) == 0:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    """Summarize latencies in seconds by count, mean, percentiles and maximum."""
+    summary = {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "max": max(values) if values else None,
+    }  # type: Dict[str, Optional[float]]
+    for p in PERCENTILES:
+        summary["p" + str(p)] = percentile(values, p)
+    return summary
+
+
+class TradeRecorder(logging.Handler):
+    """Collect trade timings of the purchasing agents from their log records."""
+
+    def __init__(self, purchasing_agents: List[str]):
+        super().__init__(level=logging.INFO)
+        self._purchasing_agents = set(purchasing_agents)
+        self._lock = threading.Lock()
+        self._trades = {}  # type: Dict[str, int]
+        self.cfp_inform_latencies = []  # type: List[float]
+        self.tx_confirmation_times = []  # type: List[float]
+
+    @property
+    def trades(self) -> int:
+        with self._lock:
+            return sum(self._trades.values())
+
+    def emit(self, record: logging.LogRecord) -> None:
+        event = getattr(record, TRADE_EVENT, None)
+        if event is None:
+            return
+        match = AGENT_LOG.match(record.getMessage())
+        if match is None or match.group("agent") not in self._purchasing_agents:
+            return
+        with self._lock:
+            self._observe(match.group("agent"), event["steps"])
+
+    def _observe(self, agent: str, steps: List[Tuple[str, float]]) -> None:
+        # a purchasing agent only finishes a trade when its INFORM carries the data
+        first = {}  # type: Dict[str, float]
+        last = {}  # type: Dict[str, float]
+        for step, timestamp in steps:
+            first.setdefault(step, timestamp)
+            last[step] = timestamp
+        if "cfp" in first and "inform" in last:
+            self.cfp_inform_latencies.append(last["inform"] - first["cfp"])
+        # a payment which failed is requested again, its confirmation time includes the retries
+        if "match_accept" in first and "receipt" in last:
+            self.tx_confirmation_times.append(last["receipt"] - first["match_accept"])
+        self._trades[agent] = self._trades.get(agent, 0) + 1
+
+    def report(self, scenario: dict, started: float, stopped: float) -> dict:
+        with self._lock:
+            elapsed = stopped - started
+            trades = sum(self._trades.values())
+            return {
+                "scenario": scenario,
+                "started": started,
+                "stopped": stopped,
+                "duration": elapsed,
+                "trades": trades,
+                "trades_per_second": trades / elapsed if elapsed > 0 else 0.0,
+                "trades_by_agent": dict(self._trades),
+                "cfp_inform_latency": summarize(self.cfp_inform_latencies),
+                "tx_confirmation_time": summarize(self.tx_confirmation_times),
+            }
+
+
+def write_report(report: dict, path: str):
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+
+
+def format_report(report: dict) -> str:
+    def seconds(value: Optional[float]) -> str:
+        return "n/a" if value is None else "{:.3f}s".format(value)
+
+    lines = [
+        "Trades: {} in {:.1f}s ({:.3f} trades/sec)".format(
+            report["trades"], report["duration"], report["trades_per_second"]),
+    ]
+    for title, key in (("CFP->INFORM latency", "cfp_inform_latency"), ("Tx confirmation time", "tx_confirmation_time")):
+        summary = report[key]
+        lines.append("{}: count={} mean={} {} max={}".format(
+            title, summary["count"], seconds(summary["mean"]),
+            " ".join("p{}={}".format(p, seconds(summary["p" + str(p)])) for p in PERCENTILES),
+            seconds(summary["max"])))
+    lines.append("Stopped at " + time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(report["stopped"])))
+    return "\n".join(lines)
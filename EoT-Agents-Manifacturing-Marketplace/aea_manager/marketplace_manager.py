@@ -2,76 +2,313 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import asyncio
 import os.path
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from time import time
-from typing import List, Optional
+from time import sleep, time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
 
+from aea.aea import AEA
 from aea.configurations.base import PublicId
 from aea.manager import MultiAgentManager
+from aea.manager.project import AgentAlias
+from topology import DEFAULT_FIRST_PORT, DEFAULT_HOST, ROUND_ROBIN, PortAllocator, assign_entry_peers
+
+LIST_START = "MULTIADDRS_LIST_START"
+LIST_END = "MULTIADDRS_LIST_END"
+READY_POLL_INTERVAL = 0.05
+SELLING = "selling"
+PURCHASING = "purchasing"
+DEFAULT_MAX_WORKERS = 4
+
+
+class AgentSpec(NamedTuple):
+    """The specification of an agent to be provisioned."""
+    name: str
+    role: str
+    id: int
+    entry_peers: Sequence[str] = ()
+    # 0 lets the manager allocate a free port
+    local_port: int = 0
+    delegate_port: int = 0
+
+
+# generates the agent overrides and the component overrides of an agent
+OverridesTemplate = Callable[[AgentSpec], Tuple[dict, List[dict]]]
+
+
+class Libp2pLogTail():
+    """Read the libp2p log of an agent incrementally and keep the last announced multiaddrs."""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._offset = 0
+        self._partial = b""
+        self._found = False
+        self._multiaddrs = []  # type: List[str]
+        self.multiaddrs = []  # type: List[str]
+
+    @property
+    def is_ready(self) -> bool:
+        return len(self.multiaddrs) > 0
+
+    def read(self) -> bool:
+        """Read the lines appended since the last call, return whether multiaddrs were announced."""
+        if not os.path.exists(self._path):
+            return self.is_ready
+        with open(self._path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read()
+            self._offset = f.tell()
+        lines = (self._partial + chunk).split(b"\n")
+        # the last line may still be written
+        self._partial = lines.pop()
+        for line in lines:
+            self._parse(line.decode("utf-8", errors="replace"))
+        return self.is_ready
+
+    def _parse(self, line: str):
+        if LIST_START in line:
+            self._found = True
+            self._multiaddrs = []
+            return
+        if self._found:
+            elem = line.strip()
+            if elem != LIST_END and len(elem) != 0:
+                self._multiaddrs.append(elem)
+            else:
+                self._found = False
+                self.multiaddrs = self._multiaddrs
+
+
+class ProvisioningAgentManager(MultiAgentManager):
+    """
+    A MultiAgentManager which lets the caller create and build agents before they are registered.
+
+    Creating the alias of an agent, with its keys and overrides, and building its AEA instance do not
+    change the state of the manager, so they can run concurrently. Only registering and starting the
+    agent change it and have to be serialized by the caller.
+    """
+
+    def create_agent_alias(self, public_id: PublicId, agent_name: str, agent_overrides: Optional[dict] = None,
+                           component_overrides: Optional[List[dict]] = None) -> AgentAlias:
+        """Create the alias of a new agent of an added project with its overrides applied, without registering it."""
+        if agent_name in self._agents:
+            raise ValueError("Agent with name " + agent_name + " already exists!")
+        if public_id not in self._projects:
+            raise ValueError(str(public_id) + " project is not added!")
+        agent_alias = AgentAlias(project=self._projects[public_id], agent_name=agent_name,
+                                 data_dir=self.get_data_dir_of_agent(agent_name), password=self._password)
+        agent_alias.set_overrides(agent_overrides, component_overrides)
+        return agent_alias
+
+    def register_agent_alias(self, agent_alias: AgentAlias):
+        """Register an agent created by create_agent_alias, like add_agent does."""
+        if agent_alias.agent_name in self._agents:
+            raise ValueError("Agent with name " + agent_alias.agent_name + " already exists!")
+        agent_alias.project.agents.add(agent_alias.agent_name)
+        self._agents[agent_alias.agent_name] = agent_alias
+
+    def start_agent_instance(self, agent_name: str, agent: AEA):
+        """Start a registered agent from an AEA instance built by the caller, like start_agent does."""
+        if not self._loop or not self._event:
+            raise ValueError("agent is not started!")
+        if agent_name not in self._agents:
+            raise ValueError(agent_name + " is not registered!")
+        if self._is_agent_running(agent_name):
+            raise ValueError(agent_name + " is already started!")
+        task = self._MODE_TASK_CLASS[self._mode](agent, self._loop)
+        task.start()
+        self._agents_tasks[agent_name] = task
+        self._loop.call_soon_threadsafe(self._event.set)
 
 
 class MarketplaceManager():
 
-    def __init__(self, working_dir: str, registry_path: str, selling_agent_id: PublicId, purchasing_agent_id: PublicId):
+    def __init__(self, working_dir: str, registry_path: str, selling_agent_id: PublicId, purchasing_agent_id: PublicId,
+                 host: str = DEFAULT_HOST, first_port: int = DEFAULT_FIRST_PORT):
         self.REGISTRY_PATH = registry_path
         self.WORKING_DIR = working_dir
         self.SELLING_AGENT_ID = selling_agent_id
         self.PURCHASING_AGENT_ID = purchasing_agent_id
         self.P2P_LOG_FILE = "libp2p_node.log"
+        self._log_tails = {}  # type: Dict[str, Libp2pLogTail]
+        # the multi agent manager is not thread-safe, it changes its agents and tasks without locking
+        self._manager_lock = threading.RLock()
+        self._projects = set()  # type: set
+        self._ports = PortAllocator(host, first_port)
 
     def _init_mam(self):
-        self._manager = MultiAgentManager(
+        self._manager = ProvisioningAgentManager(
             working_dir=self.WORKING_DIR,
             registry_path=self.REGISTRY_PATH
         )
         # maybe set local=True
         self._manager.start_manager()
-        self._manager.add_project(public_id=self.SELLING_AGENT_ID)
-        self._manager.add_project(public_id=self.PURCHASING_AGENT_ID)
+
+    def _ensure_project(self, public_id: PublicId):
+        # projects are only fetched once an agent of them is added, not at start
+        with self._manager_lock:
+            if public_id not in self._projects:
+                self._manager.add_project(public_id=public_id)
+                self._projects.add(public_id)
+
+    def _get_project_id(self, role: str) -> PublicId:
+        if role == SELLING:
+            return self.SELLING_AGENT_ID
+        if role == PURCHASING:
+            return self.PURCHASING_AGENT_ID
+        raise ValueError("Unknown agent role " + role + "!")
 
     def add_selling_agent(
             self, name: str, agent_overrides: Optional[dict] = None, component_overrides: Optional[List[dict]] = None):
-        self._manager.add_agent(
-            public_id=self.SELLING_AGENT_ID, agent_name=name, agent_overrides=agent_overrides,
-            component_overrides=component_overrides)
+        self._ensure_project(self.SELLING_AGENT_ID)
+        with self._manager_lock:
+            self._manager.add_agent(
+                public_id=self.SELLING_AGENT_ID, agent_name=name, agent_overrides=agent_overrides,
+                component_overrides=component_overrides)
 
     def add_purchasing_agent(
             self, name: str, agent_overrides: Optional[dict] = None, component_overrides: Optional[List[dict]] = None):
-        self._manager.add_agent(public_id=self.PURCHASING_AGENT_ID, agent_name=name, agent_overrides=agent_overrides,
-                                component_overrides=component_overrides)
+        self._ensure_project(self.PURCHASING_AGENT_ID)
+        with self._manager_lock:
+            self._manager.add_agent(public_id=self.PURCHASING_AGENT_ID, agent_name=name,
+                                    agent_overrides=agent_overrides, component_overrides=component_overrides)
 
     def run_agent(self, name: str):
-        self._manager.start_agent(name)
+        with self._manager_lock:
+            self._manager.start_agent(name)
+
+    def stop_agent(self, name: str):
+        with self._manager_lock:
+            self._manager.stop_agent(name)
+
+    def list_agents(self, running_only: bool = False) -> List[str]:
+        return self._manager.list_agents(running_only=running_only)
+
+    def get_data_dir_of_agent(self, agent_name: str) -> str:
+        return self._manager.get_data_dir_of_agent(agent_name)
+
+    def provision_agents(self, specs: List[AgentSpec], template: OverridesTemplate,
+                         max_workers: int = DEFAULT_MAX_WORKERS, stagger: float = 0.) -> Dict[str, Dict[str, float]]:
+        """
+        Add and start several agents concurrently with a bounded pool of workers.
+
+        The overrides of each agent are generated by the template from its spec. Agents are submitted
+        stagger seconds apart, max_workers=1 provisions them one by one. The workers create and build the
+        agents concurrently, only registering and starting them in the multi agent manager is serialized,
+        as it is not thread-safe. Returns the seconds needed to add and to start each agent by name,
+        including the seconds waited for the multi agent manager, which are reported as wait as well.
+        """
+        specs = [self.allocate_ports(spec) for spec in specs]
+        # the overrides are generated by the caller, so the template does not need to be picklable for shards
+        items = [(spec, *template(spec)) for spec in specs]
+        return self._provision(items, max_workers, stagger)
+
+    def _provision(self, items: List[Tuple[AgentSpec, dict, List[dict]]], max_workers: int,
+                   stagger: float) -> Dict[str, Dict[str, float]]:
+        for project_id in {self._get_project_id(spec.role) for spec, _, _ in items}:
+            self._ensure_project(project_id)
+
+        def provision(spec: AgentSpec, agent_overrides: dict, component_overrides: List[dict]) -> Dict[str, float]:
+            started = time()
+            agent_alias = self._manager.create_agent_alias(
+                self._get_project_id(spec.role), spec.name, agent_overrides, component_overrides)
+            waiting = time()
+            with self._manager_lock:
+                wait = time() - waiting
+                self._manager.register_agent_alias(agent_alias)
+            added = time()
+            agent = agent_alias.get_aea_instance()
+            waiting = time()
+            with self._manager_lock:
+                wait += time() - waiting
+                self._manager.start_agent_instance(spec.name, agent)
+            return {"add": added - started, "start": time() - added, "wait": wait}
+
+        timings = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for item in items:
+                futures[executor.submit(provision, *item)] = item[0].name
+                if stagger > 0:
+                    sleep(stagger)
+            for future in as_completed(futures):
+                timings[futures[future]] = future.result()
+        return timings
+
+    def allocate_ports(self, spec: AgentSpec) -> AgentSpec:
+        """Allocate free ports for the local and the delegate uri of an agent, unless given by its spec."""
+        return spec._replace(
+            local_port=spec.local_port or self._ports.allocate(),
+            delegate_port=spec.delegate_port or self._ports.allocate())
+
+    def build_topology(self, specs: List[AgentSpec], template: OverridesTemplate, bootstrap: int = 1,
+                       relays: Optional[List[str]] = None, assignment: str = ROUND_ROBIN, k: int = 1,
+                       max_workers: int = DEFAULT_MAX_WORKERS, stagger: float = 0.,
+                       timeout: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Provision agents with their entry peers spread across several bootstrap nodes.
+
+        The entry peers are the given relays, e.g. standalone ACN nodes, or else the first bootstrap
+        agents of the specs, which join the first of them. The remaining agents are assigned to the
+        entry peers by round_robin or k_nearest assignment, see assign_entry_peers.
+        Has to be called from the main thread, returns the provisioning timings by agent name.
+        """
+        timings = {}
+        entry_peers = list(relays or [])
+        if len(entry_peers) == 0:
+            if bootstrap < 1:
+                raise ValueError("Either relays or at least one bootstrap agent are needed!")
+            bootstrap_specs, specs = specs[:bootstrap], specs[bootstrap:]
+            first = bootstrap_specs[0]
+            timings.update(self.provision_agents([first], template))
+            entry_peers = asyncio.run(self.wait_agent_ready(first.name, timeout))[:1]
+            others = [spec._replace(entry_peers=list(entry_peers)) for spec in bootstrap_specs[1:]]
+            timings.update(self.provision_agents(others, template, max_workers, stagger))
+            multiaddrs = asyncio.run(self.wait_agents_ready([spec.name for spec in others], timeout))
+            entry_peers += [multiaddrs[spec.name][0] for spec in others]
+        assigned = assign_entry_peers(len(specs), entry_peers, assignment, k)
+        specs = [spec._replace(entry_peers=peers) for spec, peers in zip(specs, assigned)]
+        timings.update(self.provision_agents(specs, template, max_workers, stagger))
+        return timings
 
     def is_libp2p_log_existent(self, agent_name: str) -> bool:
-        dir = self._manager.get_data_dir_of_agent(agent_name)
+        dir = self.get_data_dir_of_agent(agent_name)
         return os.path.exists(dir + "/" + self.P2P_LOG_FILE)
 
+    def _get_log_tail(self, agent_name: str) -> Libp2pLogTail:
+        if agent_name not in self._log_tails:
+            dir = self.get_data_dir_of_agent(agent_name)
+            self._log_tails[agent_name] = Libp2pLogTail(dir + "/" + self.P2P_LOG_FILE)
+        return self._log_tails[agent_name]
+
     def get_agent_libp2p_multiaddrs(self, agent_name: str) -> List[str]:
-        LIST_START = "MULTIADDRS_LIST_START"
-        LIST_END = "MULTIADDRS_LIST_END"
-        multiaddrs = []
-        dir = self._manager.get_data_dir_of_agent(agent_name)
         if not self.is_libp2p_log_existent(agent_name):
             raise ValueError("libp2p log file for agent " + agent_name + " is not available!")
+        tail = self._get_log_tail(agent_name)
+        tail.read()
+        return list(tail.multiaddrs)
 
-        with open(dir + "/" + self.P2P_LOG_FILE, "r") as f:
-            lines = f.readlines()
+    async def wait_agent_ready(self, agent_name: str, timeout: Optional[float] = None) -> List[str]:
+        """Wait until the libp2p node of an agent announced its multiaddrs and return them."""
+        tail = self._get_log_tail(agent_name)
+        loop = asyncio.get_event_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        # only the lines appended since the last read are parsed
+        while not tail.read():
+            if deadline is not None and loop.time() >= deadline:
+                raise TimeoutError("Agent " + agent_name + " not ready after " + str(timeout) + "s!")
+            await asyncio.sleep(READY_POLL_INTERVAL)
+        return list(tail.multiaddrs)
 
-        found = False
-        for line in lines:
-            if LIST_START in line:
-                found = True
-                multiaddrs = []
-                continue
-            if found:
-                elem = line.strip()
-                if elem != LIST_END and len(elem) != 0:
-                    multiaddrs.append(elem)
-                else:
-                    found = False
-        return multiaddrs
+    async def wait_agents_ready(
+            self, agent_names: List[str], timeout: Optional[float] = None) -> Dict[str, List[str]]:
+        """Wait until the libp2p nodes of several agents are ready, return their multiaddrs by name."""
+        multiaddrs = await asyncio.gather(*(self.wait_agent_ready(name, timeout) for name in agent_names))
+        return dict(zip(agent_names, multiaddrs))
 
     def _shutdown(self):
         if self._manager:
@@ -79,6 +316,8 @@ class MarketplaceManager():
                 self._manager.stop_all_agents()
             finally:
                 self._manager.stop_manager()
+                self._log_tails.clear()
+                self._projects.clear()
 
     def start(self):
         self._init_mam()
@@ -3,13 +3,18 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from cgi import print_form
+import asyncio
 import json
+import logging
 import os.path
 import shutil
 import sys
 import time
-from typing import Any, List, Optional
-from marketplace_manager import MarketplaceManager
+from typing import Any, List, Optional, Tuple
+from marketplace_manager import PURCHASING, SELLING, AgentSpec, MarketplaceManager
+from load_report import TradeRecorder, format_report, write_report
+from sharding import ShardedMarketplaceManager
+from topology import ASSIGNMENTS
 from aea.configurations.base import PublicId
 
 SELLING_AGENT_ID = PublicId.from_str("bosch/selling_agent:0.1.0")
@@ -19,160 +24,244 @@ ETH_KEY_PATH_PREFIX = "../../../keys/eth_priv_key_"
 FETCH_KEY_PATH_PREFIX = "../../../keys/fetch_priv_key_"
 KEY_PATH_SUFFIX = ".txt"
 ETH_ADDRESS = "http://127.0.0.1:8545"
+HOST = "127.0.0.1"
 CONTRACT_ADDRESS_FILE = "contract_address.txt"
+DEPLOYER_ADDRESS = '0x9C8c99D1c21cA01437226AbFeB537411C3f70634'
+KEY_DIR = "keys"
+AEA_LOGGER = "aea"
+READY_TIMEOUT = 120.
+DEFAULT_SCENARIO = {
+    "sellers": {"count": 1, "first_id": 0},
+    "buyers": {"count": 1, "first_id": 3},
+    "stagger": 1.0,
+    "workers": 4,
+    "shards": 0,
+    "first_port": 9000,
+    "topology": {"bootstrap": 1, "relays": [], "assignment": "round_robin", "k": 1},
+    "duration": 0,
+    "max_trades": 0,
+    "report": "load_report.json",
+}
 
 p2p_public_id = PublicId.from_str("fetchai/p2p_libp2p:0.26.0")
 ledger_public_id = PublicId.from_str("fetchai/ledger:0.20.0")
 fipa_selling_public_id = PublicId.from_str("bosch/fipa_negotiation_selling:0.1.0")
 fipa_purchasing_public_id = PublicId.from_str("bosch/fipa_negotiation_purchasing:0.1.0")
 
-mm: MarketplaceManager
+mm: Optional[MarketplaceManager] = None
 contract_address: str
 
 
-def add_selling_agent(agent_name: str, id: int, multiaddr: Optional[str] = None) -> str:
-    if mm:
-        name = agent_name + "_" + str(id)
-        agent_overrides = {
-            "private_key_paths": {"ethereum": ETH_KEY_PATH_PREFIX + str(id) + KEY_PATH_SUFFIX},
-            "connection_private_key_paths": {"fetchai": FETCH_KEY_PATH_PREFIX + str(id) + KEY_PATH_SUFFIX}
+def agent_overrides(spec: AgentSpec) -> Tuple[dict, List[dict]]:
+    """Generate the agent and component overrides of an agent from its spec."""
+    fipa_public_id = fipa_selling_public_id if spec.role == SELLING else fipa_purchasing_public_id
+    agent_overrides = {
+        "private_key_paths": {"ethereum": ETH_KEY_PATH_PREFIX + str(spec.id) + KEY_PATH_SUFFIX},
+        "connection_private_key_paths": {"fetchai": FETCH_KEY_PATH_PREFIX + str(spec.id) + KEY_PATH_SUFFIX}
+    }
+    component_overrides = [{
+        **p2p_public_id.json,
+        "type": "connection",
+        "config": {
+            "delegate_uri": HOST + ":" + str(spec.delegate_port),
+            "entry_peers": list(spec.entry_peers),
+            "local_uri": HOST + ":" + str(spec.local_port),
+            "public_uri": HOST + ":" + str(spec.local_port),
         }
-        entry_peers: List
-        if multiaddr:
-            entry_peers = []
-        else:
-            entry_peers = []
-
-        component_overrides = [{
-            **p2p_public_id.json,
-            "type": "connection",
-            "config": {
-                "delegate_uri": "127.0.0.1:" + str(11000 + id),
-                "entry_peers": entry_peers,
-                "local_uri": "127.0.0.1:" + str(9000 + id),
-                "public_uri": "127.0.0.1:" + str(9000 + id),
-            }
-        }, {
-            **ledger_public_id.json,
-            "type": "connection",
-            "config": {
-                "ledger_apis": {
-                    "ethereum": {
-                        "address": ETH_ADDRESS
-                    }
+    }, {
+        **ledger_public_id.json,
+        "type": "connection",
+        "config": {
+            "ledger_apis": {
+                "ethereum": {
+                    "address": ETH_ADDRESS
                 }
             }
-        }, {
-            **fipa_selling_public_id.json,
-            "type": "skill",
-            "models": {
-                "strategy": {
-                    "args": {
-                        "contract_address": contract_address,
-                        "deployer_address": '0x9C8c99D1c21cA01437226AbFeB537411C3f70634'
-                    }
+        }
+    }, {
+        **fipa_public_id.json,
+        "type": "skill",
+        "models": {
+            "strategy": {
+                "args": {
+                    "contract_address": contract_address,
+                    "deployer_address": DEPLOYER_ADDRESS
                 }
             }
-        }]
+        }
+    }]
+    return agent_overrides, component_overrides
+
+
+def agent_spec(role: str, agent_name: str, id: int, multiaddr: Optional[str] = None) -> AgentSpec:
+    return AgentSpec(name=agent_name + "_" + str(id), role=role, id=id, entry_peers=[multiaddr] if multiaddr else [])
+
+
+def add_selling_agent(agent_name: str, id: int, multiaddr: Optional[str] = None) -> str:
+    if mm:
+        spec = mm.allocate_ports(agent_spec(SELLING, agent_name, id, multiaddr))
+        agent_overrides_, component_overrides = agent_overrides(spec)
         mm.add_selling_agent(
-            name=name, agent_overrides=agent_overrides, component_overrides=component_overrides
+            name=spec.name, agent_overrides=agent_overrides_, component_overrides=component_overrides
         )
-        mm.run_agent(name)
-        return name
+        mm.run_agent(spec.name)
+        return spec.name
     else:
         return None
 
 
 def add_purchasing_agent(agent_name: str, id: int, multiaddr: Optional[str] = None) -> str:
     if mm:
-        name = agent_name + "_" + str(id)
-        agent_overrides = {
-            "private_key_paths": {"ethereum": ETH_KEY_PATH_PREFIX + str(id) + KEY_PATH_SUFFIX},
-            "connection_private_key_paths": {"fetchai": FETCH_KEY_PATH_PREFIX + str(id) + KEY_PATH_SUFFIX}
-        }
-        entry_peers: List
-        if multiaddr:
-            entry_peers = [multiaddr]
-        else:
-            entry_peers = []
-        component_overrides = [{
-            **p2p_public_id.json,
-            "type": "connection",
-            "config": {
-                "delegate_uri": "127.0.0.1:" + str(11000 + id),
-                "entry_peers": entry_peers,
-                "local_uri": "127.0.0.1:" + str(9000 + id),
-                "public_uri": "127.0.0.1:" + str(9000 + id),
-            }
-        }, {
-            **ledger_public_id.json,
-            "type": "connection",
-            "config": {
-                "ledger_apis": {
-                    "ethereum": {
-                        "address": ETH_ADDRESS
-                    }
-                }
-            }
-        }, {
-            **fipa_purchasing_public_id.json,
-            "type": "skill",
-            "models": {
-                "strategy": {
-                    "args": {
-                        "contract_address": contract_address,
-                        "deployer_address": '0x9C8c99D1c21cA01437226AbFeB537411C3f70634'
-                    }
-                }
-            }
-        }]
+        spec = mm.allocate_ports(agent_spec(PURCHASING, agent_name, id, multiaddr))
+        agent_overrides_, component_overrides = agent_overrides(spec)
         mm.add_purchasing_agent(
-            name=name, agent_overrides=agent_overrides, component_overrides=component_overrides
+            name=spec.name, agent_overrides=agent_overrides_, component_overrides=component_overrides
         )
-        mm.run_agent(name)
-        return name
+        mm.run_agent(spec.name)
+        return spec.name
     else:
         return None
 
 
+def load_scenario(scenario_path: str) -> dict:
+    with open(scenario_path) as file:
+        scenario = {**DEFAULT_SCENARIO, **json.load(file)}
+    scenario["topology"] = {**DEFAULT_SCENARIO["topology"], **scenario["topology"]}
+    if scenario["duration"] <= 0 and scenario["max_trades"] <= 0:
+        raise ValueError("Scenario needs a duration or a number of trades to stop!")
+    for role in ("sellers", "buyers"):
+        if scenario[role]["count"] < 1:
+            raise ValueError("Scenario needs at least one of " + role + "!")
+    ids = [role["first_id"] + i for role in (scenario["sellers"], scenario["buyers"]) for i in range(role["count"])]
+    if len(set(ids)) != len(ids):
+        raise ValueError("Agent ids of sellers and buyers overlap!")
+    if scenario["topology"]["assignment"] not in ASSIGNMENTS:
+        raise ValueError("Entry peer assignment has to be one of " + str(ASSIGNMENTS) + "!")
+    if not scenario["topology"]["relays"] and not 0 < scenario["topology"]["bootstrap"] <= len(ids):
+        raise ValueError("Scenario needs relays or between 1 and " + str(len(ids)) + " bootstrap agents!")
+    for id in ids:
+        for prefix in ("eth_priv_key_", "fetch_priv_key_"):
+            if not os.path.exists(os.path.join(KEY_DIR, prefix + str(id) + KEY_PATH_SUFFIX)):
+                raise ValueError("Key " + prefix + str(id) + KEY_PATH_SUFFIX + " is missing in " + KEY_DIR + "!")
+    return scenario
+
+
+def _remove_working_dir(working_dir: str):
+    if os.path.exists(working_dir):
+        print(working_dir + " folder already existent, deletion...")
+        shutil.rmtree(working_dir)
+
+
+def _init(registry_path: str, first_port: int = 9000, shards: int = 0):
+    global mm
+    global contract_address
+    with open(CONTRACT_ADDRESS_FILE) as file:
+        firstline = file.readline().rstrip()
+        if firstline:
+            contract_address = firstline
+        else:
+            raise ValueError("Contract address is missing!")
+    if shards > 1:
+        # one MultiAgentManager per worker process, the shards work in sibling folders of WORKING_DIR
+        mm = ShardedMarketplaceManager(working_dir=WORKING_DIR, registry_path=registry_path,
+                                       purchasing_agent_id=PURCHASING_AGENT_ID, selling_agent_id=SELLING_AGENT_ID,
+                                       host=HOST, first_port=first_port, shards=shards)
+        for working_dir in mm.shard_working_dirs:
+            _remove_working_dir(working_dir)
+    else:
+        _remove_working_dir(WORKING_DIR)
+        mm = MarketplaceManager(working_dir=WORKING_DIR, registry_path=registry_path,
+                                purchasing_agent_id=PURCHASING_AGENT_ID, selling_agent_id=SELLING_AGENT_ID,
+                                host=HOST, first_port=first_port)
+    mm.start()
+
+
+def _get_entry_peer(name: str) -> str:
+    # Waiting has to be done in main thread to not block other threads to start agent
+    multiaddrs = asyncio.run(mm.wait_agent_ready(name, READY_TIMEOUT))
+    # Currently expecting one entry for address to be joined
+    agent_p2p_address = multiaddrs[0]
+    print(name + " P2P address is " + agent_p2p_address)
+    return agent_p2p_address
+
+
+def _attach(recorder: TradeRecorder):
+    # the agents configure the aea logger on start-up, which drops foreign handlers
+    logger = logging.getLogger(AEA_LOGGER)
+    if recorder not in logger.handlers:
+        logger.addHandler(recorder)
+    if logger.getEffectiveLevel() > logging.INFO:
+        logger.setLevel(logging.INFO)
+
+
 def run(registry_path: str):
     try:
-        global mm
-        global contract_address
-        with open(CONTRACT_ADDRESS_FILE) as file:
-            firstline = file.readline().rstrip()
-            if firstline:
-                contract_address = firstline
-            else:
-                raise ValueError("Contract address is missing!")
-        if os.path.exists(WORKING_DIR):
-            print(WORKING_DIR + " folder already existent, deletion...")
-            shutil.rmtree(WORKING_DIR)
-        mm = MarketplaceManager(working_dir=WORKING_DIR, registry_path=registry_path,
-                                purchasing_agent_id=PURCHASING_AGENT_ID, selling_agent_id=SELLING_AGENT_ID)
-        mm.start()
+        _init(registry_path)
         print("Adding Selling Agent...")
         name_0 = add_selling_agent("SellingAgent", 0)
-        # Wait for file with sleep has to be done in main thread to not block other threads to start agent
-        while not mm.is_libp2p_log_existent(name_0):
-            time.sleep(1.)
-        # Currently expecting one entry for address to be joined
-        agent_p2p_address = mm.get_agent_libp2p_multiaddrs(name_0)[0]
-        print(name_0 + " P2P address is " + agent_p2p_address)
+        agent_p2p_address = _get_entry_peer(name_0)
         print("Adding Purchasing Agent...")
         add_purchasing_agent("PurchasingAgent", 3, agent_p2p_address)
-        # TODO: Find criteria to stop scenario
+        # Run until interrupted, use a scenario file for a bounded run
+        while True:
+            time.sleep(1.)
+    finally:
+        if mm:
+            print("Stopping Marketplace Manager...")
+            mm.stop()
+
+
+def run_load(registry_path: str, scenario_path: str):
+    scenario = load_scenario(scenario_path)
+    sellers, buyers = scenario["sellers"], scenario["buyers"]
+    buyer_names = ["PurchasingAgent_" + str(buyers["first_id"] + i) for i in range(buyers["count"])]
+    recorder = TradeRecorder(buyer_names)
+    try:
+        _init(registry_path, scenario["first_port"], scenario["shards"])
+        topology = scenario["topology"]
+        specs = [
+            agent_spec(SELLING, "SellingAgent", sellers["first_id"] + i) for i in range(sellers["count"])
+        ] + [
+            agent_spec(PURCHASING, "PurchasingAgent", buyers["first_id"] + i) for i in range(buyers["count"])
+        ]
+        print("Adding " + str(len(specs)) + " agents with " + str(scenario["workers"]) + " workers...")
+        provisioning = mm.build_topology(
+            specs, agent_overrides, topology["bootstrap"], topology["relays"], topology["assignment"], topology["k"],
+            scenario["workers"], scenario["stagger"], READY_TIMEOUT)
+        for name, timing in sorted(provisioning.items()):
+            print("{} added in {:.2f}s, started in {:.2f}s, waited {:.2f}s for the manager".format(
+                name, timing["add"], timing["start"], timing["wait"]))
+        _attach(recorder)
+        names = [spec.name for spec in specs]
+        asyncio.run(mm.wait_agents_ready(names, READY_TIMEOUT))
+        print("All agents are ready")
+        started = time.time()
         while True:
+            _attach(recorder)
+            if 0 < scenario["duration"] <= time.time() - started:
+                print("Scenario duration of " + str(scenario["duration"]) + "s elapsed")
+                break
+            if 0 < scenario["max_trades"] <= recorder.trades:
+                print("Scenario reached " + str(recorder.trades) + " trades")
+                break
             time.sleep(1.)
+        report = recorder.report(scenario, started, time.time())
+        report["provisioning"] = provisioning
+        write_report(report, scenario["report"])
+        print(format_report(report))
     finally:
+        logging.getLogger(AEA_LOGGER).removeHandler(recorder)
         if mm:
             print("Stopping Marketplace Manager...")
             mm.stop()
 
 
 if __name__ == "__main__":
-    if len(sys.argv) == 2 and len(sys.argv[1]) > 2:
+    if len(sys.argv) in (2, 3) and len(sys.argv[1]) > 2:
         print("AEA Registry path given: " + sys.argv[1])
+        if len(sys.argv) == 3:
+            print("Load scenario given: " + sys.argv[2])
+            sys.exit(run_load(sys.argv[1], sys.argv[2]))
         sys.exit(run(sys.argv[1]))
     else:
         print("No registry path given as argument!")
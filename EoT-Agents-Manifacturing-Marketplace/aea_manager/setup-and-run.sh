@@ -17,7 +17,7 @@ then
 
     echo "Starting scenario..."
     cd $script_absolute
-    python scenario.py $1
+    python scenario.py $1 $2
 else
     echo "No local registry path given!"
 fi
\ No newline at end of file
@@ -0,0 +1,260 @@
+# Copyright (c) 2021 - for information on the respective copyright owner see the NOTICE file and/or the repository https://github.com/boschresearch/open-eot-agents.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional, Tuple
+
+from aea.configurations.base import PublicId
+from marketplace_manager import AgentSpec, MarketplaceManager
+from topology import DEFAULT_FIRST_PORT, DEFAULT_HOST
+
+AEA_LOGGER = "aea"
+SHARD_POLL_INTERVAL = 1.
+SHARD_START_TIMEOUT = 120.
+SHARD_STOP_TIMEOUT = 30.
+STOP = "stop"
+# the commands a shard accepts on its control channel
+SHARD_COMMANDS = (
+    "add_selling_agent", "add_purchasing_agent", "run_agent", "stop_agent", "list_agents",
+    "get_data_dir_of_agent", "_provision", STOP,
+)
+
+
+def _attach(handler: logging.Handler):
+    # the agents configure the aea logger on start-up, which drops foreign handlers
+    logger = logging.getLogger(AEA_LOGGER)
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+    if logger.getEffectiveLevel() > logging.INFO:
+        logger.setLevel(logging.INFO)
+
+
+def _send_result(connection: Any, result: Tuple[bool, Any]):
+    try:
+        connection.send(result)
+    except Exception as e:  # pylint: disable=broad-except
+        # the result or the exception could not be pickled
+        connection.send((False, RuntimeError(repr(e))))
+
+
+def _run_shard(working_dir: str, registry_path: str, selling_agent_id: str, purchasing_agent_id: str,
+               connection: Any, log_queue: Any):
+    """Run a marketplace manager within a worker process and serve the commands of the parent."""
+    log_handler = QueueHandler(log_queue)
+    try:
+        manager = MarketplaceManager(working_dir=working_dir, registry_path=registry_path,
+                                     selling_agent_id=PublicId.from_str(selling_agent_id),
+                                     purchasing_agent_id=PublicId.from_str(purchasing_agent_id))
+        manager.start()
+    except Exception as e:  # pylint: disable=broad-except
+        # the parent waits for the start-up of every shard
+        _send_result(connection, (False, e))
+        return
+    try:
+        connection.send((True, None))
+        while True:
+            _attach(log_handler)
+            if not connection.poll(SHARD_POLL_INTERVAL):
+                continue
+            command, args, kwargs = connection.recv()
+            if command == STOP:
+                break
+            try:
+                result = (True, getattr(manager, command)(*args, **kwargs))
+            except Exception as e:  # pylint: disable=broad-except
+                result = (False, e)
+            _send_result(connection, result)
+    finally:
+        try:
+            manager.stop()
+        finally:
+            logging.getLogger(AEA_LOGGER).removeHandler(log_handler)
+            connection.send((True, None))
+
+
+class _ForwardHandler(logging.Handler):
+    """Hand the log records of the shards to the handlers of the aea logger of the parent."""
+
+    def emit(self, record: logging.LogRecord):
+        for handler in logging.getLogger(AEA_LOGGER).handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+class _Shard():
+
+    def __init__(self, index: int, working_dir: str, process: Any, connection: Any, timeout: Optional[float] = None):
+        self.index = index
+        self.working_dir = working_dir
+        self.process = process
+        self.agents = set()  # type: set
+        self.timeout = timeout
+        self._connection = connection
+        self._lock = threading.Lock()
+        self._is_broken = False
+
+    def receive(self, timeout: Optional[float] = None) -> Any:
+        """Wait for the next result of the shard, fail if it exits or does not answer within timeout seconds."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while not self._connection.poll(SHARD_POLL_INTERVAL):
+                if not self.process.is_alive():
+                    raise RuntimeError("Shard " + str(self.index) + " exited with code "
+                                       + str(self.process.exitcode) + "!")
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError("Shard " + str(self.index) + " did not answer within " + str(timeout) + "s!")
+            is_ok, result = self._connection.recv()
+        except (EOFError, OSError):
+            self._is_broken = True
+            raise RuntimeError("Shard " + str(self.index) + " closed its connection!")
+        except Exception:
+            # a late answer would be taken as the result of the next command
+            self._is_broken = True
+            raise
+        if not is_ok:
+            raise result
+        return result
+
+    def call(self, command: str, *args: Any, **kwargs: Any) -> Any:
+        if command not in SHARD_COMMANDS:
+            raise ValueError("Unknown shard command " + command + "!")
+        with self._lock:
+            if self._is_broken:
+                raise RuntimeError("Shard " + str(self.index) + " is not usable anymore!")
+            try:
+                self._connection.send((command, args, kwargs))
+            except OSError:
+                self._is_broken = True
+                raise RuntimeError("Shard " + str(self.index) + " closed its connection!")
+            return self.receive(SHARD_STOP_TIMEOUT if command == STOP else self.timeout)
+
+
+class ShardedMarketplaceManager(MarketplaceManager):
+    """
+    Partition the agents across worker processes, each running its own MultiAgentManager.
+
+    The parent allocates the ports, generates the overrides and waits for readiness, the shards only
+    add, start and stop agents. The log records of the agents are forwarded to the aea logger of the
+    parent, so log based metrics are aggregated over all shards. A call to a shard fails once its process
+    exited or, if shard_timeout is set, it did not answer within shard_timeout seconds.
+    """
+
+    def __init__(self, working_dir: str, registry_path: str, selling_agent_id: PublicId, purchasing_agent_id: PublicId,
+                 host: str = DEFAULT_HOST, first_port: int = DEFAULT_FIRST_PORT, shards: Optional[int] = None,
+                 shard_timeout: Optional[float] = None):
+        super().__init__(working_dir, registry_path, selling_agent_id, purchasing_agent_id, host, first_port)
+        self.SHARDS = shards or multiprocessing.cpu_count()
+        self.SHARD_TIMEOUT = shard_timeout
+        self._shards = []  # type: List[_Shard]
+        self._agent_shards = {}  # type: Dict[str, _Shard]
+        self._data_dirs = {}  # type: Dict[str, str]
+        self._log_listener = None  # type: Optional[QueueListener]
+
+    @property
+    def shard_working_dirs(self) -> List[str]:
+        return [self.WORKING_DIR + "_" + str(index) for index in range(self.SHARDS)]
+
+    def _init_mam(self):
+        # spawn instead of fork, the parent already runs threads
+        context = multiprocessing.get_context("spawn")
+        log_queue = context.Queue()
+        self._log_listener = QueueListener(log_queue, _ForwardHandler())
+        self._log_listener.start()
+        for index, working_dir in enumerate(self.shard_working_dirs):
+            parent_connection, child_connection = context.Pipe()
+            process = context.Process(
+                target=_run_shard, name="marketplace_shard_" + str(index),
+                args=(working_dir, self.REGISTRY_PATH, str(self.SELLING_AGENT_ID), str(self.PURCHASING_AGENT_ID),
+                      child_connection, log_queue))
+            process.start()
+            # only the child keeps its end open, so the parent sees EOF if the child dies
+            child_connection.close()
+            self._shards.append(_Shard(index, working_dir, process, parent_connection, self.SHARD_TIMEOUT))
+        try:
+            # wait until all shards are up
+            for shard in self._shards:
+                shard.receive(SHARD_START_TIMEOUT)
+        except Exception:
+            self._shutdown()
+            raise
+
+    def _next_shard(self) -> _Shard:
+        return min(self._shards, key=lambda shard: len(shard.agents))
+
+    def _get_shard(self, name: str) -> _Shard:
+        if name not in self._agent_shards:
+            raise ValueError("Agent " + name + " is not managed by any shard!")
+        return self._agent_shards[name]
+
+    def _assign(self, name: str) -> _Shard:
+        shard = self._next_shard()
+        shard.agents.add(name)
+        self._agent_shards[name] = shard
+        return shard
+
+    def add_selling_agent(
+            self, name: str, agent_overrides: Optional[dict] = None, component_overrides: Optional[List[dict]] = None):
+        self._assign(name).call("add_selling_agent", name, agent_overrides, component_overrides)
+
+    def add_purchasing_agent(
+            self, name: str, agent_overrides: Optional[dict] = None, component_overrides: Optional[List[dict]] = None):
+        self._assign(name).call("add_purchasing_agent", name, agent_overrides, component_overrides)
+
+    def run_agent(self, name: str):
+        self._get_shard(name).call("run_agent", name)
+
+    def stop_agent(self, name: str):
+        self._get_shard(name).call("stop_agent", name)
+
+    def list_agents(self, running_only: bool = False) -> List[str]:
+        return [name for shard in self._shards for name in shard.call("list_agents", running_only)]
+
+    def get_data_dir_of_agent(self, agent_name: str) -> str:
+        if agent_name not in self._data_dirs:
+            self._data_dirs[agent_name] = self._get_shard(agent_name).call("get_data_dir_of_agent", agent_name)
+        return self._data_dirs[agent_name]
+
+    def _provision(self, items: List[Tuple[AgentSpec, dict, List[dict]]], max_workers: int,
+                   stagger: float) -> Dict[str, Dict[str, float]]:
+        partitions = {}  # type: Dict[int, List[Tuple[AgentSpec, dict, List[dict]]]]
+        for item in items:
+            partitions.setdefault(self._assign(item[0].name).index, []).append(item)
+        timings = {}
+        if len(partitions) == 0:
+            return timings
+        # every shard provisions its partition with its own pool of max_workers
+        with ThreadPoolExecutor(max_workers=len(partitions)) as executor:
+            futures = [
+                executor.submit(self._shards[index].call, "_provision", partition, max_workers, stagger)
+                for index, partition in partitions.items()
+            ]
+            for future in futures:
+                timings.update(future.result())
+        return timings
+
+    def _shutdown(self):
+        try:
+            for shard in self._shards:
+                try:
+                    shard.call(STOP)
+                except Exception as e:  # pylint: disable=broad-except
+                    # stop the remaining shards anyway
+                    logging.getLogger(AEA_LOGGER).warning("Shard %s did not stop cleanly: %s", shard.index, e)
+                finally:
+                    shard.process.join(SHARD_STOP_TIMEOUT)
+                    if shard.process.is_alive():
+                        shard.process.terminate()
+        finally:
+            self._shards = []
+            self._agent_shards.clear()
+            self._data_dirs.clear()
+            self._log_tails.clear()
+            if self._log_listener:
+                self._log_listener.stop()
+                self._log_listener = None
@@ -0,0 +1,69 @@
+# Copyright (c) 2021 - for information on the respective copyright owner see the NOTICE file and/or the repository https://github.com/boschresearch/open-eot-agents.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import socket
+import threading
+from typing import List
+
+ROUND_ROBIN = "round_robin"
+K_NEAREST = "k_nearest"
+ASSIGNMENTS = (ROUND_ROBIN, K_NEAREST)
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_FIRST_PORT = 9000
+MAX_PORT = 65535
+
+
+class PortAllocator():
+    """Hand out free local ports, skipping ports which are already bound by other processes."""
+
+    def __init__(self, host: str = DEFAULT_HOST, first_port: int = DEFAULT_FIRST_PORT):
+        self.host = host
+        self._next_port = first_port
+        self._lock = threading.Lock()
+
+    def allocate(self) -> int:
+        with self._lock:
+            while self._next_port <= MAX_PORT:
+                port = self._next_port
+                self._next_port += 1
+                if self._is_free(port):
+                    return port
+        raise ValueError("No free port left on " + self.host + "!")
+
+    def _is_free(self, port: int) -> bool:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            try:
+                sock.bind((self.host, port))
+            except OSError:
+                return False
+        return True
+
+
+def assign_entry_peers(count: int, entry_peers: List[str], assignment: str = ROUND_ROBIN, k: int = 1) -> List[List[str]]:
+    """
+    Assign entry peers to count agents, so the ACN traffic spreads across the entry peers.
+
+    round_robin assigns one entry peer per agent in turn. k_nearest lays out agents and entry peers
+    evenly on a ring in provisioning order and assigns the k entry peers nearest to each agent, so
+    agents provisioned together share their entry peers while the load stays balanced.
+    """
+    if len(entry_peers) == 0:
+        raise ValueError("At least one entry peer is needed!")
+    if assignment == ROUND_ROBIN:
+        return [[entry_peers[i % len(entry_peers)]] for i in range(count)]
+    if assignment == K_NEAREST:
+        n = len(entry_peers)
+        k = max(1, min(k, n))
+
+        def distance(position: float, peer: int) -> float:
+            offset = abs(position - peer) % n
+            return min(offset, n - offset)
+
+        assigned = []
+        for i in range(count):
+            position = i * n / count
+            nearest = sorted(range(n), key=lambda peer: (distance(position, peer), peer))[:k]
+            assigned.append([entry_peers[peer] for peer in nearest])
+        return assigned
+    raise ValueError("Unknown entry peer assignment " + assignment + ", expected one of " + str(ASSIGNMENTS) + "!")
@@ -0,0 +1,5 @@
+# Copyright (c) 2021 - for information on the respective copyright owner see the NOTICE file and/or the repository https://github.com/boschresearch/open-eot-agents.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""This module contains the batch-payment contract definition."""
@@ -0,0 +1,195 @@
+# Copyright (c) 2021 - for information on the respective copyright owner see the NOTICE file and/or the repository https://github.com/boschresearch/open-eot-agents.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""This module contains the batch-payment contract definition."""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from aea.common import Address
+from aea.configurations.base import PublicId
+from aea.contracts.base import Contract
+from aea.crypto.base import LedgerApi
+from aea_ledger_ethereum.ethereum import EthereumApi
+from web3 import Web3
+
+
+# fallback if the gas cannot be estimated, a transfer and its event cost a constant amount of gas per recipient
+BASE_GAS = 50000
+PAYMENT_GAS = 50000
+DEFAULT_GAS_MARGIN = 1.2
+DEFAULT_GAS_PRICE = 50
+# geth nodes do not mine transactions tipping less than their --miner.gasprice, 1 gwei by default
+DEFAULT_MAX_PRIORITY_FEE_PER_GAS = 1
+PAYMENT_FAILED_TOPIC = Web3.keccak(text="PaymentFailed(address,address,uint256,string)").hex()
+
+_logger = logging.getLogger("aea.packages.bosch.contracts.batch_payment.contract")
+# the agents only call the contract deployed by the truffle migrations, so the interface they use is declared here
+# instead of being loaded from a build artifact, it has to match service-directory/contracts/BatchPayment.sol
+ABI = [
+    {
+        "inputs": [
+            {"name": "recipients", "type": "address[]"},
+            {"name": "amounts", "type": "uint256[]"},
+            {"name": "references", "type": "string[]"},
+        ],
+        "name": "pay",
+        "outputs": [],
+        "stateMutability": "payable",
+        "type": "function",
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": False, "name": "payer", "type": "address"},
+            {"indexed": False, "name": "recipient", "type": "address"},
+            {"indexed": False, "name": "amount", "type": "uint256"},
+            {"indexed": False, "name": "reference", "type": "string"},
+        ],
+        "name": "Payment",
+        "type": "event",
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": False, "name": "payer", "type": "address"},
+            {"indexed": True, "name": "recipient", "type": "address"},
+            {"indexed": False, "name": "amount", "type": "uint256"},
+            {"indexed": False, "name": "reference", "type": "string"},
+        ],
+        "name": "PaymentFailed",
+        "type": "event",
+    },
+]
+
+
+class BatchPayment(Contract):
+    """The contract class as interface to a smart contract."""
+
+    PUBLIC_ID = PublicId.from_str("bosch/batch_payment:0.1.0")
+
+    @classmethod
+    def get_instance(cls, ledger_api: LedgerApi, contract_address: Optional[str] = None) -> Any:
+        """
+        Get the instance of the deployed contract from the interface declared in this module.
+
+        :param ledger_api: the ledger API
+        :param contract_address: the address of the contract
+        :return: the contract instance
+        """
+        if contract_address is None:
+            return ledger_api.api.eth.contract(abi=ABI)
+        return ledger_api.api.eth.contract(address=ledger_api.api.toChecksumAddress(contract_address), abi=ABI)
+
+    def pay(
+        cls,
+        ledger_api: LedgerApi,
+        contract_address: Address,
+        deployer_address: Address,
+        recipients: List[Address],
+        amounts: List[int],
+        references: List[str],
+        data: Optional[bytes] = b"",
+        gas: Optional[int] = None,
+        gas_margin: float = DEFAULT_GAS_MARGIN,
+        gas_price: float = DEFAULT_GAS_PRICE,
+        max_fee_per_gas: Optional[float] = None,
+        max_priority_fee_per_gas: float = DEFAULT_MAX_PRIORITY_FEE_PER_GAS,
+    ) -> Dict[str, Any]:
+        """
+        Get the transaction to pay several recipients at once.
+
+        A payment rejected by its recipient does not revert the others, its amount is refunded to the payer.
+
+        :param ledger_api: the ledger API
+        :param contract_address: the address of the contract
+        :param deployer_address: the address of the payer
+        :param recipients: the addresses to be paid
+        :param amounts: the amounts to be paid to the recipients
+        :param references: the references of the payments, e.g. the nonces of the terms
+        :param data: the data to include in the transaction
+        :param gas: the gas to be used, estimated if not given
+        :param gas_margin: the factor the estimated gas is multiplied with
+        :param gas_price: the gas price in gwei, used if no EIP-1559 fees are given
+        :param max_fee_per_gas: the EIP-1559 max fee per gas in gwei
+        :param max_priority_fee_per_gas: the EIP-1559 max priority fee per gas in gwei
+        :return: the transaction object
+        """
+        if ledger_api.identifier == EthereumApi.identifier:
+            instance = cls.get_instance(ledger_api, contract_address)
+            function = instance.functions.pay(recipients, amounts, references)
+            sender_address = ledger_api.api.toChecksumAddress(deployer_address)
+            if gas is None:
+                try:
+                    gas = int(function.estimateGas({"from": sender_address, "value": sum(amounts)}) * gas_margin)
+                except Exception as e:  # pylint: disable=broad-except
+                    _logger.warning("Could not estimate gas of pay: {}".format(e))
+                    gas = BASE_GAS + PAYMENT_GAS * len(recipients)
+            # the nonce is reserved by the ledger connection for the sender of the transaction
+            params = {
+                "from": sender_address,
+                "value": sum(amounts),
+                "gas": gas,
+            }
+            if max_fee_per_gas is not None:
+                params["maxFeePerGas"] = ledger_api.api.toWei(max_fee_per_gas, "gwei")
+                params["maxPriorityFeePerGas"] = ledger_api.api.toWei(max_priority_fee_per_gas, "gwei")
+            else:
+                params["gasPrice"] = ledger_api.api.toWei(gas_price, "gwei")
+            tx = function.buildTransaction(params)
+            return tx
+
+    def getPayments(
+        cls,
+        ledger_api: LedgerApi,
+        contract_address: Address,
+        deployer_address: Address,
+        transaction_digest: str,
+        data: Optional[bytes] = b"",
+        gas: int = 300000,
+    ) -> Dict[str, Any]:
+        """
+        Get the payments settled by a transaction of the contract.
+
+        :param ledger_api: the ledger API
+        :param contract_address: the address of the contract
+        :param deployer_address: the address of the deployer
+        :param transaction_digest: the digest of the batch payment transaction
+        :param data: the data to include in the transaction
+        :param gas: the gas to be used
+        :return: whether the transaction is settled and its payments
+        """
+        if ledger_api.identifier == EthereumApi.identifier:
+            instance = cls.get_instance(ledger_api, contract_address)
+            receipt = ledger_api.api.eth.getTransactionReceipt(transaction_digest)
+            if receipt is None or receipt["to"] != instance.address:
+                return {"is_settled": False, "payments": []}
+            payments = [
+                {
+                    "payer": log["args"]["payer"],
+                    "recipient": log["args"]["recipient"],
+                    "amount": log["args"]["amount"],
+                    "reference": log["args"]["reference"],
+                }
+                for log in instance.events.Payment().processReceipt(receipt)
+            ]
+            return {"is_settled": receipt["status"] == 1, "payments": payments}
+
+    @staticmethod
+    def get_failed_recipients(receipt: Dict[str, Any]) -> List[Address]:
+        """
+        Get the recipients of the payments which failed within a batch payment and were refunded.
+
+        :param receipt: the receipt of the batch payment transaction
+        :return: the addresses of the recipients
+        """
+        failed_recipients = []  # type: List[Address]
+        for log in receipt.get("logs", []):
+            topics = [
+                topic.hex() if isinstance(topic, bytes) else str(topic)
+                for topic in log.get("topics", [])
+            ]
+            if len(topics) > 1 and topics[0][-64:].lower() == PAYMENT_FAILED_TOPIC[-64:].lower():
+                failed_recipients.append(Web3.toChecksumAddress("0x" + topics[1][-40:]))
+        return failed_recipients
@@ -16,11 +16,93 @@ from aea.crypto.base import LedgerApi
 from aea_ledger_ethereum.ethereum import EthereumApi
 
 
+# fallback if the gas cannot be estimated, adding and removing a service costs a constant amount of gas per topic
+BASE_GAS = 50000
+ADD_SERVICE_GAS = 200000
+REMOVE_SERVICE_GAS = 60000
+DEFAULT_GAS_MARGIN = 1.2
+DEFAULT_GAS_PRICE = 50
+# geth nodes do not mine transactions tipping less than their --miner.gasprice, 1 gwei by default
+DEFAULT_MAX_PRIORITY_FEE_PER_GAS = 1
+DEFAULT_PAGE_SIZE = 50
+# nodes limit the blocks or the results of a single log query
+DEFAULT_MAX_BLOCK_RANGE = 5000
+# the truffle artifact of the package predates getServiceEndpointsPage, so the function is declared here
+# until the artifact is regenerated with service-directory/update-contract-artifacts.sh
+GET_SERVICE_ENDPOINTS_PAGE_ABI = [
+    {
+        "inputs": [
+            {"name": "topic", "type": "string"},
+            {"name": "offset", "type": "uint256"},
+            {"name": "limit", "type": "uint256"},
+        ],
+        "name": "getServiceEndpointsPage",
+        "outputs": [
+            {"name": "", "type": "string[]"},
+            {"name": "", "type": "uint256"},
+        ],
+        "stateMutability": "view",
+        "type": "function",
+    },
+]
+
+_logger = logging.getLogger("aea.packages.bosch.contracts.service_directory.contract")
+
+
 class ServiceDirectory(Contract):
     """The contract class as interface to a smart contract."""
 
     PUBLIC_ID = PublicId.from_str("bosch/service_directory:0.1.0")
 
+    def _build_transaction(
+        cls,
+        ledger_api: LedgerApi,
+        function: Any,
+        callable_name: str,
+        sender_address: Address,
+        fallback_gas: int,
+        gas: Optional[int] = None,
+        gas_margin: float = DEFAULT_GAS_MARGIN,
+        gas_price: float = DEFAULT_GAS_PRICE,
+        max_fee_per_gas: Optional[float] = None,
+        max_priority_fee_per_gas: float = DEFAULT_MAX_PRIORITY_FEE_PER_GAS,
+    ) -> Dict[str, Any]:
+        """
+        Build the transaction of a contract function with estimated gas and fee fields.
+
+        The gas is estimated for each transaction, as it depends on the state of the contract,
+        e.g. adding a service which exists already costs far less gas than adding a new one.
+
+        :param ledger_api: the ledger API
+        :param function: the bound contract function
+        :param callable_name: the name of the callable
+        :param sender_address: the address sending the transaction
+        :param fallback_gas: the gas to be used if it cannot be estimated
+        :param gas: the gas to be used, estimated if not given
+        :param gas_margin: the factor the estimated gas is multiplied with
+        :param gas_price: the gas price in gwei, used if no EIP-1559 fees are given
+        :param max_fee_per_gas: the EIP-1559 max fee per gas in gwei
+        :param max_priority_fee_per_gas: the EIP-1559 max priority fee per gas in gwei
+        :return: the transaction object
+        """
+        if gas is None:
+            try:
+                gas = int(function.estimateGas({"from": sender_address}) * gas_margin)
+            except Exception as e:  # pylint: disable=broad-except
+                _logger.warning("Could not estimate gas of {}: {}".format(callable_name, e))
+                gas = fallback_gas
+        # the nonce is reserved by the ledger connection for the sender of the transaction
+        params = {
+            "from": ledger_api.api.toChecksumAddress(sender_address),
+            "gas": gas,
+        }
+        if max_fee_per_gas is not None:
+            params["maxFeePerGas"] = ledger_api.api.toWei(max_fee_per_gas, "gwei")
+            params["maxPriorityFeePerGas"] = ledger_api.api.toWei(max_priority_fee_per_gas, "gwei")
+        else:
+            params["gasPrice"] = ledger_api.api.toWei(gas_price, "gwei")
+        return function.buildTransaction(params)
+
     def addServices(
         cls,
         ledger_api: LedgerApi,
@@ -29,7 +111,8 @@ class ServiceDirectory(Contract):
         topics,
         endpoint,
         data: Optional[bytes] = b"",
-        gas: int = 300000,
+        gas: Optional[int] = None,
+        **fee_kwargs: Any,
     ) -> Dict[str, Any]:
         """
         Get the transaction to add a service for an endpoint.
@@ -40,21 +123,21 @@ class ServiceDirectory(Contract):
         :param topic: the service topic to add
         :param endpoint: the address to which a service topic is added
         :param data: the data to include in the transaction
-        :param gas: the gas to be used
+        :param gas: the gas to be used, estimated if not given
+        :param fee_kwargs: the gas_margin, gas_price, max_fee_per_gas and max_priority_fee_per_gas
         :return: the transaction object
         """
         if ledger_api.identifier == EthereumApi.identifier:
-            nonce = ledger_api.api.eth.getTransactionCount(deployer_address)
             instance = cls.get_instance(ledger_api, contract_address)
-            tx = instance.functions.addServices(topics, endpoint).buildTransaction(
-                {
-                    "gas": gas,
-                    "gasPrice": ledger_api.api.toWei("50", "gwei"),
-                    "nonce": nonce,
-                }
+            tx = cls._build_transaction(
+                ledger_api,
+                instance.functions.addServices(topics, endpoint),
+                "addServices",
+                deployer_address,
+                BASE_GAS + ADD_SERVICE_GAS * len(topics),
+                gas,
+                **fee_kwargs,
             )
-            #print("This is the contract TX:")
-            # print(tx)
             return tx
 
     def removeServices(
@@ -64,7 +147,8 @@ class ServiceDirectory(Contract):
         deployer_address: Address,
         topics,
         data: Optional[bytes] = b"",
-        gas: int = 300000,
+        gas: Optional[int] = None,
+        **fee_kwargs: Any,
     ) -> Dict[str, Any]:
         """
         Get the transaction to remove a service for an endpoint.
@@ -74,22 +158,21 @@ class ServiceDirectory(Contract):
         :param deployer_address: the address of the deployer
         :param topic: the service topic to remove
         :param data: the data to include in the transaction
-        :param gas: the gas to be used
+        :param gas: the gas to be used, estimated if not given
+        :param fee_kwargs: the gas_margin, gas_price, max_fee_per_gas and max_priority_fee_per_gas
         :return: the transaction object
         """
         if ledger_api.identifier == EthereumApi.identifier:
-            nonce = ledger_api.api.eth.getTransactionCount(deployer_address)
             instance = cls.get_instance(ledger_api, contract_address)
-            tx = instance.functions.removeServices(topics).buildTransaction(
-                {
-                    "gas": gas,
-                    "gasPrice": ledger_api.api.toWei("50", "gwei"),
-                    "nonce": nonce,
-                }
+            tx = cls._build_transaction(
+                ledger_api,
+                instance.functions.removeServices(topics),
+                "removeServices",
+                deployer_address,
+                BASE_GAS + REMOVE_SERVICE_GAS * len(topics),
+                gas,
+                **fee_kwargs,
             )
-            #print("This is the contract TX:")
-            # print(type(tx))
-            # print(tx)
             return tx
 
     def getServiceEndpoints(
@@ -113,8 +196,115 @@ class ServiceDirectory(Contract):
         :return: the service endpoint
         """
         if ledger_api.identifier == EthereumApi.identifier:
-            nonce = ledger_api.api.eth.getTransactionCount(deployer_address)
             instance = cls.get_instance(ledger_api, contract_address)
             endpoints = instance.functions.getServiceEndpoints(topic).call()
             result = {topic: endpoints}
             return {"topic": result}
+
+    def getServiceEndpointsPage(
+        cls,
+        ledger_api: LedgerApi,
+        contract_address: Address,
+        deployer_address: Address,
+        topic: str,
+        offset: int = 0,
+        limit: int = DEFAULT_PAGE_SIZE,
+        data: Optional[bytes] = b"",
+        gas: int = 300000,
+    ) -> Dict[str, Any]:
+        """
+        Get one page of the service endpoints of a topic.
+
+        Pages are taken from the current endpoints of the topic, not from a snapshot. A service removed
+        between two pages moves the last endpoint into its position, so that endpoint is skipped or repeated
+        when it moves across the offset of the next page.
+
+        :param ledger_api: the ledger API
+        :param contract_address: the address of the contract
+        :param deployer_address: the address of the deployer
+        :param topic: the service topic
+        :param offset: the position of the first endpoint of the page
+        :param limit: the maximum number of endpoints of the page
+        :param data: the data to include in the transaction
+        :param gas: the gas to be used
+        :return: the service endpoints of the page, its offset and the total number of endpoints
+        """
+        if ledger_api.identifier == EthereumApi.identifier:
+            instance = ledger_api.api.eth.contract(
+                address=ledger_api.api.toChecksumAddress(contract_address), abi=GET_SERVICE_ENDPOINTS_PAGE_ABI)
+            endpoints, total = instance.functions.getServiceEndpointsPage(topic, offset, limit).call()
+            return {"topic": {topic: list(endpoints)}, "offset": offset, "total": total}
+
+    def getServiceEndpointsTopics(
+        cls,
+        ledger_api: LedgerApi,
+        contract_address: Address,
+        deployer_address: Address,
+        topics: List[str],
+        data: Optional[bytes] = b"",
+        gas: int = 300000,
+    ) -> Dict[str, Any]:
+        """
+        Get the service endpoints of several topics within one call.
+
+        :param ledger_api: the ledger API
+        :param contract_address: the address of the contract
+        :param deployer_address: the address of the deployer
+        :param topics: the service topics to look up
+        :param data: the data to include in the transaction
+        :param gas: the gas to be used
+        :return: the service endpoints by topic
+        """
+        if ledger_api.identifier == EthereumApi.identifier:
+            instance = cls.get_instance(ledger_api, contract_address)
+            endpoints = instance.functions.getServiceEndpointsTopics(topics).call()
+            result = {topic: list(endpoints[index]) for index, topic in enumerate(topics)}
+            return {"topic": result}
+
+    def getServiceEvents(
+        cls,
+        ledger_api: LedgerApi,
+        contract_address: Address,
+        deployer_address: Address,
+        from_block: int,
+        max_block_range: int = DEFAULT_MAX_BLOCK_RANGE,
+        data: Optional[bytes] = b"",
+        gas: int = 300000,
+    ) -> Dict[str, Any]:
+        """
+        Get the service directory changes within a bounded range of blocks since a given block.
+
+        ServiceAdded and ServiceDeleted logs are returned in the order they were emitted. At most max_block_range
+        blocks are covered, the range following to_block is requested next until latest_block is reached.
+
+        :param ledger_api: the ledger API
+        :param contract_address: the address of the contract
+        :param deployer_address: the address of the deployer
+        :param from_block: the first block to get the events from
+        :param max_block_range: the maximum number of blocks to get the events from
+        :param data: the data to include in the transaction
+        :param gas: the gas to be used
+        :return: the events, the last block they were collected up to and the latest block
+        """
+        if ledger_api.identifier == EthereumApi.identifier:
+            instance = cls.get_instance(ledger_api, contract_address)
+            latest_block = ledger_api.api.eth.blockNumber
+            to_block = min(latest_block, from_block + max_block_range - 1)
+            if from_block > to_block:
+                return {"from_block": from_block, "to_block": to_block, "latest_block": latest_block, "events": []}
+            logs = []
+            for log in instance.events.ServiceAdded.getLogs(fromBlock=from_block, toBlock=to_block):
+                logs.append((log, [log["args"]["endpoint"]]))
+            for log in instance.events.ServiceDeleted.getLogs(fromBlock=from_block, toBlock=to_block):
+                logs.append((log, [endpoint for endpoint in log["args"]["endpoint"] if endpoint != ""]))
+            logs.sort(key=lambda entry: (entry[0]["blockNumber"], entry[0]["logIndex"]))
+            events = [
+                {
+                    "event": log["event"],
+                    "owner": log["args"]["owner"],
+                    "topic": log["args"]["topic"],
+                    "endpoints": endpoints,
+                }
+                for log, endpoints in logs
+            ]
+            return {"from_block": from_block, "to_block": to_block, "latest_block": latest_block, "events": events}
@@ -67,15 +67,12 @@ class GenericSearchBehaviour(TickerBehaviour):
         """
         Gets service endpoints from service directory contract.
 
-        :return: a list of endpoints
+        All configured search services are resolved within one contract call.
+
+        :return: None
         """
         strategy = cast(GenericStrategy, self.context.strategy)
-        #TODO: change smart contract to allow for getting the endpoints of all requested services!
-        services = strategy.get_services()
-        #TODO: remove the following line after fixing the issue above!
-        service = services["search_service_1"]
-        #TODO: remove this line as used only to check is_searching = False condition within handler to stop searching!
-        #service = "test_service"
+        topics = strategy.get_service_topics()
         if strategy.is_ledger_tx:
             contract_api_dialogues = cast(
                 ContractApiDialogues, self.context.contract_api_dialogues
@@ -88,16 +85,14 @@ class GenericSearchBehaviour(TickerBehaviour):
                 ledger_id=strategy.ledger_id,
                 contract_id=strategy.contract_id,
                 contract_address=strategy.contract_address,
-                callable="getServiceEndpoints", #TODO: should be named to getServicesEndpoints within contract.py and solidity code!
+                callable="getServiceEndpointsTopics",
                 kwargs=ContractApiMessage.Kwargs(
                     {
                         "deployer_address": strategy.deployer_address,
-                        "topic": service, #TODO: should be changed to "topics: services"
+                        "topics": topics,
                     }
                 )
             )
-            #TODO: the following line is only used for testing issues!
-            print(contract_api_msg)
             contract_api_dialogue.terms = strategy.get_contract_terms()
             self.context.outbox.put_message(message=contract_api_msg)
-            self.context.logger.info("Getting service endpoints from contract...")
\ No newline at end of file
+            self.context.logger.info("Getting service endpoints for topics={} from contract...".format(topics))
\ No newline at end of file
@@ -214,15 +214,18 @@ class ContractApiHandler(Handler):
         """
         strategy = cast(GenericStrategy, self.context.strategy)
         self.context.logger.info("received state={}".format(contract_api_msg))
-        #TODO: define better data structure with services and endpoints! 
-        if (len(contract_api_msg.state.body['topic']["3D_printing_service"]) == 0):
+        endpoints_by_topic = contract_api_msg.state.body['topic']
+        if all(len(endpoints) == 0 for endpoints in endpoints_by_topic.values()):
             self.context.logger.info("No endpoints found for requested services, continue searching...")  
             strategy.is_searching = True
         else:
             strategy.is_searching = False
-            selling_agent_address = contract_api_msg.state.body['topic']["3D_printing_service"][0]
-            self.context.logger.info("found agents={}.".format(selling_agent_address))              
-            #TODO: Fipa negotiation starts here: send fipa CFP message to agents with selling_agent_address ...
+            for topic, endpoints in endpoints_by_topic.items():
+                if len(endpoints) == 0:
+                    self.context.logger.info("No endpoints found for service={}.".format(topic))
+                else:
+                    self.context.logger.info("found agents={} for service={}.".format(endpoints, topic))
+            #TODO: Fipa negotiation starts here: send fipa CFP message to agents found per service ...
 
     def _handle_error(
         self,
@@ -91,6 +91,18 @@ class GenericStrategy(Model):
         self._services = {"search_service_1": self._search_service_1["id"], "search_service_2": self._search_service_2["id"]}
         return self._services
 
+    def get_service_topics(self) -> List[str]:
+        """
+        Get the distinct service topics to be looked up in the service directory.
+
+        :return: a list of service topics
+        """
+        topics: List[str] = []
+        for service_id in self.get_services().values():
+            if service_id not in topics:
+                topics.append(service_id)
+        return topics
+
     def get_contract_terms(self) -> Terms:
         """
         Get the contract terms.
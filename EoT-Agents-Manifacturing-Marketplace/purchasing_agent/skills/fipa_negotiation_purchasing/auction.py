@@ -0,0 +1,177 @@
+# Copyright (c) 2021 - for information on the respective copyright owner see the NOTICE file and/or the repository https://github.com/boschresearch/open-eot-agents.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""This module contains the reverse auctions among the sellers of a service."""
+
+import heapq
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from aea.exceptions import enforce
+from aea.skills.base import Model
+
+from packages.fetchai.protocols.fipa.message import FipaMessage
+from packages.bosch.skills.fipa_negotiation_purchasing.dialogues import FipaDialogue
+from packages.bosch.skills.fipa_negotiation_purchasing.metrics import dialogue_key
+
+
+DEFAULT_IS_ENABLED = False
+DEFAULT_DEADLINE = 5.0
+DEFAULT_QUORUM = 0
+
+
+class Auction:
+    """This class collects the proposals of the sellers of one service within a reverse auction."""
+
+    def __init__(self, topic: str, deadline: float) -> None:
+        """
+        Initialize the auction.
+
+        :param topic: the service topic
+        :param deadline: the time in seconds since the epoch at which the auction closes
+        :return: None
+        """
+        self.topic = topic
+        self.started = time.time()
+        self.deadline = deadline
+        self.dialogues = {}  # type: Dict[str, FipaDialogue]
+        self._responded = set()  # type: Set[str]
+        self._offers = []  # type: List[Tuple[Any, ...]]
+        self._proposals = {}  # type: Dict[str, FipaMessage]
+
+    @property
+    def offer_count(self) -> int:
+        """Get the number of acceptable proposals."""
+        return len(self._offers)
+
+    def add_cfp(self, fipa_dialogue: FipaDialogue) -> None:
+        """
+        Add the dialogue of a CFP sent to a seller.
+
+        :param fipa_dialogue: the fipa dialogue
+        :return: None
+        """
+        self.dialogues[dialogue_key(fipa_dialogue)] = fipa_dialogue
+
+    def add_offer(
+        self, fipa_dialogue: FipaDialogue, propose_msg: FipaMessage, rank: Tuple[Any, ...]
+    ) -> None:
+        """
+        Add an acceptable proposal of a seller.
+
+        :param fipa_dialogue: the fipa dialogue
+        :param propose_msg: the proposal message
+        :param rank: the rank of the proposal, the lowest rank wins
+        :return: None
+        """
+        key = dialogue_key(fipa_dialogue)
+        self._responded.add(key)
+        self._proposals[key] = propose_msg
+        # the number of offers breaks ties in order of arrival
+        heapq.heappush(self._offers, (*rank, len(self._proposals), key))
+
+    def add_response(self, fipa_dialogue: FipaDialogue) -> None:
+        """
+        Count a seller which declined or whose proposal was rejected.
+
+        :param fipa_dialogue: the fipa dialogue
+        :return: None
+        """
+        self._responded.add(dialogue_key(fipa_dialogue))
+
+    def is_complete(self, quorum: int, now: float) -> bool:
+        """
+        Check if the auction can be closed.
+
+        :param quorum: the number of acceptable proposals to close the auction early, 0 to wait for all sellers
+        :param now: the current time in seconds since the epoch
+        :return: whether the deadline passed, the quorum is reached or all sellers responded
+        """
+        return (
+            now >= self.deadline
+            or (quorum > 0 and len(self._offers) >= quorum)
+            or len(self._responded) >= len(self.dialogues)
+        )
+
+    def pop_offers(self) -> List[Tuple[FipaDialogue, FipaMessage]]:
+        """
+        Pop the proposals from best to worst.
+
+        :return: the fipa dialogues and their proposal messages
+        """
+        offers = []
+        while len(self._offers) > 0:
+            key = heapq.heappop(self._offers)[-1]
+            offers.append((self.dialogues[key], self._proposals.pop(key)))
+        return offers
+
+
+class ReverseAuctions(Model):
+    """This class keeps the open reverse auctions, at most one per service topic."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        """
+        Initialize the reverse auctions.
+
+        :return: None
+        """
+        self._is_enabled = kwargs.pop("enabled", DEFAULT_IS_ENABLED)
+        self._deadline = float(kwargs.pop("deadline", DEFAULT_DEADLINE))
+        self._quorum = int(kwargs.pop("quorum", DEFAULT_QUORUM))
+        super().__init__(**kwargs)
+        enforce(self._deadline > 0, "The deadline of the auctions has to be positive.")
+        enforce(self._quorum >= 0, "The quorum of the auctions must not be negative.")
+        self._auctions = {}  # type: Dict[str, Auction]
+        self._auctions_by_dialogue = {}  # type: Dict[str, Auction]
+
+    @property
+    def is_enabled(self) -> bool:
+        """Check if proposals are collected in reverse auctions instead of accepted on arrival."""
+        return self._is_enabled
+
+    @property
+    def open_topics(self) -> Set[str]:
+        """Get the service topics of the auctions whose deadline has not passed yet."""
+        now = time.time()
+        return {topic for topic, auction in self._auctions.items() if auction.deadline > now}
+
+    def add_cfp(self, topic: str, fipa_dialogue: FipaDialogue) -> None:
+        """
+        Add the dialogue of a CFP to the open auction of its topic, a new auction is opened if there is none.
+
+        :param topic: the service topic
+        :param fipa_dialogue: the fipa dialogue
+        :return: None
+        """
+        auction = self._auctions.get(topic, None)
+        if auction is None:
+            auction = Auction(topic, time.time() + self._deadline)
+            self._auctions[topic] = auction
+        auction.add_cfp(fipa_dialogue)
+        self._auctions_by_dialogue[dialogue_key(fipa_dialogue)] = auction
+
+    def get_auction(self, fipa_dialogue: FipaDialogue) -> Optional[Auction]:
+        """
+        Get the open auction of a dialogue.
+
+        :param fipa_dialogue: the fipa dialogue
+        :return: the auction, None if the dialogue is not part of an open auction
+        """
+        return self._auctions_by_dialogue.get(dialogue_key(fipa_dialogue), None)
+
+    def pop_completed(self) -> List[Auction]:
+        """
+        Remove and get the auctions which can be closed.
+
+        :return: the completed auctions
+        """
+        now = time.time()
+        completed = [
+            auction for auction in self._auctions.values() if auction.is_complete(self._quorum, now)
+        ]
+        for auction in completed:
+            self._auctions.pop(auction.topic)
+            for key in auction.dialogues:
+                self._auctions_by_dialogue.pop(key, None)
+        return completed
@@ -2,28 +2,51 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import Any, List, Optional, Set, cast
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Set, Union, cast
 
-from aea.protocols.dialogue.base import DialogueLabel
+from aea.exceptions import enforce
 from aea.skills.behaviours import TickerBehaviour
 
 from packages.fetchai.connections.ledger.base import (
     CONNECTION_ID as LEDGER_CONNECTION_PUBLIC_ID,
 )
+from packages.fetchai.protocols.fipa.message import FipaMessage
 from packages.fetchai.protocols.ledger_api.message import LedgerApiMessage
 from packages.fetchai.protocols.contract_api.message import ContractApiMessage
+from packages.bosch.skills.fipa_negotiation_purchasing.auction import (
+    Auction,
+    ReverseAuctions,
+)
 from packages.bosch.skills.fipa_negotiation_purchasing.dialogues import (
+    ContractApiDialogue,
     FipaDialogue,
+    FipaDialogues,
     LedgerApiDialogue,
     LedgerApiDialogues,
     ContractApiDialogues,
 )
+from packages.bosch.skills.fipa_negotiation_purchasing.directory import ServiceDirectoryIndex
+from packages.bosch.skills.fipa_negotiation_purchasing.metrics import TradeMetrics, dialogue_key
+from packages.bosch.skills.fipa_negotiation_purchasing.reputation import SellerReputation
+from packages.bosch.skills.fipa_negotiation_purchasing.scheduler import CfpScheduler
 from packages.bosch.skills.fipa_negotiation_purchasing.strategy import GenericStrategy
 
 
 DEFAULT_MAX_PROCESSING = 120
+DEFAULT_MAX_IN_FLIGHT = 1
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BATCH_WINDOW = 0.0
+DEFAULT_MAX_BATCH_SIZE = 10
 DEFAULT_TX_INTERVAL = 2.0
 DEFAULT_SEARCH_INTERVAL = 5.0
+SEARCH_MODE_POLLING = "polling"
+SEARCH_MODE_EVENTS = "events"
+DEFAULT_SEARCH_MODE = SEARCH_MODE_POLLING
+DEFAULT_PAGE_SIZE = 0
+DEFAULT_EXPORT_INTERVAL = 10.0
+DEFAULT_AUCTION_INTERVAL = 0.5
 LEDGER_API_ADDRESS = str(LEDGER_CONNECTION_PUBLIC_ID)
 
 
@@ -35,6 +58,12 @@ class GenericSearchBehaviour(TickerBehaviour):
         search_interval = cast(
             float, kwargs.pop("search_interval", DEFAULT_SEARCH_INTERVAL)
         )
+        self.search_mode = cast(str, kwargs.pop("search_mode", DEFAULT_SEARCH_MODE))
+        self.page_size = cast(int, kwargs.pop("page_size", DEFAULT_PAGE_SIZE))
+        enforce(
+            self.search_mode in (SEARCH_MODE_POLLING, SEARCH_MODE_EVENTS),
+            "Unknown search_mode={}.".format(self.search_mode),
+        )
         super().__init__(tick_interval=search_interval, **kwargs)
 
     def setup(self) -> None:
@@ -59,8 +88,11 @@ class GenericSearchBehaviour(TickerBehaviour):
         :return: None
         """
         strategy = cast(GenericStrategy, self.context.strategy)
-        if strategy.is_searching:
+        if self.search_mode == SEARCH_MODE_EVENTS:
+            self.request_services_events()
+        elif strategy.is_searching:
             self._get_services_endpoints()
+        self.send_cfps()
 
     def teardown(self) -> None:
         """
@@ -73,14 +105,17 @@ class GenericSearchBehaviour(TickerBehaviour):
         """
         Gets service endpoints from service directory contract.
 
-        :return: a list of endpoints
+        All configured search services are resolved within one contract call,
+        unless a page size is configured, then the first page of each topic is requested.
+
+        :return: None
         """
         strategy = cast(GenericStrategy, self.context.strategy)
-        # TODO: change smart contract to allow for getting the endpoints of all requested services!
-        services = strategy.get_services()
-        # TODO: remove the following line after fixing the issue above!
-        service = services["search_service_1"]
-        if strategy.is_ledger_tx:
+        topics = strategy.get_service_topics()
+        if strategy.is_ledger_tx and self.page_size > 0:
+            for topic in topics:
+                self.request_endpoints_page(topic, 0)
+        elif strategy.is_ledger_tx:
             contract_api_dialogues = cast(
                 ContractApiDialogues, self.context.contract_api_dialogues
             )
@@ -92,23 +127,135 @@ class GenericSearchBehaviour(TickerBehaviour):
                 ledger_id=strategy.ledger_id,
                 contract_id=strategy.contract_id,
                 contract_address=strategy.contract_address,
-                callable="getServiceEndpoints",  # TODO: should be named to getServicesEndpoints within contract.py and solidity code!
+                callable="getServiceEndpointsTopics",
                 kwargs=ContractApiMessage.Kwargs(
                     {
                         "deployer_address": self.context.agent_address,  # TODO: should be set to a third party deployer address!
-                        "topic": service,  # TODO: should be changed to "topics: services"
+                        "topics": topics,
                     }
                 )
             )
-            # TODO: the following line is only used for testing issues!
-            print(contract_api_msg)
             contract_api_dialogue.terms = strategy.get_contract_terms()
+            cast(TradeMetrics, self.context.trade_metrics).start(dialogue_key(contract_api_dialogue))
             self.context.outbox.put_message(message=contract_api_msg)
-            self.context.logger.info("Getting service endpoints from contract...")
+            self.context.logger.info("Getting service endpoints for topics={} from contract...".format(topics))
+
+    def request_endpoints_page(self, topic: str, offset: int) -> None:
+        """
+        Request one page of service endpoints of a topic from the service directory contract.
+
+        :param topic: the service topic
+        :param offset: the position of the first endpoint of the page
+        :return: None
+        """
+        strategy = cast(GenericStrategy, self.context.strategy)
+        contract_api_dialogues = cast(
+            ContractApiDialogues, self.context.contract_api_dialogues
+        )
+        contract_api_msg, contract_api_dialogue = contract_api_dialogues.create(
+            counterparty=LEDGER_API_ADDRESS,
+            performative=ContractApiMessage.Performative.GET_STATE,
+            ledger_id=strategy.ledger_id,
+            contract_id=strategy.contract_id,
+            contract_address=strategy.contract_address,
+            callable="getServiceEndpointsPage",
+            kwargs=ContractApiMessage.Kwargs(
+                {
+                    "deployer_address": self.context.agent_address,
+                    "topic": topic,
+                    "offset": offset,
+                    "limit": self.page_size,
+                }
+            )
+        )
+        contract_api_dialogue.terms = strategy.get_contract_terms()
+        cast(TradeMetrics, self.context.trade_metrics).start(dialogue_key(contract_api_dialogue))
+        self.context.outbox.put_message(message=contract_api_msg)
+        self.context.logger.info(
+            "Getting service endpoints for topic={} from offset={} from contract...".format(topic, offset)
+        )
+
+    def send_cfps(self) -> None:
+        """
+        Send the scheduled CFPs as long as the number of open negotiations is below max_negotiations.
+
+        The slots of negotiations whose seller has been silent for too long are freed first. The CFPs of a
+        service with an open reverse auction are sent until its deadline even if no slot is free, otherwise
+        the auction would close with the sellers which got a slot only.
+
+        :return: None
+        """
+        strategy = cast(GenericStrategy, self.context.strategy)
+        scheduler = cast(CfpScheduler, self.context.cfp_scheduler)
+        reputation = cast(SellerReputation, self.context.seller_reputation)
+        for topic, counterparty in scheduler.release_expired():
+            self.context.logger.info(
+                "negotiation for service={} with agent={} timed out, freeing its slot.".format(
+                    topic, counterparty
+                )
+            )
+            reputation.record_timeout(counterparty)
+        fipa_dialogues = cast(FipaDialogues, self.context.fipa_dialogues)
+        auctions = cast(ReverseAuctions, self.context.reverse_auctions)
+        metrics = cast(TradeMetrics, self.context.trade_metrics)
+        exempt_topics = auctions.open_topics if auctions.is_enabled else set()
+        next_cfp = scheduler.pop_next(strategy.max_negotiations, exempt_topics)
+        while next_cfp is not None:
+            topic, counterparty = next_cfp
+            cfp_msg, fipa_dialogue = fipa_dialogues.create(
+                counterparty=counterparty,
+                performative=FipaMessage.Performative.CFP,
+                query=strategy.get_service_query(topic),
+            )
+            fipa_dialogue = cast(FipaDialogue, fipa_dialogue)
+            scheduler.start(fipa_dialogue, topic)
+            reputation.record_cfp(fipa_dialogue)
+            if auctions.is_enabled:
+                auctions.add_cfp(topic, fipa_dialogue)
+                exempt_topics = auctions.open_topics
+            self.context.outbox.put_message(message=cfp_msg)
+            metrics.mark(dialogue_key(fipa_dialogue), "cfp")
+            self.context.logger.info("sending CFP for service={} to agent={}".format(topic, counterparty))
+            next_cfp = scheduler.pop_next(strategy.max_negotiations, exempt_topics)
+
+    def request_services_events(self) -> None:
+        """
+        Gets the service directory events of the next range of blocks which are not in the local index yet.
+
+        Only one request is pending at a time, lookups are served from the index once it caught up.
+
+        :return: None
+        """
+        strategy = cast(GenericStrategy, self.context.strategy)
+        index = cast(ServiceDirectoryIndex, self.context.service_directory_index)
+        if not strategy.is_ledger_tx or index.is_syncing:
+            return
+        contract_api_dialogues = cast(
+            ContractApiDialogues, self.context.contract_api_dialogues
+        )
+        contract_api_msg, contract_api_dialogue = contract_api_dialogues.create(
+            counterparty=LEDGER_API_ADDRESS,
+            performative=ContractApiMessage.Performative.GET_STATE,
+            ledger_id=strategy.ledger_id,
+            contract_id=strategy.contract_id,
+            contract_address=strategy.contract_address,
+            callable="getServiceEvents",
+            kwargs=ContractApiMessage.Kwargs(
+                {
+                    "deployer_address": self.context.agent_address,
+                    "from_block": index.next_block,
+                    "max_block_range": index.max_block_range,
+                }
+            )
+        )
+        contract_api_dialogue.terms = strategy.get_contract_terms()
+        cast(TradeMetrics, self.context.trade_metrics).start(dialogue_key(contract_api_dialogue))
+        index.is_syncing = True
+        self.context.outbox.put_message(message=contract_api_msg)
 
 
 class GenericTransactionBehaviour(TickerBehaviour):
-    """A behaviour to sequentially submit transactions to the blockchain."""
+    """A behaviour to submit transactions to the blockchain within a window of concurrent ledger dialogues."""
 
     def __init__(self, **kwargs: Any):
         """Initialize the transaction behaviour."""
@@ -118,14 +265,27 @@ class GenericTransactionBehaviour(TickerBehaviour):
         self.max_processing = cast(
             float, kwargs.pop("max_processing", DEFAULT_MAX_PROCESSING)
         )
-        self.processing_time = 0.0
-        self.waiting: List[FipaDialogue] = []
-        self.processing: Optional[LedgerApiDialogue] = None
-        self.timedout: Set[DialogueLabel] = set()
+        self.max_in_flight = cast(int, kwargs.pop("max_in_flight", DEFAULT_MAX_IN_FLIGHT))
+        self.max_attempts = cast(int, kwargs.pop("max_attempts", DEFAULT_MAX_ATTEMPTS))
+        self.batch_window = cast(float, kwargs.pop("batch_window", DEFAULT_BATCH_WINDOW))
+        self.max_batch_size = cast(int, kwargs.pop("max_batch_size", DEFAULT_MAX_BATCH_SIZE))
+        self.batch_time = 0.0
+        self.waiting: Deque[FipaDialogue] = deque()
+        # ledger api dialogues, or contract api dialogues of batch payments,
+        # and their processing times by dialogue starter reference
+        self.processing: Dict[str, Union[LedgerApiDialogue, ContractApiDialogue]] = {}
+        self.processing_times: Dict[str, float] = {}
+        self.timedout: Set[str] = set()
         super().__init__(tick_interval=tx_interval, **kwargs)
 
     def setup(self) -> None:
         """Setup behaviour."""
+        if self.batch_window > 0:
+            strategy = cast(GenericStrategy, self.context.strategy)
+            enforce(
+                strategy.batch_payment_address is not None,
+                "batch_payment_address must be set to settle payments in batches!",
+            )
 
     def act(self) -> None:
         """
@@ -133,22 +293,76 @@ class GenericTransactionBehaviour(TickerBehaviour):
 
         :return: None
         """
-        if self.processing is not None:
-            if self.processing_time <= self.max_processing:
-                # already processing
-                self.processing_time += self.tick_interval
-                return
-            self._timeout_processing()
+        for reference in list(self.processing_times):
+            if self.processing_times[reference] <= self.max_processing:
+                # still processing
+                self.processing_times[reference] += self.tick_interval
+            else:
+                self._timeout_processing(reference)
+        if self.batch_window > 0:
+            self._act_batched()
+            return
+        while len(self.waiting) > 0 and len(self.processing) < self.max_in_flight:
+            self._start_processing()
+
+    def _act_batched(self) -> None:
+        """Settle the waiting transactions in batches once the batch window elapsed or a batch is full."""
         if len(self.waiting) == 0:
-            # nothing to process
+            self.batch_time = 0.0
             return
-        self._start_processing()
+        self.batch_time += self.tick_interval
+        while (
+            len(self.waiting) > 0
+            and len(self.processing) < self.max_in_flight
+            and (
+                self.batch_time >= self.batch_window
+                or len(self.waiting) >= self.max_batch_size
+            )
+        ):
+            self._start_batch_processing()
+        if len(self.waiting) == 0:
+            self.batch_time = 0.0
+
+    def _start_batch_processing(self) -> None:
+        """Process the next batch of transactions with a single batch payment."""
+        strategy = cast(GenericStrategy, self.context.strategy)
+        fipa_dialogues = [
+            self.waiting.popleft()
+            for _ in range(min(self.max_batch_size, len(self.waiting)))
+        ]
+        self.context.logger.info(
+            f"Processing batch of {len(fipa_dialogues)} transactions, {len(self.waiting)} transactions remaining"
+        )
+        contract_api_dialogues = cast(
+            ContractApiDialogues, self.context.contract_api_dialogues
+        )
+        contract_api_msg, contract_api_dialogue = contract_api_dialogues.create(
+            counterparty=LEDGER_API_ADDRESS,
+            performative=ContractApiMessage.Performative.GET_RAW_TRANSACTION,
+            ledger_id=strategy.ledger_id,
+            contract_id=strategy.batch_payment_id,
+            contract_address=strategy.batch_payment_address,
+            callable="pay",
+            kwargs=ContractApiMessage.Kwargs(
+                strategy.get_batch_payment_kwargs(
+                    [fipa_dialogue.terms for fipa_dialogue in fipa_dialogues]
+                )
+            ),
+        )
+        contract_api_dialogue = cast(ContractApiDialogue, contract_api_dialogue)
+        contract_api_dialogue.terms = strategy.get_contract_terms()
+        contract_api_dialogue.associated_fipa_dialogues = fipa_dialogues
+        reference = self._get_reference(contract_api_dialogue)
+        self.processing[reference] = contract_api_dialogue
+        self.processing_times[reference] = 0.0
+        self.mark_step(contract_api_dialogue, "transaction_request")
+        self.context.outbox.put_message(message=contract_api_msg)
 
     def _start_processing(self) -> None:
         """Process the next transaction."""
-        fipa_dialogue = self.waiting.pop(0)
+        fipa_dialogue = self.waiting.popleft()
         self.context.logger.info(
-            f"Processing transaction, {len(self.waiting)} transactions remaining"
+            f"Processing transaction, {len(self.processing) + 1} in flight, {len(self.waiting)} transactions remaining"
         )
         ledger_api_dialogues = cast(
             LedgerApiDialogues, self.context.ledger_api_dialogues
@@ -160,8 +374,10 @@ class GenericTransactionBehaviour(TickerBehaviour):
         )
         ledger_api_dialogue = cast(LedgerApiDialogue, ledger_api_dialogue)
         ledger_api_dialogue.associated_fipa_dialogue = fipa_dialogue
-        self.processing_time = 0.0
-        self.processing = ledger_api_dialogue
+        reference = self._get_reference(ledger_api_dialogue)
+        self.processing[reference] = ledger_api_dialogue
+        self.processing_times[reference] = 0.0
+        self.mark_step(ledger_api_dialogue, "transaction_request")
         self.context.logger.info(
             f"requesting transfer transaction from ledger api for message={ledger_api_msg}..."
         )
@@ -170,42 +386,271 @@ class GenericTransactionBehaviour(TickerBehaviour):
     def teardown(self) -> None:
         """Teardown behaviour."""
 
-    def _timeout_processing(self) -> None:
-        """Timeout processing."""
-        if self.processing is None:
+    @staticmethod
+    def _get_processed_dialogue(
+        dialogue: Union[LedgerApiDialogue, ContractApiDialogue]
+    ) -> Union[LedgerApiDialogue, ContractApiDialogue]:
+        """
+        Get the dialogue which is tracked for a transaction.
+
+        A batch payment is tracked by its contract api dialogue, also once it is sent within a ledger api dialogue.
+
+        :param dialogue: the ledger api or contract api dialogue
+        :return: the tracked dialogue
+        """
+        if (
+            isinstance(dialogue, LedgerApiDialogue)
+            and dialogue.associated_contract_api_dialogue is not None
+        ):
+            return dialogue.associated_contract_api_dialogue
+        return dialogue
+
+    @staticmethod
+    def _get_fipa_dialogues(
+        dialogue: Union[LedgerApiDialogue, ContractApiDialogue]
+    ) -> List[FipaDialogue]:
+        """
+        Get the fipa dialogues settled by a tracked dialogue.
+
+        :param dialogue: the tracked ledger api or contract api dialogue
+        :return: the fipa dialogues
+        """
+        if isinstance(dialogue, ContractApiDialogue):
+            return dialogue.associated_fipa_dialogues
+        return [dialogue.associated_fipa_dialogue]
+
+    @staticmethod
+    def _get_reference(dialogue: Union[LedgerApiDialogue, ContractApiDialogue]) -> str:
+        """
+        Get the reference of a tracked dialogue.
+
+        The dialogue starter reference is used as it does not change once the ledger replies.
+
+        :param dialogue: the ledger api or contract api dialogue
+        :return: the reference
+        """
+        return dialogue.dialogue_label.dialogue_starter_reference
+
+    def mark_step(
+        self, dialogue: Union[LedgerApiDialogue, ContractApiDialogue], step: str
+    ) -> None:
+        """
+        Timestamp a step of the trades settled by a transaction.
+
+        :param dialogue: the ledger api or contract api dialogue of the transaction
+        :param step: the name of the step
+        :return: None
+        """
+        metrics = cast(TradeMetrics, self.context.trade_metrics)
+        for fipa_dialogue in self._get_fipa_dialogues(
+            self._get_processed_dialogue(dialogue)
+        ):
+            metrics.mark(dialogue_key(fipa_dialogue), step)
+
+    def _retry(self, fipa_dialogues: List[FipaDialogue]) -> None:
+        """
+        Queue the transactions of trades again after their settlement failed.
+
+        A trade is abandoned once max_attempts settlements failed, 0 retries it indefinitely.
+        Only abandoned trades are recorded as failed settlement with their seller.
+
+        :param fipa_dialogues: the fipa dialogues of the trades
+        :return: None
+        """
+        metrics = cast(TradeMetrics, self.context.trade_metrics)
+        reputation = cast(SellerReputation, self.context.seller_reputation)
+        scheduler = cast(CfpScheduler, self.context.cfp_scheduler)
+        is_released = False
+        for fipa_dialogue in fipa_dialogues:
+            failed_settlements = fipa_dialogue.count_failed_settlement()
+            if self.max_attempts <= 0 or failed_settlements < self.max_attempts:
+                self.waiting.append(fipa_dialogue)
+                continue
+            counterparty = fipa_dialogue.dialogue_label.dialogue_opponent_addr
+            self.context.logger.warning(
+                "abandoning the trade with counterparty={} after {} failed settlements.".format(
+                    counterparty[-5:], failed_settlements
+                )
+            )
+            metrics.discard(dialogue_key(fipa_dialogue))
+            reputation.record_settlement_failure(counterparty)
+            is_released = scheduler.release(fipa_dialogue) or is_released
+        if is_released:
+            cast(GenericSearchBehaviour, self.context.behaviours.search).send_cfps()
+
+    def _timeout_processing(self, reference: str) -> None:
+        """
+        Timeout processing.
+
+        :param reference: the reference of the timed out ledger api dialogue
+        """
+        dialogue = self.processing.pop(reference, None)
+        self.processing_times.pop(reference, None)
+        if dialogue is None:
             return
-        self.timedout.add(self.processing.dialogue_label)
-        self.waiting.append(self.processing.associated_fipa_dialogue)
-        self.processing_time = 0.0
-        self.processing = None
+        self.timedout.add(reference)
+        self._retry(self._get_fipa_dialogues(dialogue))
 
-    def finish_processing(self, ledger_api_dialogue: LedgerApiDialogue) -> None:
+    def finish_processing(
+        self, ledger_api_dialogue: Union[LedgerApiDialogue, ContractApiDialogue]
+    ) -> None:
         """
         Finish processing.
 
-        :param ledger_api_dialogue: the ledger api dialogue
+        :param ledger_api_dialogue: the ledger api dialogue, or the contract api dialogue of a batch payment
         """
-        if self.processing == ledger_api_dialogue:
-            self.processing_time = 0.0
-            self.processing = None
+        reference = self._get_reference(self._get_processed_dialogue(ledger_api_dialogue))
+        if reference in self.processing:
+            self.processing.pop(reference)
+            self.processing_times.pop(reference)
             return
-        if ledger_api_dialogue.dialogue_label not in self.timedout:
+        if reference not in self.timedout:
             raise ValueError(
-                f"Non-matching dialogues in transaction behaviour: {self.processing} and {ledger_api_dialogue}"
+                f"Non-matching dialogue in transaction behaviour: {ledger_api_dialogue}"
             )
-        self.timedout.remove(ledger_api_dialogue.dialogue_label)
+        self.timedout.remove(reference)
         self.context.logger.debug(
             f"Timeout dialogue in transaction processing: {ledger_api_dialogue}"
         )
-        # don't reset, as another might be processing
 
-    def failed_processing(self, ledger_api_dialogue: LedgerApiDialogue) -> None:
+    def failed_payments(self, fipa_dialogues: List[FipaDialogue]) -> None:
+        """
+        Retry the payments of a settled batch payment which were rejected by their recipients.
+
+        :param fipa_dialogues: the fipa dialogues of the rejected payments
+        """
+        metrics = cast(TradeMetrics, self.context.trade_metrics)
+        for fipa_dialogue in fipa_dialogues:
+            metrics.mark(dialogue_key(fipa_dialogue), "transaction_failed")
+        self._retry(fipa_dialogues)
+
+    def failed_processing(
+        self, ledger_api_dialogue: Union[LedgerApiDialogue, ContractApiDialogue]
+    ) -> None:
         """
         Failed processing.
 
-        Currently, we retry processing indefinitely.
+        The transactions are retried until max_attempts settlements of their trade failed.
 
-        :param ledger_api_dialogue: the ledger api dialogue
+        :param ledger_api_dialogue: the ledger api dialogue, or the contract api dialogue of a batch payment
         """
         self.finish_processing(ledger_api_dialogue)
-        self.waiting.append(ledger_api_dialogue.associated_fipa_dialogue)
+        self.mark_step(ledger_api_dialogue, "transaction_failed")
+        self._retry(
+            self._get_fipa_dialogues(self._get_processed_dialogue(ledger_api_dialogue))
+        )
+
+
+class MetricsExportBehaviour(TickerBehaviour):
+    """This class periodically exports the trade metrics."""
+
+    def __init__(self, **kwargs: Any):
+        """Initialize the metrics export behaviour."""
+        export_interval = cast(
+            float, kwargs.pop("export_interval", DEFAULT_EXPORT_INTERVAL)
+        )
+        super().__init__(tick_interval=export_interval, **kwargs)
+
+    def setup(self) -> None:
+        """Implement the setup."""
+
+    def act(self) -> None:
+        """
+        Implement the act.
+
+        :return: None
+        """
+        cast(TradeMetrics, self.context.trade_metrics).export()
+
+    def teardown(self) -> None:
+        """
+        Implement the task teardown.
+
+        :return: None
+        """
+        cast(TradeMetrics, self.context.trade_metrics).export()
+
+
+class ReverseAuctionBehaviour(TickerBehaviour):
+    """This class closes the reverse auctions, accepting the best proposal of each and declining the others."""
+
+    def __init__(self, **kwargs: Any):
+        """Initialize the reverse auction behaviour."""
+        auction_interval = cast(
+            float, kwargs.pop("auction_interval", DEFAULT_AUCTION_INTERVAL)
+        )
+        super().__init__(tick_interval=auction_interval, **kwargs)
+
+    def setup(self) -> None:
+        """Implement the setup."""
+
+    def act(self) -> None:
+        """
+        Implement the act.
+
+        :return: None
+        """
+        self.close_completed()
+
+    def teardown(self) -> None:
+        """
+        Implement the task teardown.
+
+        :return: None
+        """
+
+    def close_completed(self) -> None:
+        """
+        Close the auctions whose deadline passed, whose quorum is reached or whose sellers all responded.
+
+        :return: None
+        """
+        auctions = cast(ReverseAuctions, self.context.reverse_auctions)
+        for auction in auctions.pop_completed():
+            self._close(auction)
+
+    def _close(self, auction: Auction) -> None:
+        """
+        Accept the best proposal of an auction and decline all others in one pass.
+
+        :param auction: the auction
+        :return: None
+        """
+        strategy = cast(GenericStrategy, self.context.strategy)
+        metrics = cast(TradeMetrics, self.context.trade_metrics)
+        scheduler = cast(CfpScheduler, self.context.cfp_scheduler)
+        offers = auction.pop_offers()
+        self.context.logger.info(
+            "closing the auction for service={} with {} proposals from {} sellers.".format(
+                auction.topic, len(offers), len(auction.dialogues)
+            )
+        )
+        metrics.observe("auction", time.time() - auction.started)
+        for index, (fipa_dialogue, propose_msg) in enumerate(offers):
+            counterparty = fipa_dialogue.dialogue_label.dialogue_opponent_addr
+            if index == 0:
+                self.context.logger.info(
+                    "accepting the proposal from sender={}".format(counterparty[-5:])
+                )
+                fipa_dialogue.terms = strategy.terms_from_proposal(
+                    propose_msg.proposal, counterparty
+                )
+                reply = fipa_dialogue.reply(
+                    performative=FipaMessage.Performative.ACCEPT,
+                    target_message=propose_msg,
+                )
+                self.context.outbox.put_message(message=reply)
+                metrics.mark(dialogue_key(fipa_dialogue), "accept")
+                continue
+            self.context.logger.info(
+                "declining the proposal from sender={}".format(counterparty[-5:])
+            )
+            reply = fipa_dialogue.reply(
+                performative=FipaMessage.Performative.DECLINE,
+                target_message=propose_msg,
+            )
+            self.context.outbox.put_message(message=reply)
+            metrics.discard(dialogue_key(fipa_dialogue))
+            scheduler.release(fipa_dialogue)
+        if len(offers) > 1:
+            cast(GenericSearchBehaviour, self.context.behaviours.search).send_cfps()
@@ -2,7 +2,7 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import Any, Optional, Type
+from typing import Any, List, Optional, Type
 
 from aea.common import Address
 from aea.exceptions import AEAEnforceError, enforce
@@ -82,6 +82,7 @@ class FipaDialogue(BaseFipaDialogue):
     __slots__ = (
         "_terms",
         "_associated_ledger_api_dialogue",
+        "_failed_settlements",
     )
 
     def __init__(
@@ -108,6 +109,7 @@ class FipaDialogue(BaseFipaDialogue):
             message_class=message_class,
         )
         self._terms = None  # type: Optional[Terms]
+        self._failed_settlements = 0
 
     @property
     def terms(self) -> Terms:
@@ -122,6 +124,16 @@ class FipaDialogue(BaseFipaDialogue):
         enforce(self._terms is None, "Terms already set!")
         self._terms = terms
 
+    @property
+    def failed_settlements(self) -> int:
+        """Get the number of failed attempts to settle the trade."""
+        return self._failed_settlements
+
+    def count_failed_settlement(self) -> int:
+        """Count a failed attempt to settle the trade and get the number of failed attempts."""
+        self._failed_settlements += 1
+        return self._failed_settlements
+
 
 class FipaDialogues(Model, BaseFipaDialogues):
     """The dialogues class keeps track of all dialogues."""
@@ -156,7 +168,7 @@ class FipaDialogues(Model, BaseFipaDialogues):
 class LedgerApiDialogue(BaseLedgerApiDialogue):
     """The dialogue class maintains state of a dialogue and manages it."""
 
-    __slots__ = ("_associated_fipa_dialogue",)
+    __slots__ = ("_associated_fipa_dialogue", "_associated_contract_api_dialogue")
 
     def __init__(
         self,
@@ -182,6 +194,9 @@ class LedgerApiDialogue(BaseLedgerApiDialogue):
             message_class=message_class,
         )
         self._associated_fipa_dialogue = None  # type: Optional[FipaDialogue]
+        self._associated_contract_api_dialogue = (
+            None
+        )  # type: Optional[ContractApiDialogue]
 
     @property
     def associated_fipa_dialogue(self) -> FipaDialogue:
@@ -196,6 +211,22 @@ class LedgerApiDialogue(BaseLedgerApiDialogue):
         enforce(self._associated_fipa_dialogue is None, "FipaDialogue already set!")
         self._associated_fipa_dialogue = fipa_dialogue
 
+    @property
+    def associated_contract_api_dialogue(self) -> Optional["ContractApiDialogue"]:
+        """Get the contract api dialogue of the batch payment sent within this dialogue, if any."""
+        return self._associated_contract_api_dialogue
+
+    @associated_contract_api_dialogue.setter
+    def associated_contract_api_dialogue(
+        self, contract_api_dialogue: "ContractApiDialogue"
+    ) -> None:
+        """Set associated_contract_api_dialogue"""
+        enforce(
+            self._associated_contract_api_dialogue is None,
+            "ContractApiDialogue already set!",
+        )
+        self._associated_contract_api_dialogue = contract_api_dialogue
+
 
 class LedgerApiDialogues(Model, BaseLedgerApiDialogues):
     """The dialogues class keeps track of all dialogues."""
@@ -254,6 +285,7 @@ class ContractApiDialogue(BaseContractApiDialogue):
             message_class=message_class,
         )
         self._terms = None  # type: Optional[Terms]
+        self._associated_fipa_dialogues = []  # type: List[FipaDialogue]
 
     @property
     def terms(self) -> Terms:
@@ -268,6 +300,19 @@ class ContractApiDialogue(BaseContractApiDialogue):
         enforce(self._terms is None, "Terms already set!")
         self._terms = terms
 
+    @property
+    def associated_fipa_dialogues(self) -> List[FipaDialogue]:
+        """Get the fipa dialogues settled by the batch payment of this dialogue."""
+        return self._associated_fipa_dialogues
+
+    @associated_fipa_dialogues.setter
+    def associated_fipa_dialogues(self, fipa_dialogues: List[FipaDialogue]) -> None:
+        """Set associated_fipa_dialogues"""
+        enforce(
+            len(self._associated_fipa_dialogues) == 0, "FipaDialogues already set!"
+        )
+        self._associated_fipa_dialogues = fipa_dialogues
+
 
 class ContractApiDialogues(Model, BaseContractApiDialogues):
     """The dialogues class keeps track of all dialogues."""
@@ -303,7 +348,7 @@ class ContractApiDialogues(Model, BaseContractApiDialogues):
 class SigningDialogue(BaseSigningDialogue):
     """The dialogue class maintains state of a dialogue and manages it."""
 
-    __slots__ = ("_associated_ledger_api_dialogue",)
+    __slots__ = ("_associated_ledger_api_dialogue", "_associated_contract_api_dialogue")
 
     def __init__(
         self,
@@ -329,6 +374,9 @@ class SigningDialogue(BaseSigningDialogue):
             message_class=message_class,
         )
         self._associated_ledger_api_dialogue = None  # type: Optional[LedgerApiDialogue]
+        self._associated_contract_api_dialogue = (
+            None
+        )  # type: Optional[ContractApiDialogue]
 
     @property
     def associated_ledger_api_dialogue(self) -> LedgerApiDialogue:
@@ -348,6 +396,22 @@ class SigningDialogue(BaseSigningDialogue):
         )
         self._associated_ledger_api_dialogue = ledger_api_dialogue
 
+    @property
+    def associated_contract_api_dialogue(self) -> Optional[ContractApiDialogue]:
+        """Get the contract api dialogue of the batch payment to be signed, if any."""
+        return self._associated_contract_api_dialogue
+
+    @associated_contract_api_dialogue.setter
+    def associated_contract_api_dialogue(
+        self, contract_api_dialogue: ContractApiDialogue
+    ) -> None:
+        """Set associated_contract_api_dialogue"""
+        enforce(
+            self._associated_contract_api_dialogue is None,
+            "ContractApiDialogue already set!",
+        )
+        self._associated_contract_api_dialogue = contract_api_dialogue
+
 
 class SigningDialogues(Model, BaseSigningDialogues):
     """This class keeps track of all signing dialogues."""
@@ -0,0 +1,163 @@
+# Copyright (c) 2021 - for information on the respective copyright owner see the NOTICE file and/or the repository https://github.com/boschresearch/open-eot-agents.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""This module contains the local index of the service directory contract."""
+
+import json
+import os
+import time
+from typing import Any, Dict, List, Tuple, cast
+
+from aea.exceptions import enforce
+from aea.skills.base import Model
+
+from packages.bosch.skills.fipa_negotiation_purchasing.strategy import GenericStrategy
+
+
+DEFAULT_START_BLOCK = 0
+DEFAULT_MAX_BLOCK_RANGE = 5000
+DEFAULT_STORE_PATH = None
+DEFAULT_SAVE_INTERVAL = 10.0
+SERVICE_ADDED = "ServiceAdded"
+SERVICE_DELETED = "ServiceDeleted"
+
+
+class ServiceDirectoryIndex(Model):
+    """This class keeps a copy of the service directory built from its events."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        """
+        Initialize the service directory index.
+
+        :return: None
+        """
+        self._next_block = int(kwargs.pop("start_block", DEFAULT_START_BLOCK))
+        self._max_block_range = int(kwargs.pop("max_block_range", DEFAULT_MAX_BLOCK_RANGE))
+        self._store_path = kwargs.pop("store_path", DEFAULT_STORE_PATH)
+        self._save_interval = float(kwargs.pop("save_interval", DEFAULT_SAVE_INTERVAL))
+        super().__init__(**kwargs)
+        enforce(self._max_block_range > 0, "The max_block_range has to be positive.")
+        self._services: Dict[str, Dict[Tuple[str, str], str]] = {}
+        self._is_syncing = False
+        self._is_dirty = False
+        self._saved = time.time()
+
+    def setup(self) -> None:
+        """Load the index of earlier runs, a store which cannot be read is replaced on the next save."""
+        if self._store_path is None or not os.path.exists(self._store_path):
+            return
+        try:
+            with open(self._store_path, "r") as file:
+                store = json.load(file)
+            contract_address = store["contract_address"]
+            next_block = int(store["next_block"])
+            services = {
+                topic: {(owner, endpoint): endpoint for owner, endpoint in entries}
+                for topic, entries in store["services"].items()
+            }
+        except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+            self.context.logger.warning(
+                "could not load the service directory index from {}, replaying the events: {}".format(
+                    self._store_path, e
+                )
+            )
+            return
+        strategy = cast(GenericStrategy, self.context.strategy)
+        if contract_address != strategy.contract_address:
+            self.context.logger.info(
+                "the service directory index in {} belongs to contract {}, replaying the events.".format(
+                    self._store_path, contract_address
+                )
+            )
+            return
+        # the index only replaces a start_block which it has already replayed
+        if next_block > self._next_block:
+            self._next_block = next_block
+            self._services = services
+        self.context.logger.info(
+            "loaded the service directory index up to block {} from {}.".format(
+                self._next_block - 1, self._store_path
+            )
+        )
+
+    def teardown(self) -> None:
+        """Save the index."""
+        self.save()
+
+    @property
+    def next_block(self) -> int:
+        """Get the first block which has not been replayed yet."""
+        return self._next_block
+
+    @property
+    def max_block_range(self) -> int:
+        """Get the maximum number of blocks whose events are requested at once."""
+        return self._max_block_range
+
+    @property
+    def is_syncing(self) -> bool:
+        """Check if a request for new events is pending."""
+        return self._is_syncing
+
+    @is_syncing.setter
+    def is_syncing(self, is_syncing: bool) -> None:
+        """Set if a request for new events is pending."""
+        enforce(isinstance(is_syncing, bool), "Can only set bool on is_syncing!")
+        self._is_syncing = is_syncing
+
+    def apply_events(self, events: List[Dict[str, Any]], to_block: int) -> None:
+        """
+        Apply service directory events and move the checkpoint behind the last block.
+
+        :param events: the ServiceAdded and ServiceDeleted events in emission order
+        :param to_block: the last block covered by the events
+        :return: None
+        """
+        for event in events:
+            services = self._services.setdefault(event["topic"], {})
+            for endpoint in event["endpoints"]:
+                key = (event["owner"], endpoint)
+                if event["event"] == SERVICE_ADDED:
+                    services[key] = endpoint
+                elif event["event"] == SERVICE_DELETED:
+                    services.pop(key, None)
+        self._next_block = max(self._next_block, to_block + 1)
+        self._is_dirty = True
+        if time.time() - self._saved >= self._save_interval:
+            self.save()
+
+    def get_endpoints(self, topics: List[str]) -> Dict[str, List[str]]:
+        """
+        Get the service endpoints of several topics from the index.
+
+        :param topics: the service topics
+        :return: the endpoints by topic
+        """
+        return {
+            topic: list(self._services.get(topic, {}).values()) for topic in topics
+        }
+
+    def save(self) -> None:
+        """
+        Write the index and its checkpoint to the store path.
+
+        The file is replaced atomically, so a crash does not leave a truncated store behind.
+
+        :return: None
+        """
+        self._saved = time.time()
+        if self._store_path is None or not self._is_dirty:
+            return
+        store = {
+            "contract_address": cast(GenericStrategy, self.context.strategy).contract_address,
+            "next_block": self._next_block,
+            "services": {
+                topic: [list(key) for key in services] for topic, services in self._services.items()
+            },
+        }
+        tmp_path = self._store_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(store, file, indent=2)
+        os.replace(tmp_path, self._store_path)
+        self._is_dirty = False
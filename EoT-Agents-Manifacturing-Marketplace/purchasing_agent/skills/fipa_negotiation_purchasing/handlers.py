@@ -3,7 +3,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import pprint
-from typing import Optional, cast
+from typing import Any, Dict, Optional, cast
 
 from aea.configurations.base import PublicId
 from aea.crypto.ledger_apis import LedgerApis
@@ -18,7 +18,13 @@ from packages.fetchai.protocols.fipa.message import FipaMessage
 from packages.fetchai.protocols.ledger_api.message import LedgerApiMessage
 from packages.fetchai.protocols.contract_api.message import ContractApiMessage
 from packages.fetchai.protocols.signing.message import SigningMessage
-from packages.bosch.skills.fipa_negotiation_purchasing.behaviours import GenericTransactionBehaviour
+from packages.bosch.contracts.batch_payment.contract import BatchPayment
+from packages.bosch.skills.fipa_negotiation_purchasing.auction import ReverseAuctions
+from packages.bosch.skills.fipa_negotiation_purchasing.behaviours import (
+    GenericSearchBehaviour,
+    GenericTransactionBehaviour,
+    ReverseAuctionBehaviour,
+)
 from packages.bosch.skills.fipa_negotiation_purchasing.dialogues import (
     DefaultDialogues,
     FipaDialogue,
@@ -30,6 +36,10 @@ from packages.bosch.skills.fipa_negotiation_purchasing.dialogues import (
     SigningDialogue,
     SigningDialogues,
 )
+from packages.bosch.skills.fipa_negotiation_purchasing.directory import ServiceDirectoryIndex
+from packages.bosch.skills.fipa_negotiation_purchasing.metrics import TradeMetrics, dialogue_key
+from packages.bosch.skills.fipa_negotiation_purchasing.reputation import SellerReputation
+from packages.bosch.skills.fipa_negotiation_purchasing.scheduler import CfpScheduler
 from packages.bosch.skills.fipa_negotiation_purchasing.strategy import GenericStrategy
 
 
@@ -63,6 +73,7 @@ class GenericFipaHandler(Handler):
         if fipa_dialogue is None:
             self._handle_unidentified_dialogue(fipa_msg)
             return
+        cast(CfpScheduler, self.context.cfp_scheduler).touch(fipa_dialogue)
 
         # handle message
         if fipa_msg.performative == FipaMessage.Performative.PROPOSE:
@@ -118,8 +129,15 @@ class GenericFipaHandler(Handler):
             )
         )
         strategy = cast(GenericStrategy, self.context.strategy)
+        metrics = cast(TradeMetrics, self.context.trade_metrics)
+        metrics.mark(dialogue_key(fipa_dialogue), "propose")
+        cast(SellerReputation, self.context.seller_reputation).record_response(fipa_dialogue)
         acceptable = strategy.is_acceptable_proposal(fipa_msg.proposal)
         affordable = strategy.is_affordable_proposal(fipa_msg.proposal)
+        auctions = cast(ReverseAuctions, self.context.reverse_auctions)
+        if auctions.is_enabled:
+            self._bid(fipa_msg, fipa_dialogue, acceptable and affordable)
+            return
         if acceptable and affordable:
             self.context.logger.info(
                 "accepting the proposal from sender={}".format(fipa_msg.sender[-5:])
@@ -130,6 +148,7 @@ class GenericFipaHandler(Handler):
                 performative=FipaMessage.Performative.ACCEPT, target_message=fipa_msg,
             )
             self.context.outbox.put_message(message=accept_msg)
+            metrics.mark(dialogue_key(fipa_dialogue), "accept")
         else:
             self.context.logger.info(
                 "declining the proposal from sender={}".format(fipa_msg.sender[-5:])
@@ -138,6 +157,59 @@ class GenericFipaHandler(Handler):
                 performative=FipaMessage.Performative.DECLINE, target_message=fipa_msg,
             )
             self.context.outbox.put_message(message=decline_msg)
+            metrics.discard(dialogue_key(fipa_dialogue))
+            self._release_negotiation(fipa_dialogue)
+
+    def _bid(
+        self, fipa_msg: FipaMessage, fipa_dialogue: FipaDialogue, is_valid: bool
+    ) -> None:
+        """
+        Add a proposal to the reverse auction of its dialogue.
+
+        Invalid proposals and proposals arriving after their auction closed are declined right away.
+
+        :param fipa_msg: the message
+        :param fipa_dialogue: the dialogue object
+        :param is_valid: whether the proposal is acceptable and affordable
+        :return: None
+        """
+        auctions = cast(ReverseAuctions, self.context.reverse_auctions)
+        auction = auctions.get_auction(fipa_dialogue)
+        if auction is not None and is_valid:
+            strategy = cast(GenericStrategy, self.context.strategy)
+            auction.add_offer(
+                fipa_dialogue, fipa_msg, strategy.get_proposal_rank(fipa_msg.proposal)
+            )
+            self.context.logger.info(
+                "adding the proposal from sender={} to the auction for service={}".format(
+                    fipa_msg.sender[-5:], auction.topic
+                )
+            )
+        else:
+            if auction is not None:
+                auction.add_response(fipa_dialogue)
+            self.context.logger.info(
+                "declining the proposal from sender={}".format(fipa_msg.sender[-5:])
+            )
+            decline_msg = fipa_dialogue.reply(
+                performative=FipaMessage.Performative.DECLINE, target_message=fipa_msg,
+            )
+            self.context.outbox.put_message(message=decline_msg)
+            cast(TradeMetrics, self.context.trade_metrics).discard(
+                dialogue_key(fipa_dialogue)
+            )
+            self._release_negotiation(fipa_dialogue)
+        cast(ReverseAuctionBehaviour, self.context.behaviours.auction).close_completed()
+
+    def _release_negotiation(self, fipa_dialogue: FipaDialogue) -> None:
+        """
+        Free the slot of a negotiation which reached an end state and send the next scheduled CFPs.
+
+        :param fipa_dialogue: the fipa dialogue
+        :return: None
+        """
+        if cast(CfpScheduler, self.context.cfp_scheduler).release(fipa_dialogue):
+            cast(GenericSearchBehaviour, self.context.behaviours.search).send_cfps()
 
     def _handle_decline(
         self,
@@ -156,17 +228,33 @@ class GenericFipaHandler(Handler):
         self.context.logger.info(
             "received DECLINE from sender={}".format(fipa_msg.sender[-5:])
         )
+        cast(TradeMetrics, self.context.trade_metrics).discard(
+            dialogue_key(fipa_dialogue)
+        )
+        self._release_negotiation(fipa_dialogue)
         target_message = fipa_dialogue.get_message_by_id(fipa_msg.target)
 
         if not target_message:
             raise ValueError("Can not find target message!")  # pragma: nocover
 
         declined_performative = target_message.performative
+        reputation = cast(SellerReputation, self.context.seller_reputation)
+        if declined_performative == FipaMessage.Performative.CFP:
+            reputation.record_response(fipa_dialogue)
+        reputation.record_decline(fipa_msg.sender)
 
         if declined_performative == FipaMessage.Performative.CFP:
             fipa_dialogues.dialogue_stats.add_dialogue_endstate(
                 FipaDialogue.EndState.DECLINED_CFP, fipa_dialogue.is_self_initiated
             )
+            auction = cast(
+                ReverseAuctions, self.context.reverse_auctions
+            ).get_auction(fipa_dialogue)
+            if auction is not None:
+                auction.add_response(fipa_dialogue)
+                cast(
+                    ReverseAuctionBehaviour, self.context.behaviours.auction
+                ).close_completed()
         if declined_performative == FipaMessage.Performative.ACCEPT:
             fipa_dialogues.dialogue_stats.add_dialogue_endstate(
                 FipaDialogue.EndState.DECLINED_ACCEPT, fipa_dialogue.is_self_initiated
@@ -187,6 +275,9 @@ class GenericFipaHandler(Handler):
                 fipa_msg.sender[-5:], fipa_msg.info
             )
         )
+        cast(TradeMetrics, self.context.trade_metrics).mark(
+            dialogue_key(fipa_dialogue), "match_accept"
+        )
         strategy = cast(GenericStrategy, self.context.strategy)
         if strategy.is_ledger_tx:
             transfer_address = fipa_msg.info.get("address", None)
@@ -231,11 +322,18 @@ class GenericFipaHandler(Handler):
             data = fipa_msg.info
             data_string = pprint.pformat(data)[:1000]
             self.context.logger.info(f"received the following data={data_string}")
+            cast(TradeMetrics, self.context.trade_metrics).finish(
+                dialogue_key(fipa_dialogue), "inform"
+            )
             fipa_dialogues.dialogue_stats.add_dialogue_endstate(
                 FipaDialogue.EndState.SUCCESSFUL, fipa_dialogue.is_self_initiated
             )
             strategy = cast(GenericStrategy, self.context.strategy)
             strategy.successful_trade_with_counterparty(fipa_msg.sender, data)
+            cast(SellerReputation, self.context.seller_reputation).record_success(
+                fipa_msg.sender
+            )
+            self._release_negotiation(fipa_dialogue)
         else:
             self.context.logger.info(
                 "received no data from sender={}".format(fipa_msg.sender[-5:])
@@ -322,6 +420,16 @@ class GenericSigningHandler(Handler):
         :return: None
         """
         self.context.logger.info("transaction signing was successful.")
+        tx_behaviour = cast(
+            GenericTransactionBehaviour, self.context.behaviours.transaction
+        )
+        if signing_dialogue.associated_contract_api_dialogue is not None:
+            tx_behaviour.mark_step(
+                signing_dialogue.associated_contract_api_dialogue, "signed"
+            )
+            self._send_batch_payment(signing_msg, signing_dialogue)
+            return
+        tx_behaviour.mark_step(signing_dialogue.associated_ledger_api_dialogue, "signed")
         ledger_api_dialogue = signing_dialogue.associated_ledger_api_dialogue
         last_ledger_api_msg = ledger_api_dialogue.last_incoming_message
         if last_ledger_api_msg is None:
@@ -334,6 +442,31 @@ class GenericSigningHandler(Handler):
         self.context.outbox.put_message(message=ledger_api_msg)
         self.context.logger.info("sending transaction to ledger.")
 
+    def _send_batch_payment(
+        self, signing_msg: SigningMessage, signing_dialogue: SigningDialogue
+    ) -> None:
+        """
+        Send a signed batch payment within a new ledger api dialogue.
+
+        :param signing_msg: the signing message
+        :param signing_dialogue: the dialogue
+        :return: None
+        """
+        ledger_api_dialogues = cast(
+            LedgerApiDialogues, self.context.ledger_api_dialogues
+        )
+        ledger_api_msg, ledger_api_dialogue = ledger_api_dialogues.create(
+            counterparty=LEDGER_API_ADDRESS,
+            performative=LedgerApiMessage.Performative.SEND_SIGNED_TRANSACTION,
+            signed_transaction=signing_msg.signed_transaction,
+        )
+        ledger_api_dialogue = cast(LedgerApiDialogue, ledger_api_dialogue)
+        ledger_api_dialogue.associated_contract_api_dialogue = (
+            signing_dialogue.associated_contract_api_dialogue
+        )
+        self.context.outbox.put_message(message=ledger_api_msg)
+        self.context.logger.info("sending batch payment to ledger.")
+
     def _handle_error(
         self, signing_msg: SigningMessage, signing_dialogue: SigningDialogue
     ) -> None:
@@ -360,6 +493,11 @@ class GenericSigningHandler(Handler):
             tx_behaviour = cast(
                 GenericTransactionBehaviour, self.context.behaviours.transaction
             )
+            if signing_dialogue.associated_contract_api_dialogue is not None:
+                tx_behaviour.failed_processing(
+                    signing_dialogue.associated_contract_api_dialogue
+                )
+                return
             ledger_api_dialogue = signing_dialogue.associated_ledger_api_dialogue
             tx_behaviour.failed_processing(ledger_api_dialogue)
 
@@ -480,6 +618,10 @@ class GenericLedgerApiHandler(Handler):
         :param ledger_api_dialogue: the ledger api dialogue
         """
         self.context.logger.info("received raw transaction={}".format(ledger_api_msg))
+        tx_behaviour = cast(
+            GenericTransactionBehaviour, self.context.behaviours.transaction
+        )
+        tx_behaviour.mark_step(ledger_api_dialogue, "raw_transaction")
         signing_dialogues = cast(SigningDialogues, self.context.signing_dialogues)
         signing_msg, signing_dialogue = signing_dialogues.create(
             counterparty=self.context.decision_maker_address,
@@ -508,6 +650,10 @@ class GenericLedgerApiHandler(Handler):
                 ledger_api_msg.transaction_digest
             )
         )
+        tx_behaviour = cast(
+            GenericTransactionBehaviour, self.context.behaviours.transaction
+        )
+        tx_behaviour.mark_step(ledger_api_dialogue, "digest")
         ledger_api_msg_ = ledger_api_dialogue.reply(
             performative=LedgerApiMessage.Performative.GET_TRANSACTION_RECEIPT,
             target_message=ledger_api_msg,
@@ -525,6 +671,12 @@ class GenericLedgerApiHandler(Handler):
         :param ledger_api_message: the ledger api message
         :param ledger_api_dialogue: the ledger api dialogue
         """
+        cast(
+            GenericTransactionBehaviour, self.context.behaviours.transaction
+        ).mark_step(ledger_api_dialogue, "receipt")
+        if ledger_api_dialogue.associated_contract_api_dialogue is not None:
+            self._handle_batch_payment_receipt(ledger_api_msg, ledger_api_dialogue)
+            return
         fipa_dialogue = ledger_api_dialogue.associated_fipa_dialogue
         is_settled = LedgerApis.is_transaction_settled(
             fipa_dialogue.terms.ledger_id, ledger_api_msg.transaction_receipt.receipt
@@ -563,6 +715,74 @@ class GenericLedgerApiHandler(Handler):
                 )
             )
 
+    def _handle_batch_payment_receipt(
+        self, ledger_api_msg: LedgerApiMessage, ledger_api_dialogue: LedgerApiDialogue
+    ) -> None:
+        """
+        Handle the receipt of a batch payment, each seller is informed of the shared transaction digest.
+
+        :param ledger_api_message: the ledger api message
+        :param ledger_api_dialogue: the ledger api dialogue
+        """
+        strategy = cast(GenericStrategy, self.context.strategy)
+        contract_api_dialogue = cast(
+            ContractApiDialogue, ledger_api_dialogue.associated_contract_api_dialogue
+        )
+        is_settled = LedgerApis.is_transaction_settled(
+            strategy.ledger_id, ledger_api_msg.transaction_receipt.receipt
+        )
+        tx_behaviour = cast(
+            GenericTransactionBehaviour, self.context.behaviours.transaction
+        )
+        if not is_settled:
+            tx_behaviour.failed_processing(ledger_api_dialogue)
+            self.context.logger.info(
+                "batch payment transaction_receipt={} not settled, aborting".format(
+                    ledger_api_msg.transaction_receipt
+                )
+            )
+            return
+        tx_behaviour.finish_processing(ledger_api_dialogue)
+        transaction_digest = ledger_api_msg.transaction_receipt.transaction["hash"]
+        failed_recipients = {
+            recipient.lower()
+            for recipient in BatchPayment.get_failed_recipients(
+                ledger_api_msg.transaction_receipt.receipt
+            )
+        }
+        failed_dialogues = [
+            fipa_dialogue
+            for fipa_dialogue in contract_api_dialogue.associated_fipa_dialogues
+            if fipa_dialogue.terms.counterparty_address.lower() in failed_recipients
+        ]
+        if len(failed_dialogues) > 0:
+            self.context.logger.info(
+                "batch payment rejected by counterparties={}, payments refunded.".format(
+                    [fipa_dialogue.dialogue_label.dialogue_opponent_addr[-5:] for fipa_dialogue in failed_dialogues]
+                )
+            )
+            tx_behaviour.failed_payments(failed_dialogues)
+        for fipa_dialogue in contract_api_dialogue.associated_fipa_dialogues:
+            if fipa_dialogue in failed_dialogues:
+                continue
+            fipa_msg = cast(Optional[FipaMessage], fipa_dialogue.last_incoming_message)
+            if fipa_msg is None:
+                raise ValueError("Could not retrieve last fipa message")
+            inform_msg = fipa_dialogue.reply(
+                performative=FipaMessage.Performative.INFORM,
+                target_message=fipa_msg,
+                info={
+                    "transaction_digest": transaction_digest,
+                    "batch_payment": strategy.batch_payment_address,
+                },
+            )
+            self.context.outbox.put_message(message=inform_msg)
+            self.context.logger.info(
+                "batch payment confirmed, informing counterparty={} of transaction digest.".format(
+                    fipa_dialogue.dialogue_label.dialogue_opponent_addr[-5:],
+                )
+            )
+
     def _handle_error(
         self, ledger_api_msg: LedgerApiMessage, ledger_api_dialogue: LedgerApiDialogue
     ) -> None:
@@ -638,6 +858,11 @@ class ContractApiHandler(Handler):
         # handle message
         elif contract_api_msg.performative is ContractApiMessage.Performative.STATE:
             self._handle_state(contract_api_msg, contract_api_dialogue)
+        elif (
+            contract_api_msg.performative
+            is ContractApiMessage.Performative.RAW_TRANSACTION
+        ):
+            self._handle_raw_transaction(contract_api_msg, contract_api_dialogue)
         elif contract_api_msg.performative is ContractApiMessage.Performative.ERROR:
             self._handle_error(contract_api_msg, contract_api_dialogue)
         else:
@@ -678,24 +903,67 @@ class ContractApiHandler(Handler):
         """
         strategy = cast(GenericStrategy, self.context.strategy)
         self.context.logger.info("received state={}".format(contract_api_msg))
-        # TODO: define better data structure with multiple services and endpoints!
-        if (len(contract_api_msg.state.body['topic']["3D_printing_service"]) == 0):
-            self.context.logger.info("No endpoints found for requested services, continue searching...")
-            strategy.is_searching = True
+        contract_callable = self._get_callable(contract_api_dialogue)
+        cast(TradeMetrics, self.context.trade_metrics).stop(
+            dialogue_key(contract_api_dialogue), contract_callable
+        )
+        is_page = contract_callable == "getServiceEndpointsPage"
+        if contract_callable == "getServiceEvents":
+            index = cast(ServiceDirectoryIndex, self.context.service_directory_index)
+            index.apply_events(
+                contract_api_msg.state.body["events"],
+                contract_api_msg.state.body["to_block"],
+            )
+            index.is_syncing = False
+            if index.next_block <= contract_api_msg.state.body["latest_block"]:
+                # the index is served once it caught up with the latest block
+                search_behaviour = cast(
+                    GenericSearchBehaviour, self.context.behaviours.search
+                )
+                search_behaviour.request_services_events()
+                return
+            if not strategy.is_searching:
+                return
+            endpoints_by_topic = index.get_endpoints(strategy.get_service_topics())
         else:
-            strategy.is_searching = False
-            counterparties = contract_api_msg.state.body['topic']["3D_printing_service"]
-            self.context.logger.info("found agents={}.".format(counterparties))
-            # Fipa negotiation starts here: send fipa CFP message to counterparties...
-            query = strategy.get_service_query()
-            fipa_dialogues = cast(FipaDialogues, self.context.fipa_dialogues)
-            for counterparty in counterparties:
-                cfp_msg, _ = fipa_dialogues.create(
-                    counterparty=counterparty,
-                    performative=FipaMessage.Performative.CFP,
-                    query=query,)
-                self.context.outbox.put_message(message=cfp_msg)
-                self.context.logger.info("sending CFP to agent={}".format(counterparty))
+            endpoints_by_topic = contract_api_msg.state.body["topic"]
+        if all(len(endpoints) == 0 for endpoints in endpoints_by_topic.values()):
+            self.context.logger.info("No endpoints found for requested services, continue searching...")
+            if not is_page:
+                # a page only covers one topic, others may have been found already
+                strategy.is_searching = True
+            return
+        strategy.is_searching = False
+        scheduler = cast(CfpScheduler, self.context.cfp_scheduler)
+        reputation = cast(SellerReputation, self.context.seller_reputation)
+        for topic, counterparties in endpoints_by_topic.items():
+            if len(counterparties) == 0:
+                self.context.logger.info("No endpoints found for service={}.".format(topic))
+                continue
+            self.context.logger.info("found agents={} for service={}.".format(counterparties, topic))
+            # Fipa negotiation starts here: CFPs are sent to the counterparties as negotiation slots are free
+            for counterparty in strategy.get_acceptable_counterparties(tuple(counterparties)):
+                scheduler.schedule(topic, counterparty, reputation.get_rank(counterparty))
+        cast(GenericSearchBehaviour, self.context.behaviours.search).send_cfps()
+        if is_page:
+            self._request_next_page(contract_api_msg.state.body)
+
+    def _request_next_page(self, page: Dict[str, Any]) -> None:
+        """
+        Request the page following the received one, if there is any.
+
+        Services removed from the directory between two pages may cause an endpoint to be repeated,
+        which is not scheduled twice, or to be skipped until the next search.
+
+        :param page: the received page of service endpoints
+        """
+        for topic, endpoints in page["topic"].items():
+            offset = page["offset"] + len(endpoints)
+            if len(endpoints) > 0 and offset < page["total"]:
+                search_behaviour = cast(
+                    GenericSearchBehaviour, self.context.behaviours.search
+                )
+                search_behaviour.request_endpoints_page(topic, offset)
 
     def _handle_error(
         self,
@@ -713,6 +981,59 @@ class ContractApiHandler(Handler):
                 contract_api_msg, contract_api_dialogue
             )
         )
+        cast(TradeMetrics, self.context.trade_metrics).stop(
+            dialogue_key(contract_api_dialogue),
+            self._get_callable(contract_api_dialogue) + "_error",
+        )
+        if self._get_callable(contract_api_dialogue) == "getServiceEvents":
+            index = cast(ServiceDirectoryIndex, self.context.service_directory_index)
+            index.is_syncing = False
+        elif self._get_callable(contract_api_dialogue) == "pay":
+            tx_behaviour = cast(
+                GenericTransactionBehaviour, self.context.behaviours.transaction
+            )
+            tx_behaviour.failed_processing(contract_api_dialogue)
+
+    def _handle_raw_transaction(
+        self,
+        contract_api_msg: ContractApiMessage,
+        contract_api_dialogue: ContractApiDialogue,
+    ) -> None:
+        """
+        Handle a message of raw_transaction performative, i.e. a batch payment to be signed.
+
+        :param contract_api_message: the contract api message
+        :param contract_api_dialogue: the contract api dialogue
+        """
+        self.context.logger.info("received raw transaction={}".format(contract_api_msg))
+        tx_behaviour = cast(
+            GenericTransactionBehaviour, self.context.behaviours.transaction
+        )
+        tx_behaviour.mark_step(contract_api_dialogue, "raw_transaction")
+        signing_dialogues = cast(SigningDialogues, self.context.signing_dialogues)
+        signing_msg, signing_dialogue = signing_dialogues.create(
+            counterparty=self.context.decision_maker_address,
+            performative=SigningMessage.Performative.SIGN_TRANSACTION,
+            raw_transaction=contract_api_msg.raw_transaction,
+            terms=contract_api_dialogue.terms,
+        )
+        signing_dialogue = cast(SigningDialogue, signing_dialogue)
+        signing_dialogue.associated_contract_api_dialogue = contract_api_dialogue
+        self.context.decision_maker_message_queue.put_nowait(signing_msg)
+        self.context.logger.info(
+            "proposing the batch payment to the decision maker. Waiting for confirmation ..."
+        )
+
+    @staticmethod
+    def _get_callable(contract_api_dialogue: ContractApiDialogue) -> str:
+        """
+        Get the contract callable requested within a dialogue.
+
+        :param contract_api_dialogue: the contract api dialogue
+        :return: the name of the callable
+        """
+        request = cast(ContractApiMessage, contract_api_dialogue.last_outgoing_message)
+        return request.callable
 
     def _handle_invalid(
         self,
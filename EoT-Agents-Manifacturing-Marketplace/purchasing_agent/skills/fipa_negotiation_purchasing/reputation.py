@@ -0,0 +1,209 @@
+# Copyright (c) 2021 - for information on the respective copyright owner see the NOTICE file and/or the repository https://github.com/boschresearch/open-eot-agents.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""This module contains the reputation of the sellers."""
+
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from aea.exceptions import enforce
+from aea.skills.base import Model
+
+from packages.bosch.skills.fipa_negotiation_purchasing.dialogues import FipaDialogue
+from packages.bosch.skills.fipa_negotiation_purchasing.metrics import dialogue_key
+
+
+DEFAULT_STORE_PATH = None
+DEFAULT_ALPHA = 0.3
+DEFAULT_SAVE_INTERVAL = 10.0
+DEFAULT_MAX_PENDING = 1000
+# rates are compared in steps, so the response latency decides among similarly reliable sellers
+RATE_STEPS = 10
+COUNTERS = ("cfps", "responses", "declines", "timeouts", "successes", "settlement_failures")
+
+
+class SellerReputation(Model):
+    """This class keeps statistics of the sellers, which rank them when CFPs are scheduled."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        """
+        Initialize the seller reputation.
+
+        :return: None
+        """
+        self._store_path = kwargs.pop("store_path", DEFAULT_STORE_PATH)
+        self._alpha = float(kwargs.pop("alpha", DEFAULT_ALPHA))
+        self._save_interval = float(kwargs.pop("save_interval", DEFAULT_SAVE_INTERVAL))
+        self._max_pending = int(kwargs.pop("max_pending", DEFAULT_MAX_PENDING))
+        super().__init__(**kwargs)
+        enforce(0 < self._alpha <= 1, "The smoothing factor alpha has to be within (0, 1].")
+        self._sellers = {}  # type: Dict[str, Dict[str, Any]]
+        # the time of the CFPs not answered yet by dialogue key
+        self._cfp_times = OrderedDict()  # type: OrderedDict
+        self._is_dirty = False
+        self._saved = time.time()
+
+    def setup(self) -> None:
+        """Load the statistics of earlier runs, a store which cannot be read is replaced on the next save."""
+        if self._store_path is None or not os.path.exists(self._store_path):
+            return
+        try:
+            with open(self._store_path, "r") as file:
+                sellers = json.load(file)
+        except (OSError, ValueError) as e:
+            self.context.logger.warning(
+                "could not load the reputation from {}, starting without it: {}".format(self._store_path, e)
+            )
+            return
+        if not isinstance(sellers, dict):
+            self.context.logger.warning(
+                "could not load the reputation from {}, starting without it: no object".format(self._store_path)
+            )
+            return
+        # counters added since the store was written start at 0
+        self._sellers = {
+            counterparty: {**{counter: 0 for counter in COUNTERS}, "latency": None, **stats}
+            for counterparty, stats in sellers.items()
+            if isinstance(stats, dict)
+        }
+        self.context.logger.info(
+            "loaded the reputation of {} sellers from {}.".format(len(self._sellers), self._store_path)
+        )
+
+    def teardown(self) -> None:
+        """Save the statistics."""
+        self.save()
+
+    def get_stats(self, counterparty: str) -> Dict[str, Any]:
+        """
+        Get the statistics of a seller.
+
+        :param counterparty: the address of the seller
+        :return: the counters and the response latency EWMA in seconds, None if it never responded
+        """
+        stats = self._sellers.get(counterparty, None)
+        if stats is None:
+            stats = {counter: 0 for counter in COUNTERS}
+            stats["latency"] = None
+            self._sellers[counterparty] = stats
+        return stats
+
+    def get_rank(self, counterparty: str) -> Tuple[float, float, float, float]:
+        """
+        Get the rank of a seller to schedule the CFPs, the lowest rank is sent first.
+
+        Sellers are ranked by their share of failed settlements, their share of timed out negotiations,
+        their decline rate and their response latency. Unknown sellers rank first, so they get a chance
+        to build up their reputation.
+
+        :param counterparty: the address of the seller
+        :return: the rank
+        """
+        stats = self._sellers.get(counterparty, None)
+        if stats is None:
+            return (0.0, 0.0, 0.0, 0.0)
+        settled = stats["successes"] + stats["settlement_failures"]
+        failure_rate = stats["settlement_failures"] / settled if settled > 0 else 0.0
+        timeout_rate = stats["timeouts"] / stats["cfps"] if stats["cfps"] > 0 else 0.0
+        decline_rate = stats["declines"] / stats["responses"] if stats["responses"] > 0 else 0.0
+        return (
+            round(failure_rate * RATE_STEPS) / RATE_STEPS,
+            round(timeout_rate * RATE_STEPS) / RATE_STEPS,
+            round(decline_rate * RATE_STEPS) / RATE_STEPS,
+            stats["latency"] or 0.0,
+        )
+
+    def record_cfp(self, fipa_dialogue: FipaDialogue) -> None:
+        """
+        Record a CFP sent to a seller.
+
+        :param fipa_dialogue: the fipa dialogue of the CFP
+        :return: None
+        """
+        if len(self._cfp_times) >= self._max_pending:
+            self._cfp_times.popitem(last=False)
+        self._cfp_times[dialogue_key(fipa_dialogue)] = time.time()
+        self._count(fipa_dialogue.dialogue_label.dialogue_opponent_addr, "cfps")
+
+    def record_response(self, fipa_dialogue: FipaDialogue) -> None:
+        """
+        Record the response of a seller to a CFP and update its response latency.
+
+        :param fipa_dialogue: the fipa dialogue of the CFP
+        :return: None
+        """
+        sent = self._cfp_times.pop(dialogue_key(fipa_dialogue), None)
+        if sent is None:
+            return
+        stats = self.get_stats(fipa_dialogue.dialogue_label.dialogue_opponent_addr)
+        latency = time.time() - sent
+        stats["latency"] = (
+            latency
+            if stats["latency"] is None
+            else self._alpha * latency + (1 - self._alpha) * stats["latency"]
+        )
+        self._count(fipa_dialogue.dialogue_label.dialogue_opponent_addr, "responses")
+
+    def record_decline(self, counterparty: str) -> None:
+        """
+        Record a decline of a seller.
+
+        :param counterparty: the address of the seller
+        :return: None
+        """
+        self._count(counterparty, "declines")
+
+    def record_timeout(self, counterparty: str) -> None:
+        """
+        Record a negotiation the seller abandoned, it is not part of the decline rate as there was no response.
+
+        :param counterparty: the address of the seller
+        :return: None
+        """
+        self._count(counterparty, "timeouts")
+
+    def record_success(self, counterparty: str) -> None:
+        """
+        Record a successful trade with a seller.
+
+        :param counterparty: the address of the seller
+        :return: None
+        """
+        self._count(counterparty, "successes")
+
+    def record_settlement_failure(self, counterparty: str) -> None:
+        """
+        Record a trade with a seller which was abandoned after its settlements failed or timed out.
+
+        :param counterparty: the address of the seller
+        :return: None
+        """
+        self._count(counterparty, "settlement_failures")
+
+    def _count(self, counterparty: str, counter: str) -> None:
+        """Increment a counter of a seller and save the statistics once the save interval elapsed."""
+        self.get_stats(counterparty)[counter] += 1
+        self._is_dirty = True
+        if time.time() - self._saved >= self._save_interval:
+            self.save()
+
+    def save(self) -> None:
+        """
+        Write the statistics to the store path.
+
+        The file is replaced atomically, so a crash does not leave a truncated store behind.
+
+        :return: None
+        """
+        self._saved = time.time()
+        if self._store_path is None or not self._is_dirty:
+            return
+        tmp_path = self._store_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self._sellers, file, indent=2)
+        os.replace(tmp_path, self._store_path)
+        self._is_dirty = False
@@ -0,0 +1,152 @@
+# Copyright (c) 2021 - for information on the respective copyright owner see the NOTICE file and/or the repository https://github.com/boschresearch/open-eot-agents.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""This module contains the scheduler of the CFPs of the agent."""
+
+import heapq
+import time
+from collections import OrderedDict
+from typing import Any, Collection, List, Optional, Set, Tuple
+
+from aea.exceptions import enforce
+from aea.skills.base import Model
+
+from packages.bosch.skills.fipa_negotiation_purchasing.dialogues import FipaDialogue
+from packages.bosch.skills.fipa_negotiation_purchasing.metrics import dialogue_key
+
+
+DEFAULT_NEGOTIATION_TIMEOUT = 120.0
+
+
+class CfpScheduler(Model):
+    """This class bounds the number of open negotiations and queues the CFPs exceeding it by rank of their seller."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        """
+        Initialize the CFP scheduler.
+
+        :return: None
+        """
+        self._negotiation_timeout = float(
+            kwargs.pop("negotiation_timeout", DEFAULT_NEGOTIATION_TIMEOUT)
+        )
+        super().__init__(**kwargs)
+        enforce(
+            self._negotiation_timeout > 0,
+            "The negotiation timeout has to be positive.",
+        )
+        self._queue = []  # type: List[Tuple[Any, ...]]
+        self._queued = set()  # type: Set[Tuple[str, str]]
+        # the topic, counterparty and time of the last activity of the open negotiations by dialogue key
+        self._open = OrderedDict()  # type: OrderedDict
+        self._open_pairs = set()  # type: Set[Tuple[str, str]]
+        self._count = 0
+
+    @property
+    def queued_count(self) -> int:
+        """Get the number of CFPs waiting for a free slot."""
+        return len(self._queue)
+
+    @property
+    def open_count(self) -> int:
+        """Get the number of open negotiations."""
+        return len(self._open)
+
+    def schedule(self, topic: str, counterparty: str, rank: Tuple[Any, ...]) -> bool:
+        """
+        Queue a CFP to a seller, unless one for the same service is queued or open already.
+
+        :param topic: the service topic
+        :param counterparty: the address of the seller
+        :param rank: the rank of the seller, the lowest rank is sent first
+        :return: whether the CFP was queued
+        """
+        if (topic, counterparty) in self._queued or (topic, counterparty) in self._open_pairs:
+            return False
+        self._count += 1
+        heapq.heappush(self._queue, (*rank, self._count, topic, counterparty))
+        self._queued.add((topic, counterparty))
+        return True
+
+    def pop_next(
+        self, max_negotiations: int, exempt_topics: Collection[str] = ()
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Pop the best ranked CFP if there is a free slot, or else the best ranked CFP of an exempt topic.
+
+        :param max_negotiations: the maximum number of open negotiations, 0 for no limit
+        :param exempt_topics: the service topics whose CFPs are sent even if no slot is free
+        :return: the topic and counterparty of the CFP, None if there is none or no slot is free
+        """
+        if len(self._queue) == 0:
+            return None
+        if max_negotiations <= 0 or len(self._open) < max_negotiations:
+            entry = heapq.heappop(self._queue)
+        else:
+            exempt = [entry for entry in self._queue if entry[-2] in exempt_topics]
+            if len(exempt) == 0:
+                return None
+            entry = min(exempt)
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+        topic, counterparty = entry[-2:]
+        self._queued.discard((topic, counterparty))
+        return topic, counterparty
+
+    def start(self, fipa_dialogue: FipaDialogue, topic: str) -> None:
+        """
+        Occupy a slot with the negotiation of a sent CFP.
+
+        :param fipa_dialogue: the fipa dialogue of the CFP
+        :param topic: the service topic
+        :return: None
+        """
+        counterparty = fipa_dialogue.dialogue_label.dialogue_opponent_addr
+        self._open[dialogue_key(fipa_dialogue)] = (topic, counterparty, time.time())
+        self._open_pairs.add((topic, counterparty))
+
+    def touch(self, fipa_dialogue: FipaDialogue) -> None:
+        """
+        Restart the negotiation timeout of an open negotiation, e.g. on a message of the seller.
+
+        :param fipa_dialogue: the fipa dialogue
+        :return: None
+        """
+        key = dialogue_key(fipa_dialogue)
+        if key in self._open:
+            topic, counterparty, _ = self._open[key]
+            self._open[key] = (topic, counterparty, time.time())
+            self._open.move_to_end(key)
+
+    def release(self, fipa_dialogue: FipaDialogue) -> bool:
+        """
+        Free the slot of a negotiation which reached an end state.
+
+        :param fipa_dialogue: the fipa dialogue
+        :return: whether a slot was freed
+        """
+        negotiation = self._open.pop(dialogue_key(fipa_dialogue), None)
+        if negotiation is None:
+            return False
+        self._open_pairs.discard(negotiation[:2])
+        return True
+
+    def release_expired(self) -> List[Tuple[str, str]]:
+        """
+        Free the slots of negotiations whose seller has been silent for the negotiation timeout.
+
+        :return: the topics and counterparties of the expired negotiations
+        """
+        expired = []
+        deadline = time.time() - self._negotiation_timeout
+        # negotiations are kept in order of their last activity
+        while len(self._open) > 0:
+            key = next(iter(self._open))
+            topic, counterparty, last_activity = self._open[key]
+            if last_activity > deadline:
+                break
+            self._open.pop(key)
+            self._open_pairs.discard((topic, counterparty))
+            expired.append((topic, counterparty))
+        return expired
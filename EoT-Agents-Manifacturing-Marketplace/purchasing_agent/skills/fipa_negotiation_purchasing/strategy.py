@@ -2,7 +2,7 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from aea.common import Address
 from aea.exceptions import enforce
@@ -15,6 +15,7 @@ from aea.helpers.search.models import (
 )
 from aea.helpers.transaction.base import Terms
 from aea.skills.base import Model
+from packages.bosch.contracts.batch_payment.contract import BatchPayment
 from packages.bosch.contracts.service_directory.contract import ServiceDirectory
 
 
@@ -22,6 +23,10 @@ DEFAULT_IS_LEDGER_TX = True
 DEFAULT_CONTRACT_ADDRESS = "0x0"
 DEFAULT_DEPLOYER_ADDRESS = "0x0"
 DEFAULT_MAX_NEGOTIATIONS = 2
+DEFAULT_BATCH_PAYMENT_ADDRESS = None
+DEFAULT_GAS_MARGIN = 1.2
+DEFAULT_GAS_PRICE = 50
+DEFAULT_MAX_PRIORITY_FEE_PER_GAS = 1
 DEFAULT_SEARCH_SERVICE_1 = {"id": "3D_printing_service", "max_tx_fee": 1, "max_unit_price": 10, "min_quantity": 1, "max_quantity": 4,
         "search_query": {
         "constraint_type": "==",
@@ -48,6 +53,14 @@ class GenericStrategy(Model):
         self.contract_id = str(ServiceDirectory.PUBLIC_ID)
         self.contract_address = kwargs.pop("contract_address", DEFAULT_CONTRACT_ADDRESS)
         self.deployer_address = kwargs.pop("deployer_address", DEFAULT_DEPLOYER_ADDRESS)
+        self.batch_payment_id = str(BatchPayment.PUBLIC_ID)
+        self.batch_payment_address = kwargs.pop("batch_payment_address", DEFAULT_BATCH_PAYMENT_ADDRESS)
+        self._gas_margin = kwargs.pop("gas_margin", DEFAULT_GAS_MARGIN)
+        self._gas_price = kwargs.pop("gas_price", DEFAULT_GAS_PRICE)
+        self._max_fee_per_gas = kwargs.pop("max_fee_per_gas", None)
+        self._max_priority_fee_per_gas = kwargs.pop(
+            "max_priority_fee_per_gas", DEFAULT_MAX_PRIORITY_FEE_PER_GAS
+        )
         currency_id = kwargs.pop("currency_id", None)
         
         self._max_negotiations = kwargs.pop("max_negotiations", DEFAULT_MAX_NEGOTIATIONS)
@@ -102,7 +115,7 @@ class GenericStrategy(Model):
 
     @property
     def max_negotiations(self) -> int:
-        """Get the maximum number of negotiations the agent can start."""
+        """Get the maximum number of concurrent negotiations, 0 for no limit."""
         return self._max_negotiations
 
     def get_services(self) -> Dict[str, str]:
@@ -114,6 +127,55 @@ class GenericStrategy(Model):
         self._services = {"search_service_1": self._search_service_1["id"], "search_service_2": self._search_service_2["id"]}
         return self._services
 
+    def get_service_topics(self) -> List[str]:
+        """
+        Get the distinct service topics to be looked up in the service directory.
+
+        :return: a list of service topics
+        """
+        topics: List[str] = []
+        for service_id in self.get_services().values():
+            if service_id not in topics:
+                topics.append(service_id)
+        return topics
+
+    def get_search_service(self, service_id: str) -> Dict[str, Any]:
+        """
+        Get the configuration of a search service by its id.
+
+        The first configured search service wins if several share the same id.
+
+        :param service_id: the id of the service
+        :return: the search service configuration
+        """
+        for search_service in [self._search_service_1, self._search_service_2]:
+            if search_service["id"] == service_id:
+                return search_service
+        raise ValueError("No search service configured for id={}".format(service_id))
+
+    def get_batch_payment_kwargs(self, terms_list: List[Terms]) -> Dict[str, Any]:
+        """
+        Get the arguments of a batch payment settling several terms.
+
+        The nonce of the terms is used as payment reference, so each seller can identify its payment.
+        EIP-1559 fees are used if max_fee_per_gas is configured, the gas price otherwise.
+
+        :param terms_list: the terms to be settled
+        :return: the keyword arguments for the batch payment callable
+        """
+        kwargs = {
+            "deployer_address": self.context.agent_address,
+            "recipients": [terms.counterparty_address for terms in terms_list],
+            "amounts": [terms.sender_payable_amount for terms in terms_list],
+            "references": [terms.nonce for terms in terms_list],
+            "gas_margin": self._gas_margin,
+            "gas_price": self._gas_price,
+        }
+        if self._max_fee_per_gas is not None:
+            kwargs["max_fee_per_gas"] = self._max_fee_per_gas
+            kwargs["max_priority_fee_per_gas"] = self._max_priority_fee_per_gas
+        return kwargs
+
     def get_contract_terms(self) -> Terms:
         """
         Get the contract terms.
@@ -130,17 +192,21 @@ class GenericStrategy(Model):
         )
         return terms
     
-    def get_service_query(self) -> Query:
+    def get_service_query(self, service_id: Optional[str] = None) -> Query:
         """
         Get the service query of the agent.
 
+        :param service_id: the id of the searched service, defaults to search_service_1
         :return: the query
         """
+        search_service = (
+            self._search_service_1 if service_id is None else self.get_search_service(service_id)
+        )
         service_key_filter = Constraint(
-            self._search_service_1["search_query"]["search_key"],
+            search_service["search_query"]["search_key"],
             ConstraintType(
-                self._search_service_1["search_query"]["constraint_type"],
-                self._search_service_1["search_query"]["search_value"],
+                search_service["search_query"]["constraint_type"],
+                search_service["search_query"]["search_value"],
             ),
         )
         query = Query([service_key_filter], model=SIMPLE_SERVICE_MODEL)
@@ -150,30 +216,36 @@ class GenericStrategy(Model):
         """
         Check whether it is an acceptable proposal.
 
+        The proposal is checked against the search service matching its service_id.
+
         :return: whether it is acceptable
         """
-        result = (
-            all(
-                [
-                    key in proposal.values
-                    for key in [
-                        "ledger_id",
-                        "currency_id",
-                        "price",
-                        "service_id",
-                        "quantity",
-                        "tx_nonce",
-                    ]
+        if not all(
+            [
+                key in proposal.values
+                for key in [
+                    "ledger_id",
+                    "currency_id",
+                    "price",
+                    "service_id",
+                    "quantity",
+                    "tx_nonce",
                 ]
-            )
-            and proposal.values["ledger_id"] == self.ledger_id
+            ]
+        ):
+            return False
+        try:
+            search_service = self.get_search_service(proposal.values["service_id"])
+        except ValueError:
+            return False
+        result = (
+            proposal.values["ledger_id"] == self.ledger_id
             and proposal.values["price"] > 0
-            and proposal.values["quantity"] >= self._search_service_1["min_quantity"]
-            and proposal.values["quantity"] <= self._search_service_1["max_quantity"]
+            and proposal.values["quantity"] >= search_service["min_quantity"]
+            and proposal.values["quantity"] <= search_service["max_quantity"]
             and proposal.values["price"]
-            <= proposal.values["quantity"] * self._search_service_1["max_unit_price"]
+            <= proposal.values["quantity"] * search_service["max_unit_price"]
             and proposal.values["currency_id"] == self._currency_id
-            and proposal.values["service_id"] == self._search_service_1["id"]
             and isinstance(proposal.values["tx_nonce"], str)
             and proposal.values["tx_nonce"] != ""
         )
@@ -186,12 +258,28 @@ class GenericStrategy(Model):
         :return: whether it is affordable
         """
         if self.is_ledger_tx:
-            payable = proposal.values.get("price", 0) + self._search_service_1["max_tx_fee"]
+            try:
+                search_service = self.get_search_service(proposal.values.get("service_id", ""))
+            except ValueError:
+                return False
+            payable = proposal.values.get("price", 0) + search_service["max_tx_fee"]
             result = self.balance >= payable
         else:
             result = True
         return result
     
+    def get_proposal_rank(self, proposal: Description) -> Tuple[float]:
+        """
+        Get the rank of an acceptable proposal within a reverse auction, the lowest rank wins.
+
+        Sellers do not propose a transaction fee, the buyer pays its own max_tx_fee for every proposal
+        of a service, so proposals are ranked by unit price. The earlier of equally ranked proposals wins.
+
+        :param proposal: the proposal
+        :return: the unit price of the proposal
+        """
+        return (proposal.values["price"] / proposal.values["quantity"],)
+
     def terms_from_proposal(
         self, proposal: Description, counterparty_address: Address
     ) -> Terms:
@@ -202,6 +290,7 @@ class GenericStrategy(Model):
         :return: terms
         """
         buyer_address = self.context.agent_addresses[proposal.values["ledger_id"]]
+        search_service = self.get_search_service(proposal.values["service_id"])
         terms = Terms(
             ledger_id=proposal.values["ledger_id"],
             sender_address=buyer_address,
@@ -214,25 +303,29 @@ class GenericStrategy(Model):
             },
             is_sender_payable_tx_fee=True,
             nonce=proposal.values["tx_nonce"],
-            fee_by_currency_id={proposal.values["currency_id"]: self._search_service_1["max_tx_fee"]},
+            fee_by_currency_id={proposal.values["currency_id"]: search_service["max_tx_fee"]},
         )
         return terms
     
-    #TODO: Check if this could be used in current use-case!
     def get_acceptable_counterparties(
         self, counterparties: Tuple[str, ...]
     ) -> Tuple[str, ...]:
         """
         Process counterparties and drop unacceptable ones.
 
+        Duplicate endpoints and the own address are dropped, the number of concurrent negotiations
+        is bounded by the CFP scheduler.
+
         :return: list of counterparties
         """
         valid_counterparties: List[str] = []
-        for idx, counterparty in enumerate(counterparties):
-            if idx < self.max_negotiations:
+        seen = {self.context.agent_address}
+        for counterparty in counterparties:
+            if counterparty not in seen:
+                seen.add(counterparty)
                 valid_counterparties.append(counterparty)
         return tuple(valid_counterparties)
-    
+
     def successful_trade_with_counterparty(
         self, counterparty: str, data: Dict[str, str]
     ) -> None:
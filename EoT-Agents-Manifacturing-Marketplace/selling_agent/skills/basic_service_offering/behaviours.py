@@ -100,6 +100,7 @@ class GenericServiceRegistrationBehaviour(TickerBehaviour):
                         "deployer_address": self.context.agent_address, 
                         "topics": services,
                         "endpoint": self.context.agent_address,
+                        **strategy.get_fee_kwargs(),
                     }
                 )
             )
@@ -135,6 +136,7 @@ class GenericServiceRegistrationBehaviour(TickerBehaviour):
                         #the contract state must be set to contract deployer!
                         "deployer_address": self.context.agent_address,
                         "topics": services,
+                        **strategy.get_fee_kwargs(),
                     }
                 )
             )
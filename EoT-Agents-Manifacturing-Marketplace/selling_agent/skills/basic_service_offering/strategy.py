@@ -2,6 +2,7 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import re
 import uuid
 from typing import Any, Dict, Optional, Tuple, List
 
@@ -14,8 +15,13 @@ from packages.bosch.contracts.service_directory.contract import ServiceDirectory
 DEFAULT_IS_LEDGER_TX = True
 DEFAULT_CONTRACT_ADDRESS = "0x0"
 DEFAULT_DEPLOYER_ADDRESS = "0x0"
+DEFAULT_GAS_MARGIN = 1.2
+DEFAULT_GAS_PRICE = 50
+DEFAULT_MAX_PRIORITY_FEE_PER_GAS = 1
 DEFAULT_SERVICE_1_DATA = {"id": "3D_printing_service", "material_cost": 20, "usage_cost": 10, "machine_cost": 3, "personnel": 4, "cut": 0.1}
 DEFAULT_SERVICE_2_DATA = {"id": "3DX_printing_service", "material_cost": 40, "usage_cost": 20, "machine_cost": 4, "personnel": 5, "cut": 0.1}
+# further services are configured as service_3_data, service_4_data, ...
+SERVICE_DATA_KEY = re.compile(r"^service_(\d+)_data$")
 
 
 class GenericStrategy(Model):
@@ -31,9 +37,22 @@ class GenericStrategy(Model):
         self.contract_id = str(ServiceDirectory.PUBLIC_ID)
         self.contract_address = kwargs.pop("contract_address", DEFAULT_CONTRACT_ADDRESS)
         self.deployer_address = kwargs.pop("deployer_address", DEFAULT_DEPLOYER_ADDRESS)
+        self._gas_margin = kwargs.pop("gas_margin", DEFAULT_GAS_MARGIN)
+        self._gas_price = kwargs.pop("gas_price", DEFAULT_GAS_PRICE)
+        self._max_fee_per_gas = kwargs.pop("max_fee_per_gas", None)
+        self._max_priority_fee_per_gas = kwargs.pop(
+            "max_priority_fee_per_gas", DEFAULT_MAX_PRIORITY_FEE_PER_GAS
+        )
 
         self._service_1_data = kwargs.pop("service_1_data", DEFAULT_SERVICE_1_DATA)
         self._service_2_data = kwargs.pop("service_2_data", DEFAULT_SERVICE_2_DATA)
+        self._services_data = [self._service_1_data, self._service_2_data] + [
+            kwargs.pop(key)
+            for key in sorted(
+                [key for key in kwargs if SERVICE_DATA_KEY.match(key)],
+                key=lambda key: int(SERVICE_DATA_KEY.match(key).group(1)),
+            )
+        ]
 
         super().__init__(**kwargs)
         self._ledger_id = (
@@ -59,9 +78,24 @@ class GenericStrategy(Model):
 
         :return: a dictionary of services
         """
-        self._services = [self._service_1_data["id"], self._service_2_data["id"]]
+        self._services = [service_data["id"] for service_data in self._services_data]
         return self._services
     
+    def get_fee_kwargs(self) -> Dict[str, Any]:
+        """
+        Get the gas and fee arguments of the service directory transactions.
+
+        EIP-1559 fees are used if max_fee_per_gas is configured, the gas price otherwise.
+        The priority fee defaults to 1 gwei, which geth nodes require by default to mine a transaction.
+
+        :return: the keyword arguments for the contract callable
+        """
+        fee_kwargs = {"gas_margin": self._gas_margin, "gas_price": self._gas_price}
+        if self._max_fee_per_gas is not None:
+            fee_kwargs["max_fee_per_gas"] = self._max_fee_per_gas
+            fee_kwargs["max_priority_fee_per_gas"] = self._max_priority_fee_per_gas
+        return fee_kwargs
+
     def get_contract_terms(self) -> Terms:
         """
         Get the contract terms.
@@ -15,10 +15,12 @@ from packages.bosch.skills.fipa_negotiation_selling.dialogues import (
     LedgerApiDialogues,
     ContractApiDialogues,
 )
+from packages.bosch.skills.fipa_negotiation_selling.metrics import TradeMetrics
 from packages.bosch.skills.fipa_negotiation_selling.strategy import GenericStrategy
 
 
 DEFAULT_SERVICES_INTERVAL = 60.0
+DEFAULT_EXPORT_INTERVAL = 10.0
 LEDGER_API_ADDRESS = str(LEDGER_CONNECTION_PUBLIC_ID)
 
 
@@ -99,6 +101,7 @@ class GenericServiceRegistrationBehaviour(TickerBehaviour):
                         "deployer_address": self.context.agent_address,
                         "topics": services,
                         "endpoint": self.context.agent_address,
+                        **strategy.get_fee_kwargs(),
                     }
                 )
             )
@@ -134,6 +137,7 @@ class GenericServiceRegistrationBehaviour(TickerBehaviour):
                         # the contract state must be set to contract deployer!
                         "deployer_address": self.context.agent_address,
                         "topics": services,
+                        **strategy.get_fee_kwargs(),
                     }
                 )
             )
@@ -142,3 +146,33 @@ class GenericServiceRegistrationBehaviour(TickerBehaviour):
             contract_api_dialogue.terms = strategy.get_contract_terms()
             self.context.outbox.put_message(message=contract_api_msg)
             self.context.logger.info("Removing all services from contract...")
+
+
+class MetricsExportBehaviour(TickerBehaviour):
+    """This class periodically exports the trade metrics."""
+
+    def __init__(self, **kwargs: Any):
+        """Initialize the metrics export behaviour."""
+        export_interval = cast(
+            float, kwargs.pop("export_interval", DEFAULT_EXPORT_INTERVAL)
+        )
+        super().__init__(tick_interval=export_interval, **kwargs)
+
+    def setup(self) -> None:
+        """Implement the setup."""
+
+    def act(self) -> None:
+        """
+        Implement the act.
+
+        :return: None
+        """
+        cast(TradeMetrics, self.context.trade_metrics).export()
+
+    def teardown(self) -> None:
+        """
+        Implement the task teardown.
+
+        :return: None
+        """
+        cast(TradeMetrics, self.context.trade_metrics).export()
@@ -252,6 +252,7 @@ class ContractApiDialogue(BaseContractApiDialogue):
             message_class=message_class,
         )
         self._terms = None  # type: Optional[Terms]
+        self._associated_fipa_dialogue = None  # type: Optional[FipaDialogue]
 
     @property
     def terms(self) -> Terms:
@@ -266,6 +267,20 @@ class ContractApiDialogue(BaseContractApiDialogue):
         enforce(self._terms is None, "Terms already set!")
         self._terms = terms
 
+    @property
+    def associated_fipa_dialogue(self) -> Optional[FipaDialogue]:
+        """Get the associated fipa dialogue, set when verifying a batch payment."""
+        return self._associated_fipa_dialogue
+
+    @associated_fipa_dialogue.setter
+    def associated_fipa_dialogue(self, fipa_dialogue: FipaDialogue) -> None:
+        """Set the associated fipa dialogue."""
+        enforce(
+            self._associated_fipa_dialogue is None,
+            "FipaDialogue already set!",
+        )
+        self._associated_fipa_dialogue = fipa_dialogue
+
 
 class ContractApiDialogues(Model, BaseContractApiDialogues):
     """The dialogues class keeps track of all dialogues."""
@@ -29,6 +29,7 @@ from packages.bosch.skills.fipa_negotiation_selling.dialogues import (
     SigningDialogue,
     SigningDialogues,
 )
+from packages.bosch.skills.fipa_negotiation_selling.metrics import TradeMetrics, dialogue_key
 from packages.bosch.skills.fipa_negotiation_selling.strategy import GenericStrategy
 
 
@@ -111,6 +112,8 @@ class GenericFipaHandler(Handler):
             "received CFP from sender={}".format(fipa_msg.sender[-5:])
         )
         strategy = cast(GenericStrategy, self.context.strategy)
+        metrics = cast(TradeMetrics, self.context.trade_metrics)
+        metrics.mark(dialogue_key(fipa_dialogue), "cfp")
         if strategy.is_matching_supply(fipa_msg.query):
             proposal, terms, data_for_sale = strategy.generate_proposal_terms_and_data(
                 fipa_msg.query, fipa_msg.sender
@@ -128,6 +131,7 @@ class GenericFipaHandler(Handler):
                 proposal=proposal,
             )
             self.context.outbox.put_message(message=proposal_msg)
+            metrics.mark(dialogue_key(fipa_dialogue), "propose")
         else:
             self.context.logger.info(
                 "declined the CFP from sender={}".format(fipa_msg.sender[-5:])
@@ -136,6 +140,7 @@ class GenericFipaHandler(Handler):
                 performative=FipaMessage.Performative.DECLINE, target_message=fipa_msg,
             )
             self.context.outbox.put_message(message=decline_msg)
+            metrics.discard(dialogue_key(fipa_dialogue))
 
     def _handle_decline(
         self,
@@ -158,6 +163,9 @@ class GenericFipaHandler(Handler):
         fipa_dialogues.dialogue_stats.add_dialogue_endstate(
             FipaDialogue.EndState.DECLINED_PROPOSE, fipa_dialogue.is_self_initiated
         )
+        cast(TradeMetrics, self.context.trade_metrics).discard(
+            dialogue_key(fipa_dialogue)
+        )
 
     def _handle_accept(
         self, fipa_msg: FipaMessage, fipa_dialogue: FipaDialogue
@@ -174,6 +182,8 @@ class GenericFipaHandler(Handler):
         self.context.logger.info(
             "received ACCEPT from sender={}".format(fipa_msg.sender[-5:])
         )
+        metrics = cast(TradeMetrics, self.context.trade_metrics)
+        metrics.mark(dialogue_key(fipa_dialogue), "accept")
         info = {"address": fipa_dialogue.terms.sender_address}
         match_accept_msg = fipa_dialogue.reply(
             performative=FipaMessage.Performative.MATCH_ACCEPT_W_INFORM,
@@ -186,6 +196,7 @@ class GenericFipaHandler(Handler):
             )
         )
         self.context.outbox.put_message(message=match_accept_msg)
+        metrics.mark(dialogue_key(fipa_dialogue), "match_accept")
 
     def _handle_inform(
         self, fipa_msg: FipaMessage, fipa_dialogue: FipaDialogue
@@ -205,7 +216,16 @@ class GenericFipaHandler(Handler):
         )
 
         strategy = cast(GenericStrategy, self.context.strategy)
-        if strategy.is_ledger_tx and "transaction_digest" in fipa_msg.info.keys():
+        cast(TradeMetrics, self.context.trade_metrics).mark(
+            dialogue_key(fipa_dialogue), "inform_payment"
+        )
+        if (
+            strategy.is_ledger_tx
+            and "transaction_digest" in fipa_msg.info.keys()
+            and "batch_payment" in fipa_msg.info.keys()
+        ):
+            self._request_batch_payment(fipa_msg, fipa_dialogue)
+        elif strategy.is_ledger_tx and "transaction_digest" in fipa_msg.info.keys():
             self.context.logger.info(
                 "checking whether transaction={} has been received ...".format(
                     fipa_msg.info["transaction_digest"]
@@ -237,6 +257,9 @@ class GenericFipaHandler(Handler):
                 info=fipa_dialogue.data_for_sale,
             )
             self.context.outbox.put_message(message=inform_msg)
+            cast(TradeMetrics, self.context.trade_metrics).finish(
+                dialogue_key(fipa_dialogue), "inform"
+            )
             fipa_dialogues = cast(FipaDialogues, self.context.fipa_dialogues)
             fipa_dialogues.dialogue_stats.add_dialogue_endstate(
                 FipaDialogue.EndState.SUCCESSFUL, fipa_dialogue.is_self_initiated
@@ -253,6 +276,56 @@ class GenericFipaHandler(Handler):
                 )
             )
 
+    def _request_batch_payment(
+        self, fipa_msg: FipaMessage, fipa_dialogue: FipaDialogue
+    ) -> None:
+        """
+        Request the payments settled by a batch payment transaction.
+
+        Only batch payments through the configured contract are accepted.
+
+        :param fipa_msg: the message
+        :param fipa_dialogue: the dialogue object
+        :return: None
+        """
+        strategy = cast(GenericStrategy, self.context.strategy)
+        if (
+            strategy.batch_payment_address is None
+            or fipa_msg.info["batch_payment"].lower()
+            != strategy.batch_payment_address.lower()
+        ):
+            self.context.logger.warning(
+                "received batch payment through unknown contract={} from sender={}.".format(
+                    fipa_msg.info["batch_payment"], fipa_msg.sender[-5:]
+                )
+            )
+            return
+        self.context.logger.info(
+            "checking whether batch payment transaction={} has been received ...".format(
+                fipa_msg.info["transaction_digest"]
+            )
+        )
+        contract_api_dialogues = cast(
+            ContractApiDialogues, self.context.contract_api_dialogues
+        )
+        contract_api_msg, contract_api_dialogue = contract_api_dialogues.create(
+            counterparty=LEDGER_API_ADDRESS,
+            performative=ContractApiMessage.Performative.GET_STATE,
+            ledger_id=strategy.ledger_id,
+            contract_id=strategy.batch_payment_id,
+            contract_address=strategy.batch_payment_address,
+            callable="getPayments",
+            kwargs=ContractApiMessage.Kwargs(
+                {
+                    "deployer_address": self.context.agent_address,
+                    "transaction_digest": fipa_msg.info["transaction_digest"],
+                }
+            ),
+        )
+        contract_api_dialogue = cast(ContractApiDialogue, contract_api_dialogue)
+        contract_api_dialogue.associated_fipa_dialogue = fipa_dialogue
+        self.context.outbox.put_message(message=contract_api_msg)
+
     def _handle_invalid(
         self, fipa_msg: FipaMessage, fipa_dialogue: FipaDialogue
     ) -> None:
@@ -360,6 +433,8 @@ class GenericLedgerApiHandler(Handler):
         :param ledger_api_dialogue: the ledger api dialogue
         """
         fipa_dialogue = ledger_api_dialogue.associated_fipa_dialogue
+        metrics = cast(TradeMetrics, self.context.trade_metrics)
+        metrics.mark(dialogue_key(fipa_dialogue), "receipt")
         is_settled = LedgerApis.is_transaction_settled(
             fipa_dialogue.terms.ledger_id, ledger_api_msg.transaction_receipt.receipt
         )
@@ -383,6 +458,7 @@ class GenericLedgerApiHandler(Handler):
                 info=fipa_dialogue.data_for_sale,
             )
             self.context.outbox.put_message(message=inform_msg)
+            metrics.finish(dialogue_key(fipa_dialogue), "inform")
             fipa_dialogues = cast(FipaDialogues, self.context.fipa_dialogues)
             fipa_dialogues.dialogue_stats.add_dialogue_endstate(
                 FipaDialogue.EndState.SUCCESSFUL, fipa_dialogue.is_self_initiated
@@ -393,6 +469,7 @@ class GenericLedgerApiHandler(Handler):
                 )
             )
         else:
+            metrics.discard(dialogue_key(fipa_dialogue))
             self.context.logger.info(
                 "transaction_receipt={} not settled or not valid, aborting".format(
                     ledger_api_msg.transaction_receipt
@@ -466,8 +543,8 @@ class ContractApiHandler(Handler):
             self._handle_raw_transaction(contract_api_msg, contract_api_dialogue)
         elif contract_api_msg.performative == ContractApiMessage.Performative.ERROR:
             self._handle_error(contract_api_msg, contract_api_dialogue)
-        # elif contract_api_msg.performative == ContractApiMessage.Performative.STATE:
-        #    self._handle_state(contract_api_msg, contract_api_dialogue)
+        elif contract_api_msg.performative == ContractApiMessage.Performative.STATE:
+            self._handle_state(contract_api_msg, contract_api_dialogue)
         else:
             self._handle_invalid(contract_api_msg, contract_api_dialogue)
 
@@ -519,6 +596,64 @@ class ContractApiHandler(Handler):
             "proposing the transaction to the decision maker. Waiting for confirmation ..."
         )
 
+    def _handle_state(
+        self,
+        contract_api_msg: ContractApiMessage,
+        contract_api_dialogue: ContractApiDialogue,
+    ) -> None:
+        """
+        Handle a message of state performative, i.e. the payments of a batch payment.
+
+        The data is sent if the batch contains a payment matching the terms of the fipa dialogue.
+
+        :param contract_api_message: the contract api message
+        :param contract_api_dialogue: the contract api dialogue
+        """
+        fipa_dialogue = contract_api_dialogue.associated_fipa_dialogue
+        if fipa_dialogue is None:
+            self.context.logger.warning(
+                "received unexpected state={} in dialogue={}.".format(
+                    contract_api_msg.state.body, contract_api_dialogue
+                )
+            )
+            return
+        metrics = cast(TradeMetrics, self.context.trade_metrics)
+        metrics.mark(dialogue_key(fipa_dialogue), "receipt")
+        state = contract_api_msg.state.body
+        terms = fipa_dialogue.terms
+        is_valid = any(
+            payment["recipient"].lower() == terms.sender_address.lower()
+            and payment["payer"].lower() == terms.counterparty_address.lower()
+            and payment["amount"] == terms.counterparty_payable_amount
+            and payment["reference"] == terms.nonce
+            for payment in state.get("payments", [])
+        )
+        if not (state.get("is_settled", False) and is_valid):
+            metrics.discard(dialogue_key(fipa_dialogue))
+            self.context.logger.info(
+                "batch payment={} not settled or not valid, aborting".format(state)
+            )
+            return
+        last_message = cast(Optional[FipaMessage], fipa_dialogue.last_incoming_message)
+        if last_message is None:
+            raise ValueError("Cannot retrieve last fipa message.")
+        inform_msg = fipa_dialogue.reply(
+            performative=FipaMessage.Performative.INFORM,
+            target_message=last_message,
+            info=fipa_dialogue.data_for_sale,
+        )
+        self.context.outbox.put_message(message=inform_msg)
+        metrics.finish(dialogue_key(fipa_dialogue), "inform")
+        fipa_dialogues = cast(FipaDialogues, self.context.fipa_dialogues)
+        fipa_dialogues.dialogue_stats.add_dialogue_endstate(
+            FipaDialogue.EndState.SUCCESSFUL, fipa_dialogue.is_self_initiated
+        )
+        self.context.logger.info(
+            "batch payment confirmed, sending data={} to buyer={}.".format(
+                fipa_dialogue.data_for_sale, last_message.sender[-5:],
+            )
+        )
+
     def _handle_error(
         self,
         contract_api_msg: ContractApiMessage,
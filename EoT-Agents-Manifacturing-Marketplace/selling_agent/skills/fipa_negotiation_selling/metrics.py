@@ -0,0 +1,262 @@
+# Copyright (c) 2021 - for information on the respective copyright owner see the NOTICE file and/or the repository https://github.com/boschresearch/open-eot-agents.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+This module contains the trade metrics of the skill.
+
+The module is identical in the fipa_negotiation_purchasing and the fipa_negotiation_selling skill, change both.
+The agents are separate projects, so a shared package would be copied into both of them as well, and a skill
+only loads models defined within its own modules.
+"""
+
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from aea.exceptions import enforce
+from aea.protocols.dialogue.base import Dialogue
+from aea.skills.base import Model
+
+
+DEFAULT_MAX_PENDING = 1000
+DEFAULT_EXPORT_PATH = None
+DEFAULT_EXPORT_FORMAT = "prometheus"
+EXPORT_FORMATS = ("prometheus", "json")
+QUANTILES = (0.5, 0.9, 0.99)
+KINDS = ("hop", "trade", "lookup")
+# latencies are recorded in microseconds up to one hour
+UNIT = 1e-6
+MAX_UNITS = 3600 * 10 ** 6
+SUB_BUCKET_BITS = 5
+# the attribute of the log record of a finished trade carrying its steps
+TRADE_EVENT = "trade_event"
+
+
+def dialogue_key(dialogue: Dialogue) -> str:
+    """Get a key of a dialogue which does not change once the counterparty replied."""
+    return dialogue.dialogue_label.dialogue_starter_reference
+
+
+class LatencyHistogram:
+    """
+    A latency histogram with log-linear buckets in the manner of HdrHistogram.
+
+    Each power of two is split into linear sub-buckets, so the memory is bounded by the recorded range
+    and a quantile is off by at most 1/2**(SUB_BUCKET_BITS - 1) of its value.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the histogram."""
+        self._counts = {}  # type: Dict[Tuple[int, int], int]
+        self.count = 0
+        self.sum = 0.0
+        self.min = None  # type: Optional[float]
+        self.max = None  # type: Optional[float]
+
+    def record(self, seconds: float) -> None:
+        """
+        Record a latency.
+
+        :param seconds: the latency in seconds
+        :return: None
+        """
+        units = min(max(int(seconds / UNIT), 0), MAX_UNITS)
+        shift = max(0, units.bit_length() - SUB_BUCKET_BITS)
+        bucket = (shift, units >> shift)
+        self._counts[bucket] = self._counts.get(bucket, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Get a quantile of the recorded latencies.
+
+        :param q: the quantile between 0 and 1
+        :return: the latency in seconds at the middle of its bucket, None if nothing was recorded
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for shift, sub_bucket in sorted(self._counts, key=lambda bucket: bucket[1] << bucket[0]):
+            seen += self._counts[(shift, sub_bucket)]
+            if seen >= rank:
+                lowest = sub_bucket << shift
+                highest = ((sub_bucket + 1) << shift) - 1
+                return min(max((lowest + highest) / 2 * UNIT, self.min), self.max)
+        return self.max
+
+
+class TradeMetrics(Model):
+    """This class timestamps the steps of trades and keeps the latencies between them."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        """
+        Initialize the trade metrics.
+
+        :return: None
+        """
+        self._max_pending = kwargs.pop("max_pending", DEFAULT_MAX_PENDING)
+        self._export_path = kwargs.pop("export_path", DEFAULT_EXPORT_PATH)
+        self._export_format = kwargs.pop("export_format", DEFAULT_EXPORT_FORMAT)
+        super().__init__(**kwargs)
+        enforce(
+            self._export_format in EXPORT_FORMATS,
+            f"Export format has to be one of {EXPORT_FORMATS}.",
+        )
+        # the timestamped steps of every trade in progress
+        self._pending = OrderedDict()  # type: OrderedDict
+        self._started = OrderedDict()  # type: OrderedDict
+        self._histograms = {}  # type: Dict[str, LatencyHistogram]
+
+    @property
+    def is_exporting(self) -> bool:
+        """Check if the metrics are exported."""
+        return self._export_path is not None
+
+    def mark(self, key: str, step: str) -> None:
+        """
+        Timestamp a step of a trade and record the latency since its previous step.
+
+        :param key: the key of the trade, e.g. the starter reference of its fipa dialogue
+        :param step: the name of the step
+        :return: None
+        """
+        now = time.time()
+        steps = self._pending.get(key, None)
+        if steps is None:
+            if len(self._pending) >= self._max_pending:
+                # the oldest trades have most likely been abandoned
+                self._pending.popitem(last=False)
+            self._pending[key] = [(step, now)]
+            return
+        last_step, last_time = steps[-1]
+        self.observe("{}->{}".format(last_step, step), now - last_time)
+        steps.append((step, now))
+
+    def finish(self, key: str, step: str) -> None:
+        """
+        Timestamp the last step of a trade and record the latency since its first step.
+
+        The steps of the trade are logged as structured event, e.g. for load reports.
+
+        :param key: the key of the trade
+        :param step: the name of the last step
+        :return: None
+        """
+        if key not in self._pending:
+            return
+        self.mark(key, step)
+        steps = self._pending.pop(key)
+        (first_step, first_time), (_, last_time) = steps[0], steps[-1]
+        self.observe("{}->{}".format(first_step, step), last_time - first_time, "trade")
+        self.context.logger.info(
+            "trade finished within {:.3f}s".format(last_time - first_time),
+            extra={TRADE_EVENT: {"key": key, "steps": steps}},
+        )
+
+    def discard(self, key: str) -> None:
+        """
+        Forget a trade which did not complete.
+
+        :param key: the key of the trade
+        :return: None
+        """
+        self._pending.pop(key, None)
+
+    def start(self, key: str) -> None:
+        """
+        Start timing a single request, e.g. a contract lookup.
+
+        :param key: the key of the request, e.g. the starter reference of its contract api dialogue
+        :return: None
+        """
+        if len(self._started) >= self._max_pending:
+            self._started.popitem(last=False)
+        self._started[key] = time.time()
+
+    def stop(self, key: str, name: str, kind: str = "lookup") -> None:
+        """
+        Stop timing a single request and record its latency.
+
+        :param key: the key of the request
+        :param name: the name of the request, e.g. the contract callable
+        :param kind: the kind of the request
+        :return: None
+        """
+        started = self._started.pop(key, None)
+        if started is not None:
+            self.observe(name, time.time() - started, kind)
+
+    def observe(self, hop: str, seconds: float, kind: str = "hop") -> None:
+        """
+        Record a latency.
+
+        :param hop: the name of the hop
+        :param seconds: the latency in seconds
+        :param kind: hop for single steps, trade for whole trades, lookup for contract lookups
+        :return: None
+        """
+        name = kind + ":" + hop
+        if name not in self._histograms:
+            self._histograms[name] = LatencyHistogram()
+        self._histograms[name].record(seconds)
+
+    def get_summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get a summary of all latencies.
+
+        :return: count, sum, min, max and quantiles in seconds by histogram name
+        """
+        return {
+            name: {
+                "count": histogram.count,
+                "sum": histogram.sum,
+                "min": histogram.min,
+                "max": histogram.max,
+                "quantiles": {str(q): histogram.quantile(q) for q in QUANTILES},
+            }
+            for name, histogram in sorted(self._histograms.items())
+        }
+
+    def export(self) -> None:
+        """
+        Write the summary to the export path.
+
+        The file is replaced atomically, so it can be picked up by the textfile collector of the Prometheus node exporter.
+
+        :return: None
+        """
+        if self._export_path is None:
+            return
+        if self._export_format == "json":
+            content = json.dumps(self.get_summary(), indent=2)
+        else:
+            content = self._to_prometheus()
+        tmp_path = self._export_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            file.write(content)
+        os.replace(tmp_path, self._export_path)
+
+    def _to_prometheus(self) -> str:
+        """Format the summary in the Prometheus text format."""
+        lines = []  # type: List[str]
+        agent = self.context.agent_name
+        for kind in KINDS:
+            metric = f"fipa_{kind}_latency_seconds"
+            lines.append(f"# HELP {metric} Latency of {kind}s of the fipa negotiation.")
+            lines.append(f"# TYPE {metric} summary")
+            for name, summary in self.get_summary().items():
+                if not name.startswith(kind + ":"):
+                    continue
+                labels = 'agent="{}",{}="{}"'.format(agent, kind, name[len(kind) + 1:])
+                for q, value in summary["quantiles"].items():
+                    lines.append(f'{metric}{{{labels},quantile="{q}"}} {value}')
+                lines.append(f"{metric}_sum{{{labels}}} {summary['sum']}")
+                lines.append(f"{metric}_count{{{labels}}} {summary['count']}")
+        return "\n".join(lines) + "\n"
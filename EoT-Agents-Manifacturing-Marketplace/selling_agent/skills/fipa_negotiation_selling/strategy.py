@@ -2,8 +2,9 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import re
 import uuid
-from typing import Any, Dict, Optional, Tuple, List
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from aea.common import Address
 from aea.crypto.ledger_apis import LedgerApis
@@ -11,19 +12,35 @@ from aea.exceptions import enforce
 from aea.helpers.search.generic import (
     SIMPLE_SERVICE_MODEL,
 )
-from aea.helpers.search.models import Description, Location, Query
+from aea.helpers.search.models import (
+    And,
+    Constraint,
+    ConstraintExpr,
+    ConstraintTypes,
+    Description,
+    Location,
+    Or,
+    Query,
+)
 from aea.helpers.transaction.base import Terms
 from aea.skills.base import Model
+from packages.bosch.contracts.batch_payment.contract import BatchPayment
 from packages.bosch.contracts.service_directory.contract import ServiceDirectory
 
 DEFAULT_IS_LEDGER_TX = True
 DEFAULT_CONTRACT_ADDRESS = "0x0"
 DEFAULT_DEPLOYER_ADDRESS = "0x0"
+DEFAULT_BATCH_PAYMENT_ADDRESS = None
+DEFAULT_GAS_MARGIN = 1.2
+DEFAULT_GAS_PRICE = 50
+DEFAULT_MAX_PRIORITY_FEE_PER_GAS = 1
 
 DEFAULT_SERVICE_1_DATA = {"id": "3D_printing_service", "material_cost": 30, "usage_cost": 20, "machine_cost": 10, "personnel": 4, "cut": 0.1, 
     "service_query": {"key": "seller_service", "value": "3D_printing_service"}, "data_for_sale": {"printing": "3D"}}
 DEFAULT_SERVICE_2_DATA = {"id": "3DX_printing_service", "material_cost": 40, "usage_cost": 30, "machine_cost": 20, "personnel": 5, "cut": 0.1,
     "service_query": {"key": "seller_service", "value": "3DX_printing_service"}, "data_for_sale": {"printing": "3DX"}}
+# further services are configured as service_3_data, service_4_data, ...
+SERVICE_DATA_KEY = re.compile(r"^service_(\d+)_data$")
 
 
 
@@ -40,20 +57,58 @@ class GenericStrategy(Model):
         self.contract_id = str(ServiceDirectory.PUBLIC_ID)
         self.contract_address = kwargs.pop("contract_address", DEFAULT_CONTRACT_ADDRESS)
         self.deployer_address = kwargs.pop("deployer_address", DEFAULT_DEPLOYER_ADDRESS)
+        self.batch_payment_id = str(BatchPayment.PUBLIC_ID)
+        self.batch_payment_address = kwargs.pop(
+            "batch_payment_address", DEFAULT_BATCH_PAYMENT_ADDRESS
+        )
+        self._gas_margin = kwargs.pop("gas_margin", DEFAULT_GAS_MARGIN)
+        self._gas_price = kwargs.pop("gas_price", DEFAULT_GAS_PRICE)
+        self._max_fee_per_gas = kwargs.pop("max_fee_per_gas", None)
+        self._max_priority_fee_per_gas = kwargs.pop(
+            "max_priority_fee_per_gas", DEFAULT_MAX_PRIORITY_FEE_PER_GAS
+        )
         currency_id = kwargs.pop("currency_id", None)
 
         #Note: selling agent strategy extended to offer more than one service 
         #see skills.yaml on how to add more services to this agent!
-        #for now only one service _service_1_data is considered.
         self._service_1_data = kwargs.pop("service_1_data", DEFAULT_SERVICE_1_DATA)
         self._service_2_data = kwargs.pop("service_2_data", DEFAULT_SERVICE_2_DATA)
+        services_data = [self._service_1_data, self._service_2_data] + [
+            kwargs.pop(key)
+            for key in sorted(
+                [key for key in kwargs if SERVICE_DATA_KEY.match(key)],
+                key=lambda key: int(SERVICE_DATA_KEY.match(key).group(1)),
+            )
+        ]
+
+        # the descriptions and prices of the services do not change, so they are computed once.
+        # The offers are indexed by the attribute and by the key and value of their service query,
+        # which narrows the candidates of a query before its constraints are checked.
+        self._offers = {}  # type: Dict[str, Dict[str, Any]]
+        self._offers_by_attribute = {}  # type: Dict[str, Set[str]]
+        self._offers_by_value = {}  # type: Dict[Tuple[str, Any], Set[str]]
+        for service_data in services_data:
+            service_id = service_data["id"]
+            enforce(service_id not in self._offers, f"Service {service_id} is configured twice.")
+            service_query = service_data["service_query"]
+            sale_quantity = len(service_data["data_for_sale"])
+            self._offers[service_id] = {
+                "service_data": service_data,
+                "description": Description(
+                    {service_query["key"]: service_query["value"]},
+                    data_model=SIMPLE_SERVICE_MODEL,
+                ),
+                "quantity": sale_quantity,
+                "price": sale_quantity
+                * service_data["material_cost"]
+                * service_data["usage_cost"]
+                * service_data["machine_cost"],
+            }
+            self._offers_by_attribute.setdefault(service_query["key"], set()).add(service_id)
+            self._offers_by_value.setdefault(
+                (service_query["key"], service_query["value"]), set()
+            ).add(service_id)
 
-        #TODO: extend this to get the service description of more than one service!
-        #for now only one service _service_1_data is considered.
-        self._simple_service_data = {
-            self._service_1_data["service_query"]["key"]: self._service_1_data["service_query"]["value"]
-        }
-    
         super().__init__(**kwargs)
         self._ledger_id = (
             ledger_id if ledger_id is not None else self.context.default_ledger_id
@@ -86,9 +141,24 @@ class GenericStrategy(Model):
 
         :return: a dictionary of services
         """
-        self._services = [self._service_1_data["id"], self._service_2_data["id"]]
+        self._services = list(self._offers.keys())
         return self._services
     
+    def get_fee_kwargs(self) -> Dict[str, Any]:
+        """
+        Get the gas and fee arguments of the service directory transactions.
+
+        EIP-1559 fees are used if max_fee_per_gas is configured, the gas price otherwise.
+        The priority fee defaults to 1 gwei, which geth nodes require by default to mine a transaction.
+
+        :return: the keyword arguments for the contract callable
+        """
+        fee_kwargs = {"gas_margin": self._gas_margin, "gas_price": self._gas_price}
+        if self._max_fee_per_gas is not None:
+            fee_kwargs["max_fee_per_gas"] = self._max_fee_per_gas
+            fee_kwargs["max_priority_fee_per_gas"] = self._max_priority_fee_per_gas
+        return fee_kwargs
+
     def get_contract_terms(self) -> Terms:
         """
         Get the contract terms.
@@ -115,20 +185,92 @@ class GenericStrategy(Model):
         :param query: the query
         :return: bool indicating whether matches or not
         """
-        return query.check(self.get_service_description())
-    
-    def get_service_description(self) -> Description:
+        return self._get_offer(query) is not None
+
+    def get_service_description(self, service_id: Optional[str] = None) -> Description:
         """
         Get the simple service description.
 
-        :return: a description of the offered services
+        :param service_id: the id of the service, defaults to service_1
+        :return: a description of the offered service
         """
-        #TODO: extend this to check if incoming service query matches 
-        #one of the descriptions of the services offered by the selling agent!
-        description = Description(
-             self._simple_service_data, data_model=SIMPLE_SERVICE_MODEL,
-        )
-        return description
+        if service_id is None:
+            service_id = self._service_1_data["id"]
+        enforce(service_id in self._offers, f"Service {service_id} is not offered.")
+        return self._offers[service_id]["description"]
+
+    def _get_candidates(self, constraint: ConstraintExpr) -> Optional[Set[str]]:
+        """
+        Get the services which can satisfy a constraint by their indexed attributes.
+
+        :param constraint: the constraint
+        :return: the ids of the candidate services, None if the constraint cannot be narrowed by the index
+        """
+        if isinstance(constraint, Constraint):
+            if constraint.constraint_type.type == ConstraintTypes.EQUAL:
+                try:
+                    return self._offers_by_value.get(
+                        (constraint.attribute_name, constraint.constraint_type.value), set()
+                    )
+                except TypeError:
+                    # the value is not hashable, so it is not the value of any service query
+                    return set()
+            return self._offers_by_attribute.get(constraint.attribute_name, set())
+        if isinstance(constraint, And):
+            return self._intersect_candidates(constraint.constraints)
+        if isinstance(constraint, Or):
+            candidates = set()  # type: Set[str]
+            for sub_constraint in constraint.constraints:
+                sub_candidates = self._get_candidates(sub_constraint)
+                if sub_candidates is None:
+                    return None
+                candidates |= sub_candidates
+            return candidates
+        # negations may be satisfied by services without the attribute
+        return None
+
+    def _intersect_candidates(self, constraints: List[ConstraintExpr]) -> Optional[Set[str]]:
+        """
+        Get the services which can satisfy all of the constraints.
+
+        :param constraints: the constraints
+        :return: the ids of the candidate services, None if none of the constraints narrows them
+        """
+        candidates = None  # type: Optional[Set[str]]
+        for constraint in constraints:
+            sub_candidates = self._get_candidates(constraint)
+            if sub_candidates is not None:
+                candidates = (
+                    set(sub_candidates) if candidates is None else candidates & sub_candidates
+                )
+            if candidates is not None and len(candidates) == 0:
+                break
+        return candidates
+
+    def _get_offer(self, query: Query) -> Optional[Dict[str, Any]]:
+        """
+        Get the best offer of the services matching the query.
+
+        The index narrows the candidate services, only these are checked against the full query.
+        Of several matching services, the one with the lowest price is offered.
+
+        :param query: the query
+        :return: the offer, None if no service matches
+        """
+        candidates = self._intersect_candidates(query.constraints)
+        if candidates is None:
+            candidates = set(self._offers.keys())
+        best_offer = None  # type: Optional[Dict[str, Any]]
+        for service_id in candidates:
+            offer = self._offers[service_id]
+            if not query.check(offer["description"]):
+                continue
+            if best_offer is None or (offer["price"], service_id) < (
+                best_offer["price"],
+                best_offer["service_data"]["id"],
+            ):
+                best_offer = offer
+        return best_offer
 
     def generate_proposal_terms_and_data(  # pylint: disable=unused-argument
         self, query: Query, counterparty_address: Address
@@ -138,12 +280,15 @@ class GenericStrategy(Model):
 
         :param query: the query
         :param counterparty_address: the counterparty of the proposal.
-        :return: a tuple of proposal, terms and the weather data
+        :return: a tuple of proposal, terms and the data of the matching service
         """
-        data_for_sale = self._service_1_data["data_for_sale"]
-        sale_quantity = len(data_for_sale)
+        offer = self._get_offer(query)
+        enforce(offer is not None, "Query does not match any of the offered services.")
+        service_data = offer["service_data"]
+        data_for_sale = service_data["data_for_sale"]
+        sale_quantity = offer["quantity"]
+        total_price = offer["price"]
         seller_address = self.context.agent_addresses[self.ledger_id]
-        total_price = sale_quantity * self._service_1_data["material_cost"] * self._service_1_data["usage_cost"] * self._service_1_data["machine_cost"]
         if self.is_ledger_tx:
             tx_nonce = LedgerApis.generate_tx_nonce(
                 identifier=self.ledger_id,
@@ -157,7 +302,7 @@ class GenericStrategy(Model):
                 "ledger_id": self.ledger_id,
                 "price": total_price,
                 "currency_id": self._currency_id,
-                "service_id": self._service_1_data["id"],
+                "service_id": service_data["id"],
                 "quantity": sale_quantity,
                 "tx_nonce": tx_nonce,
             }
@@ -167,7 +312,7 @@ class GenericStrategy(Model):
             sender_address=seller_address,
             counterparty_address=counterparty_address,
             amount_by_currency_id={self._currency_id: total_price},
-            quantities_by_good_id={self._service_1_data["id"]: -sale_quantity},
+            quantities_by_good_id={service_data["id"]: -sale_quantity},
             is_sender_payable_tx_fee=False,
             nonce=tx_nonce,
             fee_by_currency_id={self._currency_id: 0},
@@ -4,13 +4,10 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import asyncio
-import asyncstdlib
-import aiostream
 import betterproto
 import logging
 import janus
-from threading import Event
-from typing import cast, List, AsyncIterator
+from typing import cast, Dict, List, Optional, Tuple, Union
 from grpclib.client import Channel
 
 from aea.mail.base import Envelope
@@ -23,33 +20,6 @@ from packages.bosch.protocols.perun_grpc.grpc_message import (
 from packages.bosch.protocols.perun_grpc.message import PerunGrpcMessage
 
 
-class EventIterator(AsyncIterator):
-    # constructor, define some state
-
-    def __init__(self, event: asyncio.Event):
-        self._event = event
-
-    # create an instance of the iterator
-    def __aiter__(self):
-        return self
-
-    # return the next awaitable
-    # TODO: Update with proper impl regarding exceptions
-    async def __anext__(self):
-        await asyncio.sleep(3)
-        if not self._event.is_set():
-            return False
-        else:
-            return True
-
-    async def __aexit__(self):
-        try:
-            pass
-            print("Exit from the Context Manager...")
-        finally:
-            print("This line is not executed")
-
-
 class ChannelProposalListener():
 
     def __init__(
@@ -62,53 +32,53 @@ class ChannelProposalListener():
         self._dialogues = dialogues
         self._counterparty = counterparty
         self._agent_name = agent_name
-        self._shutdown = Event()
+        self._is_shutdown = False
+
+    @property
+    def key(self) -> Tuple[str, Optional[str]]:
+        return (self._session_id, None)
 
-    def run(self):
+    async def run(self):
         self._logger.debug(
-            "[{}] Starting handle_sub_pay_ch_proposals in own ChannelProposalListener for session_id {}".format(
+            "[{}] Starting handle_sub_pay_ch_proposals in ChannelProposalListener for session_id {}".format(
                 self._agent_name, self._session_id))
-        asyncio.run(self.handle_sub_pay_ch_proposals())
+        await self.handle_sub_pay_ch_proposals()
 
     async def shutdown(self) -> None:
-        if not self._shutdown.is_set():
+        if not self._is_shutdown:
             self._logger.debug(
                 "[{}] Shutdown called for ChannelProposalListener for session id {}".format(
                     self._agent_name, self._session_id))
-            self._shutdown.set()
+            # the stream is left after the current item, the registry cancels the task while it waits for the next one
+            self._is_shutdown = True
 
     async def handle_sub_pay_ch_proposals(self) -> None:
         self._logger.info("[{}] Start listening to channel proposals for session {}".format(
             self._agent_name, self._session_id))
         try:
             req = SubPayChProposalsReq(self._session_id)
-            iter = EventIterator(self._shutdown)
-            proposal = self._payment_api_stub.sub_pay_ch_proposals(req)
-            async with aiostream.stream.merge(iter, proposal).stream() as streamer:
-                async for stream_proposal in streamer:
-                    # check if shutdown is set and end task
-                    if self._shutdown.is_set():
-                        break
-                    elif not stream_proposal is False:
-                        self._logger.info("[{}] Got proposal for session_id {} from stream: {}".format(
-                            self._agent_name, self._session_id, stream_proposal))
-                        proposal = cast(SubPayChProposalsResp, stream_proposal)
-                        message, dialogue = self._dialogues.create(
-                            counterparty=self._counterparty, performative=PerunGrpcMessage.Performative.PAYCHRESP,
-                            session_id=self._session_id, type=proposal.__class__.__name__, content=bytes(proposal))
-                        envelope = Envelope(to=message.to, sender=message.sender, message=message)
-                        self._logger.debug("[{}] handle_sub_pay_ch_proposals is sending {}".format(
-                            self._agent_name, envelope))
-                        await self._in_queue.async_q.put(envelope)
-                        # check for error
-                        if betterproto.which_one_of(proposal, "response")[0] == "error":
-                            # Incorrect session ID is 201
-                            # Subscription already exists is 202
-                            if proposal.error.code == ErrorCode.ErrResourceNotFound or proposal.error.code == ErrorCode.ErrResourceExists:
-                                # -> end listener
-                                self._logger.error("[{}] Retrieved error {} {}. Ending listener for given session_id {}".format(
-                                    self._agent_name, proposal.error.code, proposal.error.message, self._session_id))
-                                await self.shutdown()
+            async for stream_proposal in self._payment_api_stub.sub_pay_ch_proposals(req):
+                self._logger.info("[{}] Got proposal for session_id {} from stream: {}".format(
+                    self._agent_name, self._session_id, stream_proposal))
+                proposal = cast(SubPayChProposalsResp, stream_proposal)
+                message, dialogue = self._dialogues.create(
+                    counterparty=self._counterparty, performative=PerunGrpcMessage.Performative.PAYCHRESP,
+                    session_id=self._session_id, type=proposal.__class__.__name__, content=bytes(proposal))
+                envelope = Envelope(to=message.to, sender=message.sender, message=message)
+                self._logger.debug("[{}] handle_sub_pay_ch_proposals is sending {}".format(
+                    self._agent_name, envelope))
+                await self._in_queue.async_q.put(envelope)
+                # check for error
+                if betterproto.which_one_of(proposal, "response")[0] == "error":
+                    # Incorrect session ID is 201
+                    # Subscription already exists is 202
+                    if proposal.error.code == ErrorCode.ErrResourceNotFound or proposal.error.code == ErrorCode.ErrResourceExists:
+                        # -> end listener
+                        self._logger.error("[{}] Retrieved error {} {}. Ending listener for given session_id {}".format(
+                            self._agent_name, proposal.error.code, proposal.error.message, self._session_id))
+                        await self.shutdown()
+                if self._is_shutdown:
+                    break
         except Exception as e:
             self._logger.error("[{}] {}".format(self._agent_name, e))
         finally:
@@ -129,20 +99,25 @@ class ChannelUpdateListener():
         self._dialogues = dialogues
         self._counterparty = counterparty
         self._agent_name = agent_name
-        self._shutdown = Event()
+        self._is_shutdown = False
 
-    def run(self):
+    @property
+    def key(self) -> Tuple[str, Optional[str]]:
+        return (self.session_id, self.channel_id)
+
+    async def run(self):
         self._logger.debug(
-            "[{}] Starting handle_sub_pay_ch_updates in own ChannelUpdateListener for session_id {} and channel id {}".format(
+            "[{}] Starting handle_sub_pay_ch_updates in ChannelUpdateListener for session_id {} and channel id {}".format(
                 self._agent_name, self.session_id, self.channel_id))
-        asyncio.run(self.handle_sub_pay_ch_updates())
+        await self.handle_sub_pay_ch_updates()
 
     async def shutdown(self) -> None:
-        if not self._shutdown.is_set():
+        if not self._is_shutdown:
             self._logger.debug(
                 "[{}] Shutdown called for ChannelUpdateListener for session id {} and channel id {}".format(
                     self._agent_name, self.session_id, self.channel_id))
-            self._shutdown.set()
+            # the stream is left after the current item, the registry cancels the task while it waits for the next one
+            self._is_shutdown = True
 
     async def handle_sub_pay_ch_updates(self) -> None:
         try:
@@ -150,46 +125,99 @@ class ChannelUpdateListener():
                 "[{}] Start listening to channel updates for session {} and channel_id {}".format(
                     self._agent_name, self.session_id, self.channel_id))
             req = SubpayChUpdatesReq(self.session_id, self.channel_id)
-            iter = EventIterator(self._shutdown)
-            ch_upd_resp = self._payment_api_stub.sub_pay_ch_updates(req)
-            # merging shutdown and response stream to be able to end loop by setting shutdown event
-            async with aiostream.stream.merge(iter, ch_upd_resp).stream() as streamer:
-                async for stream_update in streamer:
-                    # check if shutdown is set and end task
-                    if self._shutdown.is_set():
-                        break
-                    elif not stream_update is False:
-                        self._logger.info("[{}] Got channel update for session_id {} and channel_id {}: {}".format(
-                            self._agent_name, self.session_id, self.channel_id, stream_update))
-                        update = cast(SubPayChUpdatesResp, stream_update)
-                        message, dialogue = self._dialogues.create(
-                            counterparty=self._counterparty, performative=PerunGrpcMessage.Performative.PAYCHRESP,
-                            session_id=self.session_id, type=update.__class__.__name__,
-                            content=bytes(update))
-                        envelope = Envelope(to=message.to, sender=message.sender, message=message)
-                        self._logger.debug("[{}] handle_sub_pay_ch_updates is sending {}".format(
-                            self._agent_name, envelope))
-                        await self._in_queue.async_q.put(envelope)
-                        # check for error and handle it
-                        if betterproto.which_one_of(update, "response")[0] == "error":
-                            # 201 ResourceType: "session" when session ID is not known.
-                            # 201 ResourceType: "channel" when channel ID is not known.
-                            # 202 ResourceType: "updatesSub" when a subscription already exists.
-                            # listener can be closed by using break
-                            if update.error.code == ErrorCode.ErrResourceNotFound or \
-                                    update.error.code == ErrorCode.ErrResourceExists:
-                                self._logger.error(
-                                    "[{}] Retrieved error {} in channel update for session id {} and channel {}, ending listener.".format(
-                                        self._agent_name, update.error.code, self.session_id, self.channel_id))
-                                await self.shutdown()
-                        else:
-                            # no error, so check for closed state and then close listener by using break
-                            if update.notify.type != None and update.notify.type == SubPayChUpdatesRespNotifyChUpdateType.closed:
-                                self._logger.info(
-                                    "[{}] Retrieved closed, stop listener for session id {} and channel {}".format(
-                                        self._agent_name, self.session_id, self.channel_id))
-                                await self.shutdown()
+            async for stream_update in self._payment_api_stub.sub_pay_ch_updates(req):
+                self._logger.info("[{}] Got channel update for session_id {} and channel_id {}: {}".format(
+                    self._agent_name, self.session_id, self.channel_id, stream_update))
+                update = cast(SubPayChUpdatesResp, stream_update)
+                message, dialogue = self._dialogues.create(
+                    counterparty=self._counterparty, performative=PerunGrpcMessage.Performative.PAYCHRESP,
+                    session_id=self.session_id, type=update.__class__.__name__,
+                    content=bytes(update))
+                envelope = Envelope(to=message.to, sender=message.sender, message=message)
+                self._logger.debug("[{}] handle_sub_pay_ch_updates is sending {}".format(
+                    self._agent_name, envelope))
+                await self._in_queue.async_q.put(envelope)
+                # check for error and handle it
+                if betterproto.which_one_of(update, "response")[0] == "error":
+                    # 201 ResourceType: "session" when session ID is not known.
+                    # 201 ResourceType: "channel" when channel ID is not known.
+                    # 202 ResourceType: "updatesSub" when a subscription already exists.
+                    if update.error.code == ErrorCode.ErrResourceNotFound or \
+                            update.error.code == ErrorCode.ErrResourceExists:
+                        self._logger.error(
+                            "[{}] Retrieved error {} in channel update for session id {} and channel {}, ending listener.".format(
+                                self._agent_name, update.error.code, self.session_id, self.channel_id))
+                        await self.shutdown()
+                else:
+                    # no error, so check for closed state and then end the listener
+                    if update.notify.type != None and update.notify.type == SubPayChUpdatesRespNotifyChUpdateType.closed:
+                        self._logger.info(
+                            "[{}] Retrieved closed, stop listener for session id {} and channel {}".format(
+                                self._agent_name, self.session_id, self.channel_id))
+                        await self.shutdown()
+                if self._is_shutdown:
+                    break
         finally:
             self._logger.info(
                 "[{}] Ended listening to channel updates for session {} and channel {}".format(
                     self._agent_name, self.session_id, self.channel_id))
+
+
+Listener = Union[ChannelProposalListener, ChannelUpdateListener]
+
+
+class ListenerRegistry():
+    """
+    Run the subscription listeners as tasks on the event loop of the connection.
+
+    The listeners are registered by session id and channel id, the channel id of the proposal listener
+    of a session is None. All streams share the one loop, so the number of threads does not grow with
+    the number of open channels.
+    """
+
+    def __init__(self, agent_name: str):
+        self._logger = logging.getLogger(__name__)
+        self._agent_name = agent_name
+        self._listeners: Dict[Tuple[str, Optional[str]], Tuple[Listener, asyncio.Task]] = {}
+
+    def __len__(self) -> int:
+        return len(self._listeners)
+
+    def start(self, listener: Listener) -> None:
+        """Start a listener as task on the running event loop, unless one is registered for its key already."""
+        key = listener.key
+        if key in self._listeners:
+            self._logger.warning("[{}] Listener for session {} and channel {} is already running.".format(
+                self._agent_name, key[0], key[1]))
+            return
+        task = asyncio.get_event_loop().create_task(listener.run())
+        self._listeners[key] = (listener, task)
+        task.add_done_callback(lambda _: self._remove(key, task))
+        self._logger.debug("[{}] Listener for session {} and channel {} started, {} listeners running.".format(
+            self._agent_name, key[0], key[1], len(self._listeners)))
+
+    def _remove(self, key: Tuple[str, Optional[str]], task: asyncio.Task) -> None:
+        # a listener ends by itself on errors or once its channel is closed
+        registered = self._listeners.get(key)
+        if registered is not None and registered[1] is task:
+            del self._listeners[key]
+
+    async def stop(self, session_id: str, channel_id: Optional[str] = None) -> None:
+        """Stop the listener of a session and channel, the proposal listener of the session if no channel id is given."""
+        registered = self._listeners.get((session_id, channel_id))
+        if registered is not None:
+            await self._stop([registered])
+
+    async def stop_all(self) -> None:
+        await self._stop(list(self._listeners.values()))
+
+    async def _stop(self, registered: List[Tuple[Listener, asyncio.Task]]) -> None:
+        # cancelling the tasks ends their streams right away, wait until they are unwound
+        tasks = []
+        for listener, task in registered:
+            await listener.shutdown()
+            if task is not asyncio.current_task():
+                task.cancel()
+                tasks.append(task)
+        if len(tasks) > 0:
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -3,7 +3,6 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
-from concurrent.futures import Future, ThreadPoolExecutor
 import logging
 import janus
 from typing import Any, Optional, cast
@@ -15,6 +14,7 @@ from aea.connections.base import Connection, ConnectionStates
 from aea.mail.base import Envelope, Message
 from aea.protocols.dialogue.base import Dialogue as BaseDialogue
 
+from packages.bosch.connections.perun_node.channel import ListenerRegistry
 from packages.bosch.connections.perun_node.id_provider import DefaultIdProvider
 from packages.bosch.connections.perun_node.session import PerunSession
 from packages.bosch.protocols.perun_grpc.dialogues import PerunGrpcDialogue, PerunGrpcDialogues
@@ -78,8 +78,7 @@ class PerunNodeConnection(Connection):
         self._in_queue: janus.Queue[Envelope] = None
         self._dialogues = PerunNodeDialogues()
         self._perun_session = None
-        self._executor = None
-        self._threads = None
+        self._listeners = None
 
     async def connect(self) -> None:
         """
@@ -97,10 +96,10 @@ class PerunNodeConnection(Connection):
             self._payment_api_stub = PaymentApiStub(channel=self._channel)
             self.state = ConnectionStates.connected
             self._in_queue = janus.Queue()
-            self._executor = ThreadPoolExecutor()
-            self._threads = []
+            # all subscription streams run as tasks on the event loop of the connection
+            self._listeners = ListenerRegistry(self._identity.name)
             self._perun_session = PerunSession(self._payment_api_stub, self._in_queue,
-                                               self._executor, self._threads, self._identity.name)
+                                               self._listeners, self._identity.name)
             self._perun_id_provider = DefaultIdProvider(self._payment_api_stub, self._in_queue, self._identity.name)
             self.state = ConnectionStates.connected
             self.logger.info("[{}] Node connected to {}:{}".format(self._identity.name, self.host, self.port))
@@ -118,9 +117,7 @@ class PerunNodeConnection(Connection):
             if self._channel == None:
                 raise ValueError("[{}] Channel is not set or already closed!".format(self._identity.name))
             self.state = ConnectionStates.disconnecting
-            self._executor.shutdown(wait=False)
-            for thread in self._threads:
-                await thread.shutdown()
+            await self._listeners.stop_all()
             self._channel.close()
             self._in_queue.close()
             await self._in_queue.wait_closed()
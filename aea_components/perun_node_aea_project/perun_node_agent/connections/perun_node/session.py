@@ -4,14 +4,14 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
-from concurrent.futures import ThreadPoolExecutor
 import logging
 import betterproto
 import janus
-from typing import cast, Optional, List
+from typing import cast, Optional
 
 from aea.mail.base import Envelope
-from packages.bosch.connections.perun_node.channel import ChannelProposalListener, ChannelUpdateListener
+from packages.bosch.connections.perun_node.channel import (
+    ChannelProposalListener, ChannelUpdateListener, ListenerRegistry)
 from packages.bosch.protocols.perun_grpc.dialogues import PerunGrpcDialogue, PerunGrpcDialogues
 
 from packages.bosch.protocols.perun_grpc.grpc_message import (
@@ -24,12 +24,11 @@ class PerunSession():
 
     def __init__(
             self, payment_api_stub: PaymentApiStub, in_queue: janus.Queue[Envelope],
-            thread_pool: ThreadPoolExecutor, threads: List, agent_name: str) -> None:
+            listeners: ListenerRegistry, agent_name: str) -> None:
         self._logger = logging.getLogger(__name__)
         self._payment_api_stub = payment_api_stub
         self._in_queue = in_queue
-        self._thread_pool = thread_pool
-        self._threads = threads
+        self._listeners = listeners
         self._agent_name = agent_name
 
     async def open_session(self, message: PerunGrpcMessage, dialogue: PerunGrpcDialogue, dialogues: PerunGrpcDialogues) -> None:
@@ -53,14 +52,12 @@ class PerunSession():
             # register and start listener for channel proposals in case of no error
             if betterproto.which_one_of(resp, "response")[1].__class__.__name__ == 'OpenSessionRespMsgSuccess':
                 osr = cast(OpenSessionRespMsgSuccess, betterproto.which_one_of(resp, "response")[1])
-                thread = ChannelProposalListener(
+                listener = ChannelProposalListener(
                     payment_api_stub=self._payment_api_stub, in_queue=self._in_queue, session_id=osr.session_id,
                     counterparty=resMess.to, dialogues=dialogues, agent_name=self._agent_name)
-                # thread.start()
-                future = self._thread_pool.submit(thread.run)
-                self._threads.append(thread)
+                self._listeners.start(listener)
                 self._logger.debug(
-                    "[{}] Thread ChannelProposalListener started for session_id {}".format(
+                    "[{}] ChannelProposalListener started for session_id {}".format(
                         self._agent_name, osr.session_id))
             if self._in_queue is not None:
                 await self._in_queue.async_q.put(envelope)
@@ -101,12 +98,10 @@ class PerunSession():
             envelope = Envelope(to=resMess.to, sender=resMess.sender, message=resMess)
             if betterproto.which_one_of(response, "response")[0] == "msg_success" and status:
                 # Open channel listener in case of successfull accept
-                thread = ChannelUpdateListener(
+                listener = ChannelUpdateListener(
                     payment_api_stub=self._payment_api_stub, in_queue=self._in_queue, session_id=last_message.session_id,
                     counterparty=resMess.to, agent_name=self._agent_name, channel_id=response.msg_success.opened_pay_ch_info.ch_id, dialogues=dialogues)
-                # thread.start()
-                future = self._thread_pool.submit(thread.run)
-                self._threads.append(thread)
+                self._listeners.start(listener)
             if self._in_queue is not None:
                 self._logger.debug("[{}] sending respond_pay_ch_proposal {}".format(self._agent_name, envelope))
                 await self._in_queue.async_q.put(envelope)
@@ -150,12 +145,11 @@ class PerunSession():
                 envelope = Envelope(to=resMess.to, sender=resMess.sender, message=resMess)
                 if betterproto.which_one_of(response, "response")[0] == "msg_success":
                     # Open channel listener in case of successfull request
-                    thread = ChannelUpdateListener(
+                    listener = ChannelUpdateListener(
                         payment_api_stub=self._payment_api_stub, in_queue=self._in_queue, session_id=req.session_id,
                         counterparty=resMess.to, agent_name=self._agent_name,
                         channel_id=response.msg_success.opened_pay_ch_info.ch_id, dialogues=dialogues)
-                    future = self._thread_pool.submit(thread.run)
-                    self._threads.append(thread)
+                    self._listeners.start(listener)
                 if self._in_queue is not None:
                     await self._in_queue.async_q.put(envelope)
         except Exception as error:
@@ -175,12 +169,10 @@ class PerunSession():
                 envelope = Envelope(to=resMess.to, sender=resMess.sender, message=resMess)
                 if betterproto.which_one_of(response, "response")[0] == "msg_success":
                     # Close channel listener in case of successfull request
-                    for thread in self._threads:
-                        if thread.session_id == req.session_id and thread.channel_id == req.ch_id:
-                            self._logger.debug(
-                                "[{}] Shutdown of ChannelUpdateListener for session {} and channel {}".format(
-                                    self._agent_name, req.session_id, req.ch_id))
-                            await thread.shutdown()
+                    self._logger.debug(
+                        "[{}] Shutdown of ChannelUpdateListener for session {} and channel {}".format(
+                            self._agent_name, req.session_id, req.ch_id))
+                    await self._listeners.stop(req.session_id, req.ch_id)
                 if self._in_queue is not None:
                     await self._in_queue.async_q.put(envelope)
         except Exception as error:
@@ -0,0 +1,186 @@
+# Copyright (c) 2022 - for information on the respective copyright owner see the NOTICE file and/or the repository https://github.com/boschresearch/open-eot-agents.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""This module contains the exact balances of the payment channels."""
+
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+from packages.bosch.protocols.perun_grpc.grpc_message import BalInfo
+
+# the perun node gives amounts in the main unit of a currency, they are kept in its smallest unit, e.g. wei
+CURRENCY_DECIMALS: Dict[str, int] = {"ETH": 18}
+DEFAULT_DECIMALS = 18
+AMOUNT_PATTERN = re.compile(r"([+-]?)([0-9]*)(?:\.([0-9]*))?")
+
+
+def parse_amount(amount: str, decimals: int = DEFAULT_DECIMALS) -> int:
+    """
+    Parse an amount of the perun node into the smallest unit of its currency.
+
+    :param amount: the amount as decimal string, e.g. "0.5"
+    :param decimals: the number of decimals of the currency
+    :return: the amount as integer
+    :raises ValueError: if the amount is no decimal number or more precise than the currency
+    """
+    match = AMOUNT_PATTERN.fullmatch(amount.strip())
+    if match is None or not (match.group(2) or match.group(3)):
+        raise ValueError("Amount {} is not a decimal number.".format(amount))
+    sign, whole, fraction = match.group(1), match.group(2) or "0", match.group(3) or ""
+    if len(fraction) > decimals:
+        raise ValueError("Amount {} has more than {} decimals.".format(amount, decimals))
+    return int(sign + whole + fraction.ljust(decimals, "0"))
+
+
+def format_amount(amount: int, decimals: int = DEFAULT_DECIMALS) -> str:
+    """
+    Format an amount in the smallest unit of its currency for the perun node.
+
+    :param amount: the amount as integer
+    :param decimals: the number of decimals of the currency
+    :return: the amount as decimal string, e.g. "0.5"
+    """
+    sign = "-" if amount < 0 else ""
+    whole, fraction = divmod(abs(amount), 10 ** decimals)
+    fraction_str = str(fraction).rjust(decimals, "0").rstrip("0")
+    if fraction_str == "":
+        return "{}{}".format(sign, whole)
+    return "{}{}.{}".format(sign, whole, fraction_str)
+
+
+def to_amount_str(amount: Union[str, int, float]) -> str:
+    """
+    Get the decimal string of an amount, e.g. of a configured maximum.
+
+    :param amount: the amount
+    :return: the amount as decimal string without exponent
+    :raises ValueError: if the amount is no number
+    """
+    try:
+        return format(Decimal(str(amount)), "f")
+    except InvalidOperation:
+        raise ValueError("Amount {} is not a decimal number.".format(amount))
+
+
+def get_decimals(currency: str) -> int:
+    """Get the number of decimals of a currency."""
+    return CURRENCY_DECIMALS.get(currency, DEFAULT_DECIMALS)
+
+
+class Balances():
+    """
+    This class represents the balance info of a channel with exact integer amounts.
+
+    The amount strings are parsed once, the amounts of all parts in all currencies are compared at once afterwards.
+    """
+
+    __slots__ = ("currencies", "parts", "amounts", "_indices")
+
+    def __init__(self, currencies: Sequence[str], parts: Sequence[str], amounts: Sequence[Sequence[int]]) -> None:
+        """
+        Initialize the balances.
+
+        :param currencies: the currencies
+        :param parts: the aliases of the channel participants
+        :param amounts: the amounts of the parts by currency, in the smallest unit of the currency
+        :return: None
+        """
+        self.currencies: Tuple[str, ...] = tuple(currencies)
+        self.parts: Tuple[str, ...] = tuple(parts)
+        self.amounts: Tuple[Tuple[int, ...], ...] = tuple(tuple(bals) for bals in amounts)
+        self._indices: Dict[str, int] = {part: ii for ii, part in reversed(list(enumerate(self.parts)))}
+
+    @classmethod
+    def from_bal_info(cls, bal_info: BalInfo) -> "Balances":
+        """
+        Parse a balance info.
+
+        :param bal_info: the balance info
+        :return: the balances
+        :raises ValueError: if an amount is no decimal number
+        """
+        currencies = list(bal_info.currencies)
+        # a balance info without currencies is given in ETH
+        currencies += ["ETH"] * (len(bal_info.bals) - len(currencies))
+        return cls(currencies, bal_info.parts, [
+            [parse_amount(bal, get_decimals(currency)) for bal in bal_info_bal.bal]
+            for currency, bal_info_bal in zip(currencies, bal_info.bals)])
+
+    def index(self, alias: str) -> Optional[int]:
+        """
+        Get the index of a part.
+
+        :param alias: the alias of the part
+        :return: the index, None if the alias is no part
+        """
+        return self._indices.get(alias)
+
+    def of(self, alias: str) -> Optional[Tuple[int, ...]]:
+        """
+        Get the amounts of a part.
+
+        :param alias: the alias of the part
+        :return: the amounts by currency, None if the alias is no part
+        """
+        index = self._indices.get(alias)
+        if index is None:
+            return None
+        return tuple(bals[index] for bals in self.amounts)
+
+    def is_complete(self) -> bool:
+        """Check if there is an amount for each part in each currency."""
+        return all(len(bals) == len(self.parts) for bals in self.amounts)
+
+    def has_unique_parts(self) -> bool:
+        """Check if no part is contained twice."""
+        return len(self._indices) == len(self.parts)
+
+    def is_non_negative(self) -> bool:
+        """Check if no amount is negative."""
+        return all(amount >= 0 for bals in self.amounts for amount in bals)
+
+    def is_at_most(self, alias: str, max_amount: Union[str, int, float]) -> bool:
+        """
+        Check if the amounts of a part do not exceed a maximum in any currency.
+
+        :param alias: the alias of the part
+        :param max_amount: the maximum in the main unit of each currency, e.g. "5"
+        :return: whether all amounts are at most the maximum, False if the alias is no part
+        :raises ValueError: if the maximum is no decimal number or more precise than a currency
+        """
+        amounts = self.of(alias)
+        if amounts is None:
+            return False
+        max_amount = to_amount_str(max_amount)
+        return all(
+            amount <= parse_amount(max_amount, get_decimals(currency))
+            for currency, amount in zip(self.currencies, amounts))
+
+    def diff(self, other: "Balances") -> Optional[Tuple[Tuple[int, ...], ...]]:
+        """
+        Get the changes of the amounts compared to earlier balances.
+
+        :param other: the earlier balances
+        :return: the differences of the amounts by currency, None if currencies or parts do not match
+        """
+        if self.currencies != other.currencies or self.parts != other.parts:
+            return None
+        return tuple(
+            tuple(amount - other_amount for amount, other_amount in zip(bals, other_bals))
+            for bals, other_bals in zip(self.amounts, other.amounts))
+
+    def __eq__(self, other: object) -> bool:
+        """Check if the balances are equal in all parts and currencies."""
+        if not isinstance(other, Balances):
+            return NotImplemented
+        return (self.currencies, self.parts, self.amounts) == (other.currencies, other.parts, other.amounts)
+
+    def __hash__(self) -> int:
+        """Get the hash of the balances."""
+        return hash((self.currencies, self.parts, self.amounts))
+
+    def __repr__(self) -> str:
+        """Get the string representation of the balances."""
+        return "Balances(currencies={}, parts={}, amounts={})".format(self.currencies, self.parts, self.amounts)
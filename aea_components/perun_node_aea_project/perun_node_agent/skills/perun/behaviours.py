@@ -4,13 +4,17 @@
 
 """This package contains a scaffold of a behaviour."""
 
+import time
 from ast import Not
-from typing import Any, Dict, cast
+from typing import Any, Dict, List, Optional, Tuple, Union, cast
 from aea.skills.behaviours import OneShotBehaviour, TickerBehaviour
-from packages.bosch.skills.perun.dialogues import PerunDialogues
+from packages.bosch.skills.perun.balances import format_amount, get_decimals, parse_amount, to_amount_str
+from packages.bosch.skills.perun.dialogues import PerunDialogue, PerunDialogues
 from packages.bosch.protocols.perun_grpc.message import PerunGrpcMessage
-from packages.bosch.protocols.perun_grpc.grpc_message import BalInfo, BalInfoBal, CloseSessionReq, GetPeerIdReq, OpenPayChReq, OpenSessionReq
-from packages.bosch.skills.perun.session import PerunSession, PerunSessions
+from packages.bosch.protocols.perun_grpc.grpc_message import (
+    BalInfo, BalInfoBal, CloseSessionReq, GetPeerIdReq, MsgError, OpenPayChReq, OpenSessionReq, Payment,
+    SendPayChUpdateReq)
+from packages.bosch.skills.perun.session import SELF_ALIAS, PerunSession, PerunSessions
 
 PERUN_CONNECTION_ID = "bosch/perun_node:0.1.0"
 
@@ -153,6 +157,248 @@ class PerunOpenChannelBehaviour(OneShotBehaviour):
         self.context.logger.info("Teardown of PerunOpenChannelBehaviour...")
 
 
+class PerunPaymentStreamBehaviour(TickerBehaviour):
+    """
+    This class streams payments to the peer of a channel, e.g. to pay per printed layer or per minute of usage.
+
+    A channel update is sent at the target rate as long as payments are pending. While an update is still in
+    flight, further payments are coalesced into the next update instead of being queued as updates of their own.
+
+    The node may have applied an update it did not answer in time, which cannot be told from the channel state,
+    so its amount is kept as unconfirmed and is not sent again. It is paid once a late response confirms it, sent
+    again only once the node refuses it and dropped with a warning once its channel is closed. Meanwhile it is
+    reported and the channel balance it may have used is not available for further payments.
+    """
+
+    def __init__(self, **kwargs: Any) -> None:
+        self.perun_connection: str = cast(str, kwargs.pop("connection", PERUN_CONNECTION_ID))
+        self.perun_session_id: str = cast(str, kwargs.pop("session_id", None))
+        self.alias: str = cast(str, kwargs.pop("alias", None))
+        self.currency: str = cast(str, kwargs.pop("currency", "ETH"))
+        # amount paid automatically per tick, e.g. per minute of usage with a rate of 1/60
+        self.amount_per_tick: str = to_amount_str(kwargs.pop("amount_per_tick", 0))
+        rate = float(kwargs.pop("rate", 1))
+        self.update_timeout = float(kwargs.pop("update_timeout", 90))
+        self.report_interval = float(kwargs.pop("report_interval", 10))
+        if rate <= 0:
+            raise ValueError("The rate of channel updates has to be positive!")
+        super().__init__(tick_interval=1 / rate, **kwargs)
+        self._decimals = get_decimals(self.currency)
+        self._amount_per_tick = parse_amount(self.amount_per_tick, self._decimals)
+        self._ch_id: Optional[str] = None
+        self._pending = 0
+        self._pending_payments = 0
+        # the update in flight: its dialogue, amount, number of coalesced payments and time it was sent
+        self._dialogue: Optional[PerunDialogue] = None
+        self._in_flight = 0
+        self._in_flight_payments = 0
+        self._sent = 0.0
+        self._sent_ch_id = ""
+        # the unanswered updates: their channel, dialogue, amount and number of coalesced payments
+        self._unconfirmed_updates: List[Tuple[str, PerunDialogue, int, int]] = []
+        self._is_insufficient = False
+        self._updates = 0
+        self._payments = 0
+        self._paid = 0
+        self._report_updates = 0
+        self._report_time = time.time()
+        self._updates_per_second = 0.0
+
+    @property
+    def pending_amount(self) -> int:
+        """Get the amount not sent yet, in the smallest unit of the currency."""
+        return self._pending
+
+    @property
+    def unconfirmed_amount(self) -> int:
+        """Get the amount of unanswered updates, which may have been applied, in the smallest unit of the currency."""
+        return sum(amount for _, _, amount, _ in self._unconfirmed_updates)
+
+    @property
+    def paid_amount(self) -> int:
+        """Get the amount of all confirmed updates, in the smallest unit of the currency."""
+        return self._paid
+
+    @property
+    def updates_per_second(self) -> float:
+        """Get the achieved rate of confirmed channel updates within the last report interval."""
+        return self._updates_per_second
+
+    def setup(self) -> None:
+        """Implement the setup."""
+        self.context.logger.info("Setup of PerunPaymentStreamBehaviour...")
+        if self.perun_session_id is None or self.alias is None:
+            raise ValueError("No session id or alias is given to stream payments to!")
+
+    def pay(self, amount: Union[str, int, float]) -> None:
+        """
+        Add a payment to the stream, it is sent with the next channel update.
+
+        :param amount: the amount in the main unit of the currency, e.g. "0.001"
+        :return: None
+        """
+        value = parse_amount(to_amount_str(amount), self._decimals)
+        if value <= 0:
+            raise ValueError("Payment amount {} has to be positive!".format(amount))
+        self._pending += value
+        self._pending_payments += 1
+
+    def act(self) -> None:
+        """Implement the act."""
+        self._check_update()
+        self._check_unconfirmed()
+        ch_id = self._get_channel_id()
+        # the usage is only paid for while it can be paid, not accumulated without a channel or balance
+        if self._amount_per_tick > 0 and ch_id is not None and self._get_available(ch_id) >= \
+                self._pending + self._in_flight + self._amount_per_tick:
+            self._pending += self._amount_per_tick
+            self._pending_payments += 1
+        self._report()
+        if self._dialogue is not None or self._pending == 0:
+            return
+        if ch_id is None:
+            self.context.logger.debug("No channel with {} to stream payments to yet.".format(self.alias))
+            return
+        self._send_update(ch_id)
+
+    def _get_channel_id(self) -> Optional[str]:
+        """Get the id of the channel with the payee, which is looked up again once the channel is closed."""
+        perun_sessions = cast(PerunSessions, self.context.perun_sessions)
+        session = perun_sessions.sessions.get(self.perun_session_id)
+        if session is None:
+            return None
+        if self._ch_id is not None and self._ch_id in session.channel_states:
+            return self._ch_id
+        self._ch_id = None
+        for ch_id, state in session.channel_states.items():
+            if state.balances.index(self.alias) is not None:
+                self._ch_id = ch_id
+                break
+        return self._ch_id
+
+    def _get_balance(self, ch_id: str) -> Optional[int]:
+        """Get the own balance of a channel in the currency, None if the channel or the currency is unknown."""
+        perun_sessions = cast(PerunSessions, self.context.perun_sessions)
+        session = perun_sessions.sessions.get(self.perun_session_id)
+        state = session.channel_states.get(ch_id) if session is not None else None
+        if state is None or self.currency not in state.balances.currencies:
+            return None
+        own_amounts = state.balances.of(SELF_ALIAS)
+        if own_amounts is None:
+            return None
+        return own_amounts[state.balances.currencies.index(self.currency)]
+
+    def _get_available(self, ch_id: str) -> int:
+        """Get the own balance of a channel left if all unconfirmed updates of it were applied."""
+        balance = self._get_balance(ch_id)
+        if balance is None:
+            return 0
+        unconfirmed = sum(amount for update_ch_id, _, amount, _ in self._unconfirmed_updates if update_ch_id == ch_id)
+        return balance - unconfirmed
+
+    def _send_update(self, ch_id: str) -> None:
+        """Send all pending payments within one channel update."""
+        if self._get_available(ch_id) < self._pending:
+            if not self._is_insufficient:
+                self.context.logger.warning("Balance of channel {} is not sufficient to pay {} {}.".format(
+                    ch_id, format_amount(self._pending, self._decimals), self.currency))
+                self._is_insufficient = True
+            return
+        self._is_insufficient = False
+        payment = Payment(currency=self.currency, payee=self.alias, amount=format_amount(self._pending, self._decimals))
+        send_pay_ch_update = SendPayChUpdateReq(session_id=self.perun_session_id, ch_id=ch_id, payments=[payment])
+        perun_dialogues = cast(PerunDialogues, self.context.perun_dialogues)
+        message, self._dialogue = perun_dialogues.create(
+            counterparty=self.perun_connection, performative=PerunGrpcMessage.Performative.REQUEST,
+            type=send_pay_ch_update.__class__.__name__, content=bytes(send_pay_ch_update))
+        self.context.outbox.put_message(message=message)
+        self._in_flight, self._in_flight_payments = self._pending, self._pending_payments
+        self._pending, self._pending_payments = 0, 0
+        self._sent = time.time()
+        self._sent_ch_id = ch_id
+
+    def _check_update(self) -> None:
+        """Check if the update in flight is answered or timed out."""
+        if self._dialogue is None:
+            return
+        response = cast(Optional[PerunGrpcMessage], self._dialogue.last_incoming_message)
+        if response is None:
+            if time.time() - self._sent < self.update_timeout:
+                return
+            # the node may have applied the update, so it is not sent again
+            self.context.logger.warning("No response for payment of {} {} to {} within {} seconds.".format(
+                format_amount(self._in_flight, self._decimals), self.currency, self.alias, self.update_timeout))
+            self._unconfirmed_updates.append(
+                (self._sent_ch_id, self._dialogue, self._in_flight, self._in_flight_payments))
+        elif response.type == 'SendPayChUpdateRespMsgSuccess':
+            self._confirm(self._in_flight, self._in_flight_payments)
+        else:
+            # the update was refused, so its payments are sent again with the next update
+            self.context.logger.warning("Payment of {} {} to {} failed: {}".format(
+                format_amount(self._in_flight, self._decimals), self.currency, self.alias,
+                MsgError().parse(response.content)))
+            self._pending += self._in_flight
+            self._pending_payments += self._in_flight_payments
+        self._dialogue = None
+        self._in_flight, self._in_flight_payments = 0, 0
+
+    def _confirm(self, amount: int, payments: int) -> None:
+        """Count a channel update confirmed by the node as paid."""
+        self._updates += 1
+        self._payments += payments
+        self._paid += amount
+
+    def _check_unconfirmed(self) -> None:
+        """Check if the unanswered updates got a late response or their channel was closed."""
+        if len(self._unconfirmed_updates) == 0:
+            return
+        perun_sessions = cast(PerunSessions, self.context.perun_sessions)
+        session = perun_sessions.sessions.get(self.perun_session_id)
+        unconfirmed_updates = []
+        for update in self._unconfirmed_updates:
+            ch_id, dialogue, amount, payments = update
+            response = cast(Optional[PerunGrpcMessage], dialogue.last_incoming_message)
+            if response is None:
+                if session is not None and ch_id in session.channel_states:
+                    unconfirmed_updates.append(update)
+                    continue
+                # the payment may be part of the final state of the channel, so it is not sent again
+                self.context.logger.warning("Channel {} was closed, payment of {} {} to {} was never confirmed.".format(
+                    ch_id, format_amount(amount, self._decimals), self.currency, self.alias))
+            elif response.type == 'SendPayChUpdateRespMsgSuccess':
+                self.context.logger.info("Payment of {} {} to {} was confirmed late.".format(
+                    format_amount(amount, self._decimals), self.currency, self.alias))
+                self._confirm(amount, payments)
+            else:
+                # only an update refused by the node is known not to be applied
+                self.context.logger.warning("Payment of {} {} to {} failed late: {}".format(
+                    format_amount(amount, self._decimals), self.currency, self.alias,
+                    MsgError().parse(response.content)))
+                self._pending += amount
+                self._pending_payments += payments
+        self._unconfirmed_updates = unconfirmed_updates
+
+    def _report(self) -> None:
+        """Log the achieved rate of channel updates once per report interval."""
+        now = time.time()
+        if now - self._report_time < self.report_interval:
+            return
+        self._updates_per_second = (self._updates - self._report_updates) / (now - self._report_time)
+        self.context.logger.info(
+            ("Payment stream to {}: {:.2f} updates/sec, {} updates with {} payments, {} {} paid, {} {} pending, "
+             "{} {} unconfirmed.").format(
+                self.alias, self._updates_per_second, self._updates, self._payments,
+                format_amount(self._paid, self._decimals), self.currency,
+                format_amount(self._pending + self._in_flight, self._decimals), self.currency,
+                format_amount(self.unconfirmed_amount, self._decimals), self.currency))
+        self._report_updates = self._updates
+        self._report_time = now
+
+    def teardown(self) -> None:
+        """Implement the task teardown."""
+        self.context.logger.info("Teardown of PerunPaymentStreamBehaviour...")
+
+
 # class PerunAliceBehaviour(TickerBehaviour):
 
 #     BOB = "bob"
@@ -149,8 +149,7 @@ class PerunHandler(Handler):
                 perun_sessions = cast(PerunSessions, self.context.perun_sessions)
                 pay_ch_req = OpenPayChReq().parse(last_message.content)
                 session = perun_sessions.sessions[pay_ch_req.session_id]
-                session.channels.update({response.opened_pay_ch_info.ch_id:
-                                        response.opened_pay_ch_info})
+                session.update_channel(response.opened_pay_ch_info)
                 self.context.logger.info("Added channel info to session {}: {}".format(
                     pay_ch_req.session_id, response.opened_pay_ch_info))
             else:
@@ -169,7 +168,7 @@ class PerunHandler(Handler):
                 perun_sessions = cast(PerunSessions, self.context.perun_sessions)
                 close_ch_req = ClosePayChReq().parse(last_message.content)
                 session = perun_sessions.sessions[close_ch_req.session_id]
-                session.channels.pop(close_ch_req.ch_id, None)
+                session.remove_channel(close_ch_req.ch_id)
                 self.context.logger.info("Removed channel info from session {}: {}".format(
                     close_ch_req.session_id, close_ch_req.ch_id))
             else:
@@ -183,8 +182,7 @@ class PerunHandler(Handler):
             perun_sessions = cast(PerunSessions, self.context.perun_sessions)
             pay_ch_req = SendPayChUpdateReq().parse(last_message.content)
             session = perun_sessions.sessions[pay_ch_req.session_id]
-            session.channels.update({response.updated_pay_ch_info.ch_id:
-                                    response.updated_pay_ch_info})
+            session.update_channel(response.updated_pay_ch_info)
             self.context.logger.info("Updated channel info to session {}: {}".format(
                 pay_ch_req.session_id, response.updated_pay_ch_info))
         else:
@@ -219,8 +217,7 @@ class PerunHandler(Handler):
         if betterproto.which_one_of(response, "response")[0] == "msg_success" and \
                 last_message.performative == PerunGrpcMessage.Performative.ACCEPT:
             session = perun_sessions.sessions[perun_msg.session_id]
-            session.channels.update({response.msg_success.opened_pay_ch_info.ch_id:
-                                    response.msg_success.opened_pay_ch_info})
+            session.update_channel(response.msg_success.opened_pay_ch_info)
             self.context.logger.info("Added channel info to session {}: {}".format(
                 perun_msg.session_id, response.msg_success.opened_pay_ch_info))
 
@@ -232,8 +229,7 @@ class PerunHandler(Handler):
         if betterproto.which_one_of(response, "response")[0] == "msg_success" and \
                 last_message.performative == PerunGrpcMessage.Performative.ACCEPT:
             session = perun_sessions.sessions[perun_msg.session_id]
-            session.channels.update({response.msg_success.opened_pay_ch_info.ch_id:
-                                    response.msg_success.opened_pay_ch_info})
+            session.update_channel(response.msg_success.opened_pay_ch_info)
             self.context.logger.info("Added channel info to session {}: {}".format(
                 perun_msg.session_id, response.msg_success.opened_pay_ch_info))
 
@@ -244,9 +240,9 @@ class PerunHandler(Handler):
         resMess = None
         if betterproto.which_one_of(update, "response")[0] == "notify":
             # checking if bal_info is technically valid and channel id is existing
-            if not perun_pay_ch_strategy.is_bal_info_valid(update.notify.proposed_pay_ch_info.bal_info) and \
-                    not update.notify.proposed_pay_ch_info.ch_id in perun_sessions.sessions[perun_msg.session_id].channels:
-                self.context.logger("Rejecting proposal as it is not valid: {}".format(perun_msg))
+            if not perun_pay_ch_strategy.is_bal_info_valid(update.notify.proposed_pay_ch_info.bal_info) or \
+                    not update.notify.proposed_pay_ch_info.ch_id in perun_sessions.sessions[perun_msg.session_id].channel_states:
+                self.context.logger.info("Rejecting proposal as it is not valid: {}".format(perun_msg))
                 resMess = perun_dialogue.reply(performative=PerunGrpcMessage.Performative.REJECT,
                                                target_message=perun_msg)
             elif update.notify.type == SubPayChUpdatesRespNotifyChUpdateType.open:
@@ -272,7 +268,7 @@ class PerunHandler(Handler):
                                                    target_message=perun_msg)
             elif update.notify.type == SubPayChUpdatesRespNotifyChUpdateType.closed:
                 # removing channel from session
-                perun_sessions.sessions[perun_msg.session_id].channels.pop(update.notify.proposed_pay_ch_info.ch_id)
+                perun_sessions.sessions[perun_msg.session_id].remove_channel(update.notify.proposed_pay_ch_info.ch_id)
                 # TODO: check if needed?
                 # terminating protocol and dialogue
                 resMess = perun_dialogue.reply(performative=PerunGrpcMessage.Performative.END,
@@ -284,18 +280,17 @@ class PerunHandler(Handler):
         perun_sessions = cast(PerunSessions, self.context.perun_sessions)
         perun_pay_ch_strategy = cast(PayChannelStrategy, self.context.perun_pay_ch_strategy)
         update = RespondPayChUpdateResp().parse(perun_msg.content)
+        channel_state = perun_sessions.sessions[perun_msg.session_id].channel_states.get(
+            update.msg_success.updated_pay_ch_info.ch_id)
         # also checking for higher version number
         if perun_pay_ch_strategy.is_bal_info_valid(
                 update.msg_success.updated_pay_ch_info.bal_info) and betterproto.which_one_of(
-                update, "response")[0] == "msg_success" and int(
-                update.msg_success.updated_pay_ch_info.version) > int(
-                perun_sessions.sessions[perun_msg.session_id].channels[update.msg_success.updated_pay_ch_info.ch_id].
-                version):
+                update, "response")[0] == "msg_success" and channel_state is not None and int(
+                update.msg_success.updated_pay_ch_info.version) > channel_state.version:
             # storing channel update in case of success
             self.context.logger.info("Updating channel state for session {}: {}".format(
                 perun_msg.session_id, update.msg_success.updated_pay_ch_info))
-            perun_sessions.sessions[perun_msg.session_id].channels.update(
-                {update.msg_success.updated_pay_ch_info.ch_id: update.msg_success.updated_pay_ch_info})
+            perun_sessions.sessions[perun_msg.session_id].update_channel(update.msg_success.updated_pay_ch_info)
             # removing corresponding proposed state if still existent
             last_message = cast(Optional[PerunGrpcMessage], perun_dialogue.last_outgoing_message)
             try:
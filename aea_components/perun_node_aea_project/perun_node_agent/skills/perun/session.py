@@ -6,6 +6,23 @@ from typing import Any, Dict, List, Optional
 from aea.skills.base import Model
 
 from packages.bosch.protocols.perun_grpc.grpc_message import PayChInfo, PeerId, SubPayChUpdatesRespNotify
+from packages.bosch.skills.perun.balances import Balances
+
+SELF_ALIAS = "self"
+
+
+class ChannelState():
+    """This class represents the parsed state of one payment channel, to validate updates against it."""
+
+    __slots__ = ("ch_id", "version", "self_index", "peer_index", "balances")
+
+    def __init__(self, ch_info: PayChInfo) -> None:
+        self.ch_id: str = ch_info.ch_id
+        self.version: int = int(ch_info.version)
+        self.balances: Balances = Balances.from_bal_info(ch_info.bal_info)
+        self.self_index: Optional[int] = self.balances.index(SELF_ALIAS)
+        self.peer_index: Optional[int] = next(
+            (ii for ii, part in enumerate(self.balances.parts) if part != SELF_ALIAS), None)
 
 
 class PerunSession():
@@ -17,6 +34,7 @@ class PerunSession():
         self._peer_ids: Optional[Dict[str, PeerId]] = {}
         self._restored_chs: List["PayChInfo"] = kwargs.pop("restored_chs", [])
         self._channels: Optional[Dict[str, PayChInfo]] = {}
+        self._channel_states: Optional[Dict[str, ChannelState]] = {}
         self._prop_ch_updates: Optional[Dict[str, SubPayChUpdatesRespNotify]] = {}
 
     @property
@@ -52,6 +70,38 @@ class PerunSession():
         """
         return self._channels
 
+    @property
+    def channel_states(self) -> Dict[str, ChannelState]:
+        """
+        Get the parsed states of the current channels.
+        Key of one state is the channel_id.
+        """
+        return self._channel_states
+
+    def update_channel(self, ch_info: PayChInfo) -> bool:
+        """
+        Store the info of an opened or updated channel, unless a later version is stored already.
+
+        :param ch_info: the channel info
+        :return: whether the channel info was stored
+        """
+        state = self._channel_states.get(ch_info.ch_id)
+        if state is not None and int(ch_info.version) < state.version:
+            return False
+        self._channels[ch_info.ch_id] = ch_info
+        self._channel_states[ch_info.ch_id] = ChannelState(ch_info)
+        return True
+
+    def remove_channel(self, ch_id: str) -> Optional[PayChInfo]:
+        """
+        Remove a closed channel.
+
+        :param ch_id: the channel id
+        :return: the removed channel info, None if the channel is unknown
+        """
+        self._channel_states.pop(ch_id, None)
+        return self._channels.pop(ch_id, None)
+
     @property
     def prop_ch_updates(self) -> Dict[str, SubPayChUpdatesRespNotify]:
         """
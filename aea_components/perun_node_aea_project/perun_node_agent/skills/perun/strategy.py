@@ -3,10 +3,11 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import logging
-from typing import Any, cast
+from typing import Any, Optional, Union, cast
 from aea.skills.base import Model
 from packages.bosch.protocols.perun_grpc.grpc_message import (
     BalInfo, SubPayChProposalsRespNotify, SubPayChUpdatesRespNotify)
+from packages.bosch.skills.perun.balances import Balances, to_amount_str
 from packages.bosch.skills.perun.session import *
 
 
@@ -18,11 +19,13 @@ class PayChannelStrategy(Model):
 
         :return: None
         """
-        self._max_balance = float(kwargs.pop('max_balance', 4))
+        # kept as decimal string, so it is compared exactly in the scale of each currency
+        self._max_balance = to_amount_str(kwargs.pop('max_balance', 4))
         Model.__init__(self, **kwargs)
         self._logger = logging.getLogger("packages.bosch.skills.perun.strategy")
 
-    def is_proposal_valid(self, proposal: SubPayChProposalsRespNotify, max_balance: float = None) -> bool:
+    def is_proposal_valid(self, proposal: SubPayChProposalsRespNotify,
+                          max_balance: Union[str, int, float] = None) -> bool:
         """
         Checks if proposal is valid.
 
@@ -53,12 +56,11 @@ class PayChannelStrategy(Model):
                 return True
         return False
 
-    def check_balances_max(self, max_balance: float, bal_info: BalInfo, alias: str) -> bool:
-        index = self.get_index_for_alias_in_balinfo(alias, bal_info)
-        for bal_info_bal in bal_info.bals:
-            if float(bal_info_bal.bal[index]) > max_balance:
-                return False
-        return True
+    def check_balances_max(self, max_balance: Union[str, int, float], bal_info: BalInfo, alias: str) -> bool:
+        try:
+            return Balances.from_bal_info(bal_info).is_at_most(alias, max_balance)
+        except ValueError:
+            return False
 
     def is_bal_info_valid(self, bal_info: BalInfo) -> bool:
         """
@@ -72,64 +74,59 @@ class PayChannelStrategy(Model):
 
         :return: bool
         """
-        if not self.check_for_part(bal_info, "self"):
+        if not self.check_for_part(bal_info, SELF_ALIAS):
             return False
-        for bal_info_bal in bal_info.bals:
-            # length of balances must correspond to length of contained parts / alias
-            if len(bal_info.parts) != len(bal_info_bal.bal):
-                return False
-            # checking for negative balance amount
-            for bal in bal_info_bal.bal:
-                if float(bal) < 0:
-                    return False
-        # set contains only unique entries, therefore it can be used to check for uniqueness
-        unique_set = set(bal_info.parts)
-        # len of parts and unique set must be the same
-        if len(bal_info.parts) != len(unique_set):
+        try:
+            balances = Balances.from_bal_info(bal_info)
+        except ValueError:
             return False
-        return True
+        return balances.is_complete() and balances.has_unique_parts() and balances.is_non_negative()
 
-    def get_index_for_alias_in_balinfo(self, alias: str, bal_info: BalInfo) -> int:
-        index: int = 0
-        for ii in range(len(bal_info.parts) + 1):
-            if bal_info.parts[ii] == alias:
-                index = ii
-                return ii
+    def get_index_for_alias_in_balinfo(self, alias: str, bal_info: BalInfo) -> Optional[int]:
+        if alias in bal_info.parts:
+            return bal_info.parts.index(alias)
+        return None
 
     def is_ch_upd_valid(self, update: SubPayChUpdatesRespNotify, session: PerunSession) -> bool:
         """
         Checks if a channel update is valid with own channel strategy.
 
-        Default implementation will only accept updates by retrieving tokens
-        and is focusing on ETH as only currency and if version number is increased.
+        Default implementation will only accept updates by retrieving tokens in any currency
+        without paying in another one, and if version number is increased.
+        The update is checked against the parsed channel state of the session,
+        expecting the parts and currencies in the same order as in the current channel info.
 
         :return: bool
         """
-        channel = session.channels[update.proposed_pay_ch_info.ch_id]
-        index_prop = self.get_index_for_alias_in_balinfo("self", update.proposed_pay_ch_info.bal_info)
-        index_old = self.get_index_for_alias_in_balinfo("self", channel.bal_info)
-        # expecting only one entry for eth
-        bal_prop = update.proposed_pay_ch_info.bal_info.bals[0].bal[index_prop]
-        bal_old = channel.bal_info.bals[0].bal[index_old]
+        proposed = update.proposed_pay_ch_info
+        state = session.channel_states.get(proposed.ch_id)
+        if state is None or state.self_index is None or int(proposed.version) <= state.version:
+            return False
+        try:
+            changes = Balances.from_bal_info(proposed.bal_info).diff(state.balances)
+        except ValueError:
+            return False
+        if changes is None:
+            return False
+        self_changes = [bals[state.self_index] for bals in changes]
         self._logger.debug(
-            "is_ch_upd_valid is checking proposed bal {} and old bal {}".format(bal_prop, bal_old))
-        if float(bal_prop) > float(bal_old) and int(update.proposed_pay_ch_info.version) > int(channel.version):
-            return True
-        return False
+            "is_ch_upd_valid is checking changes {} of own balance".format(self_changes))
+        return all(change >= 0 for change in self_changes) and any(change > 0 for change in self_changes)
 
     def is_ch_upd_final_valid(self, update: SubPayChUpdatesRespNotify, session: PerunSession) -> bool:
         """
         Checks if a final channel update is valid with own channel strategy.
 
-        Default implementation is checking if balances are equal and version number is increased for final state.
-        Expecting ETH as only currency.
+        Default implementation is checking if balances are equal in all parts and currencies
+        and version number is increased for final state.
 
         :return: bool
         """
-        channel = session.channels[update.proposed_pay_ch_info.ch_id]
-        if int(update.proposed_pay_ch_info.version) <= int(channel.version):
+        proposed = update.proposed_pay_ch_info
+        state = session.channel_states.get(proposed.ch_id)
+        if state is None or int(proposed.version) <= state.version:
+            return False
+        try:
+            return Balances.from_bal_info(proposed.bal_info) == state.balances
+        except ValueError:
             return False
-        for ii in range(len(update.proposed_pay_ch_info.bal_info.parts)):
-            if float(channel.bal_info.bals[0].bal[ii]) != float(update.proposed_pay_ch_info.bal_info.bals[0].bal[ii]):
-                return False
-        return True
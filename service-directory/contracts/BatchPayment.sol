@@ -0,0 +1,71 @@
+// Copyright (c) 2021 - for information on the respective copyright owner see the NOTICE file and/or the repository https://github.com/boschresearch/open-eot-agents.
+//
+// SPDX-License-Identifier: Apache-2.0
+
+pragma solidity ^0.8.4;
+
+contract BatchPayment {
+    // as much gas as a transfer forwards, so a recipient can not use up the gas of the batch
+    uint256 constant RECIPIENT_GAS = 2300;
+
+    event Payment(
+        address payer,
+        address recipient,
+        uint256 amount,
+        string reference
+    );
+
+    event PaymentFailed(
+        address payer,
+        address indexed recipient,
+        uint256 amount,
+        string reference
+    );
+
+    constructor() {}
+
+    function pay(
+        address payable[] calldata recipients,
+        uint256[] calldata amounts,
+        string[] calldata references
+    ) public payable {
+        require(
+            recipients.length == amounts.length &&
+                recipients.length == references.length,
+            "recipients, amounts and references differ in length"
+        );
+        uint256 total = 0;
+        for (uint256 index = 0; index < amounts.length; index++) {
+            total += amounts[index];
+        }
+        require(total == msg.value, "value does not match sum of amounts");
+        // a recipient rejecting its payment does not revert the others, its amount is refunded
+        uint256 refund = 0;
+        for (uint256 index = 0; index < recipients.length; index++) {
+            (bool success, ) = recipients[index].call{
+                value: amounts[index],
+                gas: RECIPIENT_GAS
+            }("");
+            if (success) {
+                emit Payment(
+                    msg.sender,
+                    recipients[index],
+                    amounts[index],
+                    references[index]
+                );
+            } else {
+                refund += amounts[index];
+                emit PaymentFailed(
+                    msg.sender,
+                    recipients[index],
+                    amounts[index],
+                    references[index]
+                );
+            }
+        }
+        if (refund > 0) {
+            (bool refunded, ) = payable(msg.sender).call{value: refund}("");
+            require(refunded, "refund of failed payments failed");
+        }
+    }
+}
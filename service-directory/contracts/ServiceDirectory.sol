@@ -11,6 +11,10 @@ contract ServiceDirectory {
     }
 
     mapping(string => Service[]) public topicMappings;
+    // position + 1 of a service within topicMappings, 0 if not existent
+    mapping(bytes32 => uint256) private serviceIndices;
+    // keys of the services an owner has registered for a topic
+    mapping(bytes32 => bytes32[]) private ownerServices;
 
     event ServiceAdded(address owner, string topic, string endpoint);
     event ServiceDeleted(address owner, string topic, string[] endpoint);
@@ -22,25 +26,16 @@ contract ServiceDirectory {
         public
     {
         //only add service endpoint if not already existent
-        bool isServiceExistent = false;
-        Service[] storage services = topicMappings[topic];
-        for (uint256 index = 0; index < services.length; index++) {
-            if (
-                keccak256(abi.encodePacked(services[index].owner)) ==
-                keccak256(abi.encodePacked(msg.sender)) &&
-                keccak256(bytes(services[index].endpoint)) ==
-                keccak256(bytes(endpoint))
-            ) {
-                isServiceExistent = true;
-                break;
-            }
-        }
-        if (!isServiceExistent) {
-            topicMappings[topic].push(Service(msg.sender, endpoint));
-            emit ServiceAdded(msg.sender, topic, endpoint);
-        } else {
+        bytes32 key = serviceKey(topic, msg.sender, endpoint);
+        if (serviceIndices[key] != 0) {
             emit ServiceAlreadyExistent(msg.sender, topic, endpoint);
+            return;
         }
+        Service[] storage services = topicMappings[topic];
+        services.push(Service(msg.sender, endpoint));
+        serviceIndices[key] = services.length;
+        ownerServices[ownerKey(topic, msg.sender)].push(key);
+        emit ServiceAdded(msg.sender, topic, endpoint);
     }
 
     function addServices(string[] calldata topics, string calldata endpoint)
@@ -66,6 +61,30 @@ contract ServiceDirectory {
         return endpoints;
     }
 
+    // Pages are read from the current endpoints of a topic, removing a service moves the
+    // last endpoint of the topic into its position. An endpoint may therefore be skipped or
+    // repeated if services of the topic are removed between two pages.
+    function getServiceEndpointsPage(
+        string calldata topic,
+        uint256 offset,
+        uint256 limit
+    ) public view returns (string[] memory, uint256) {
+        Service[] storage services = topicMappings[topic];
+        uint256 total = services.length;
+        uint256 size = 0;
+        if (offset < total) {
+            size = total - offset;
+            if (limit < size) {
+                size = limit;
+            }
+        }
+        string[] memory endpoints = new string[](size);
+        for (uint256 ii = 0; ii < size; ii++) {
+            endpoints[ii] = services[offset + ii].endpoint;
+        }
+        return (endpoints, total);
+    }
+
     function getServiceEndpointsTopics(string[] calldata topicList)
         public
         view
@@ -80,21 +99,15 @@ contract ServiceDirectory {
 
     function removeService(string calldata topic) public {
         Service[] storage services = topicMappings[topic];
-        string[] memory endpoints = new string[](services.length);
-        for (uint256 ii = 0; ii < services.length; ii++) {
-            if (services[ii].owner == msg.sender) {
-                endpoints[ii] = services[ii].endpoint;
-                removeServiceFromArray(services, ii);
-                if (
-                    services.length > 0 &&
-                    ii == services.length - 1 &&
-                    services[ii].owner == msg.sender
-                ) {
-                    endpoints[ii] = services[ii].endpoint;
-                    removeServiceFromArray(services, ii);
-                }
-            }
+        bytes32[] storage keys = ownerServices[ownerKey(topic, msg.sender)];
+        string[] memory endpoints = new string[](keys.length);
+        for (uint256 ii = 0; ii < keys.length; ii++) {
+            uint256 index = serviceIndices[keys[ii]] - 1;
+            endpoints[ii] = services[index].endpoint;
+            removeServiceFromArray(topic, services, index);
+            delete serviceIndices[keys[ii]];
         }
+        delete ownerServices[ownerKey(topic, msg.sender)];
         emit ServiceDeleted(msg.sender, topic, endpoints);
     }
 
@@ -104,12 +117,37 @@ contract ServiceDirectory {
         }
     }
 
-    function removeServiceFromArray(Service[] storage services, uint256 index)
-        private
-    {
-        //setting last element to given index
-        services[index] = services[services.length - 1];
+    function removeServiceFromArray(
+        string calldata topic,
+        Service[] storage services,
+        uint256 index
+    ) private {
+        uint256 lastIndex = services.length - 1;
+        if (index != lastIndex) {
+            //setting last element to given index
+            Service storage last = services[lastIndex];
+            serviceIndices[serviceKey(topic, last.owner, last.endpoint)] =
+                index +
+                1;
+            services[index] = last;
+        }
         //removing last element
         services.pop();
     }
+
+    function serviceKey(
+        string memory topic,
+        address owner,
+        string memory endpoint
+    ) private pure returns (bytes32) {
+        return keccak256(abi.encode(topic, owner, endpoint));
+    }
+
+    function ownerKey(string memory topic, address owner)
+        private
+        pure
+        returns (bytes32)
+    {
+        return keccak256(abi.encode(topic, owner));
+    }
 }
@@ -0,0 +1,75 @@
+// Copyright (c) 2021 - for information on the respective copyright owner see the NOTICE file and/or the repository https://github.com/boschresearch/open-eot-agents.
+//
+// SPDX-License-Identifier: Apache-2.0
+
+pragma solidity ^0.8.4;
+
+import "truffle/Assert.sol";
+import "../contracts/BatchPayment.sol";
+
+contract RejectingRecipient {
+    receive() external payable {
+        revert("payment rejected");
+    }
+}
+
+contract TestBatchPayment {
+    uint256 public initialBalance = 1 ether;
+
+    receive() external payable {}
+
+    function testPay() public {
+        BatchPayment batchPayment = new BatchPayment();
+        address payable[] memory recipients = new address payable[](2);
+        recipients[0] = payable(address(0x1111));
+        recipients[1] = payable(address(0x2222));
+        uint256[] memory amounts = new uint256[](2);
+        amounts[0] = 100;
+        amounts[1] = 200;
+        string[] memory references = new string[](2);
+        references[0] = "nonce1";
+        references[1] = "nonce2";
+        batchPayment.pay{value: 300}(recipients, amounts, references);
+        Assert.equal(recipients[0].balance, 100, "first recipient not paid");
+        Assert.equal(recipients[1].balance, 200, "second recipient not paid");
+    }
+
+    function testPayRejectedByRecipient() public {
+        BatchPayment batchPayment = new BatchPayment();
+        RejectingRecipient rejectingRecipient = new RejectingRecipient();
+        address payable[] memory recipients = new address payable[](2);
+        recipients[0] = payable(address(0x4444));
+        recipients[1] = payable(address(rejectingRecipient));
+        uint256[] memory amounts = new uint256[](2);
+        amounts[0] = 100;
+        amounts[1] = 200;
+        string[] memory references = new string[](2);
+        references[0] = "nonce1";
+        references[1] = "nonce2";
+        uint256 balance = address(this).balance;
+        batchPayment.pay{value: 300}(recipients, amounts, references);
+        Assert.equal(recipients[0].balance, 100, "first recipient not paid");
+        Assert.equal(recipients[1].balance, 0, "rejecting recipient should not be paid");
+        Assert.equal(address(this).balance, balance - 100, "rejected payment not refunded");
+    }
+
+    function testPayWrongValue() public {
+        BatchPayment batchPayment = new BatchPayment();
+        address payable[] memory recipients = new address payable[](1);
+        recipients[0] = payable(address(0x3333));
+        uint256[] memory amounts = new uint256[](1);
+        amounts[0] = 100;
+        string[] memory references = new string[](1);
+        references[0] = "nonce1";
+        (bool success, ) = address(batchPayment).call{value: 50}(
+            abi.encodeWithSelector(
+                batchPayment.pay.selector,
+                recipients,
+                amounts,
+                references
+            )
+        );
+        Assert.isFalse(success, "payment with wrong value should fail");
+        Assert.equal(recipients[0].balance, 0, "recipient should not be paid");
+    }
+}
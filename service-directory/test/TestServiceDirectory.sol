@@ -163,6 +163,53 @@ contract TestServiceDirectory {
         Assert.equal(result.length, 0, "0 entry should be existent");
     }
 
+    function testRemoveService3() public {
+        ServiceDirectory servDir = new ServiceDirectory();
+        string memory topic = "testtopic1";
+        string memory topic2 = "testtopic2";
+        //adding endpoints, the last one to another topic
+        servDir.addService(topic, "myendpoint1");
+        servDir.addService(topic, "myendpoint2");
+        servDir.addService(topic, "myendpoint3");
+        servDir.addService(topic2, "myendpoint1");
+        string[] memory result = servDir.getServiceEndpoints(topic);
+        Assert.equal(result.length, 3, "3 entry should be existent");
+        //removing all endpoints of the topic
+        servDir.removeService(topic);
+        result = servDir.getServiceEndpoints(topic);
+        Assert.equal(result.length, 0, "0 entry should be existent");
+        result = servDir.getServiceEndpoints(topic2);
+        Assert.equal(result.length, 1, "1 entry should be existent");
+        //adding a removed endpoint again
+        servDir.addService(topic, "myendpoint2");
+        result = servDir.getServiceEndpoints(topic);
+        Assert.equal(result.length, 1, "1 entry should be existent");
+        Assert.equal(result[0], "myendpoint2", "added endpoint value is wrong");
+    }
+
+    function testGetServiceEndpointsPage() public {
+        ServiceDirectory servDir = new ServiceDirectory();
+        string memory topic = "testtopic1";
+        servDir.addService(topic, "myendpoint1");
+        servDir.addService(topic, "myendpoint2");
+        servDir.addService(topic, "myendpoint3");
+        //checking first page
+        (string[] memory result, uint256 total) = servDir
+            .getServiceEndpointsPage(topic, 0, 2);
+        Assert.equal(total, 3, "total should be 3");
+        Assert.equal(result.length, 2, "2 entry should be existent");
+        Assert.equal(result[0], "myendpoint1", "endpoint value is wrong");
+        Assert.equal(result[1], "myendpoint2", "endpoint value is wrong");
+        //checking last page
+        (result, total) = servDir.getServiceEndpointsPage(topic, 2, 2);
+        Assert.equal(result.length, 1, "1 entry should be existent");
+        Assert.equal(result[0], "myendpoint3", "endpoint value is wrong");
+        //checking offset behind the end
+        (result, total) = servDir.getServiceEndpointsPage(topic, 5, 2);
+        Assert.equal(result.length, 0, "should be empty");
+        Assert.equal(total, 3, "total should be 3");
+    }
+
     //wor in progress
     function testGetServiceEndpointsTopics() public {
         ServiceDirectory servDir = new ServiceDirectory();
@@ -0,0 +1,13 @@
+#!/bin/bash
+
+script_dir=$(dirname $0)
+cd $script_dir
+echo 'Compiling contracts with truffle...'
+truffle compile --all || exit 1
+for agent in purchasing_agent selling_agent; do
+    agent_dir=../EoT-Agents-Manifacturing-Marketplace/$agent
+    echo "Copying contract artifact to $agent..."
+    cp build/contracts/ServiceDirectory.json $agent_dir/contracts/service_directory/build/ServiceDirectory.json
+    echo "Updating contract fingerprints of $agent..."
+    (cd $agent_dir && aea fingerprint by-path contracts/service_directory) || exit 1
+done